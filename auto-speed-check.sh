@@ -1,14 +1,7 @@
 #!/bin/bash
 
-# This script runs the main Python script and logs the output every 5 minutes
+# This script runs the performance scanner as a long-lived daemon and logs the output.
+# Page intervals are set in config.json ("daemon" block and per-page "interval").
+# The daemon shuts down cleanly on SIGTERM (e.g. kill or systemctl stop).
 
-# Other time options:
-# sleep 3600   # Wait 60 minutes
-# sleep 1800   # Wait 30 minutes
-# sleep 900    # Wait 15 minutes
-
-while true
-do
-    python3 ./main.py >> ./logs/cron.log 2>&1
-    sleep 300  # Wait 5 minutes
-done
\ No newline at end of file
+exec python3 ./main.py --daemon --note "Automated" >> ./logs/cron.log 2>&1
@@ -0,0 +1,139 @@
+import math
+
+# Takes repeated measurements of a page until its load time is known precisely enough, then
+# reports percentiles and a confidence interval. Stable pages stop after one or two loads and
+# noisy ones get more, up to max_samples per page and sweep_budget samples per sweep.
+class AdaptiveSampler:
+    CACHE_MODES = ('cold', 'warm')
+
+    def __init__(self, config, target_load_time):
+        self.min_samples = max(1, int(config.get('min_samples', 2)))
+        self.max_samples = max(self.min_samples, int(config.get('max_samples', 7)))
+        self.confidence = float(config.get('confidence', 0.95))
+        self.relative_precision = float(config.get('relative_precision', 0.1))
+        self.absolute_precision = float(config.get('absolute_precision', 0.05))
+        self.verdict_percentile = float(config.get('verdict_percentile', 90))
+        self.fast_ratio = float(config.get('fast_ratio', 0.5))
+        self.sweep_budget = config.get('sweep_budget')
+        self.cache_modes = config.get('cache_modes', ['warm'])
+        self.target_load_time = target_load_time
+        self.samples_used = 0
+
+        for cache_mode in self.cache_modes:
+            if cache_mode not in self.CACHE_MODES:
+                raise ValueError(f"Unknown cache mode: {cache_mode}")
+
+
+    # Sample a page once per cache mode and return one summarised metrics dict for each.
+    # measure() takes a single measurement; clear_cache() drops cached responses and connections.
+    def measure(self, measure, clear_cache):
+        results = []
+        for cache_mode in self.cache_modes:
+            if cache_mode == 'warm':
+                # One throwaway load so every counted sample finds the cache and connections warm
+                clear_cache()
+                measure()
+            results.append(self.sample(measure, clear_cache, cache_mode))
+        return results
+
+
+    def sample(self, measure, clear_cache, cache_mode):
+        samples = []
+        while True:
+            if cache_mode == 'cold':
+                clear_cache()
+
+            metrics = measure()
+            self.samples_used += 1
+            if metrics.get('loadTime') is None:
+                # A failed load is reported as it is rather than averaged away
+                metrics['cacheMode'] = cache_mode
+                metrics['samples'] = len(samples) + 1
+                return metrics
+
+            samples.append(metrics)
+            if self.should_stop([sample['loadTime'] for sample in samples]):
+                return self.summarise(samples, cache_mode)
+
+
+    def should_stop(self, load_times):
+        count = len(load_times)
+        if count >= self.max_samples or self.budget_spent():
+            return True
+
+        # A single load well inside the target can't plausibly turn into a SLOW verdict
+        if count == 1 and load_times[0] < self.target_load_time * self.fast_ratio:
+            return True
+
+        if count < max(self.min_samples, 2):
+            return False
+
+        mean = sum(load_times) / count
+        low, high = self.confidence_interval(load_times)
+        return (high - low) / 2 <= max(self.relative_precision * mean, self.absolute_precision)
+
+
+    # Once the sweep budget is used up every remaining page gets a single sample
+    def budget_spent(self):
+        return self.sweep_budget is not None and self.samples_used >= int(self.sweep_budget)
+
+
+    # The row keeps the other metrics from the sample nearest the median; Load Time itself
+    # becomes the verdict percentile so SLOW/OK, last_run.json and the summary all use it
+    def summarise(self, samples, cache_mode):
+        load_times = sorted(sample['loadTime'] for sample in samples)
+        median = self.percentile(load_times, 50)
+        metrics = dict(min(samples, key=lambda sample: abs(sample['loadTime'] - median)))
+
+        low, high = self.confidence_interval(load_times)
+        metrics['loadTime'] = round(self.percentile(load_times, self.verdict_percentile), 3)
+        metrics['samples'] = len(samples)
+        metrics['loadTimeP50'] = round(median, 3)
+        metrics['loadTimeP90'] = round(self.percentile(load_times, 90), 3)
+        metrics['loadTimeP95'] = round(self.percentile(load_times, 95), 3)
+        metrics['loadTimeCiLow'] = round(low, 3) if len(samples) > 1 else ''
+        metrics['loadTimeCiHigh'] = round(high, 3) if len(samples) > 1 else ''
+        metrics['cacheMode'] = cache_mode
+        return metrics
+
+
+    # Linear interpolation between closest ranks, as numpy.percentile does by default
+    @staticmethod
+    def percentile(sorted_values, percent):
+        position = (len(sorted_values) - 1) * percent / 100
+        lower = math.floor(position)
+        upper = min(lower + 1, len(sorted_values) - 1)
+        return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+    # Student's t interval for the mean load time
+    def confidence_interval(self, values):
+        count = len(values)
+        mean = sum(values) / count
+        if count < 2:
+            return mean, mean
+
+        variance = sum((value - mean) ** 2 for value in values) / (count - 1)
+        half_width = self.t_quantile((1 + self.confidence) / 2, count - 1) * math.sqrt(variance / count)
+        return mean - half_width, mean + half_width
+
+
+    # Exact for one and two degrees of freedom, Cornish-Fisher expansion of the normal quantile above that
+    # (within 1% of the tables from three degrees of freedom up)
+    @staticmethod
+    def t_quantile(probability, degrees):
+        if degrees == 1:
+            return math.tan(math.pi * (probability - 0.5))
+        if degrees == 2:
+            return (2 * probability - 1) / math.sqrt(2 * probability * (1 - probability))
+
+        # statistics pulls in decimal and fractions, so it is only imported when sampling needs it
+        from statistics import NormalDist
+
+        z = NormalDist().inv_cdf(probability)
+        return (
+            z
+            + (z ** 3 + z) / (4 * degrees)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * degrees ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * degrees ** 3)
+        )
@@ -0,0 +1,268 @@
+import base64
+import json
+import math
+import os
+import random
+
+import pandas as pd
+
+from QuantileSketch import QuantileSketch
+from HistoryLoader import HistoryLoader
+
+# Running aggregates behind scripts/python/data-analysis.py, saved between runs so each run only reads
+# the rows appended to the CSV files since the last one. Everything kept here merges by addition:
+# per page and day the count, min, max, sum and sum of squares of the load time (and the mean number
+# of requests), a quantile sketch per page for the boxplots and histograms, the baseline rows per page
+# and a fixed-size random sample of (requests, load time) pairs per site for the scatter plot.
+# Aggregates are held per CSV file, so a file that is truncated or rewritten is simply read again.
+class AnalysisCheckpoint:
+    VERSION = 2
+    RESERVOIR_SIZE = 2000
+
+    def __init__(self, path, relative_accuracy=0.01):
+        self.path = path
+        self.relative_accuracy = relative_accuracy
+        self.files = {}
+        # (site, page) pairs whose aggregates changed and whose charts have not been redrawn yet
+        self.dirty = set()
+        # Fingerprint of the data each chart was last drawn from, by chart path
+        self.charts = {}
+        self.sketches = {}
+        self.load()
+
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r') as file:
+            state = json.load(file)
+        if state.get('version') != self.VERSION or state.get('relative_accuracy') != self.relative_accuracy:
+            return
+        self.files = state.get('files', {})
+        self.dirty = {tuple(pair) for pair in state.get('dirty', [])}
+        self.charts = state.get('charts', {})
+
+
+    # Written to a temporary file first, so a run that is killed part way leaves the last good checkpoint
+    def save(self):
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        for state in self.files.values():
+            for site, pages in self.sketches.get(state['path'], {}).items():
+                for page, sketch in pages.items():
+                    state['sketches'].setdefault(site, {})[page] = base64.b64encode(sketch.to_bytes()).decode('ascii')
+
+        state = {
+            'version': self.VERSION,
+            'relative_accuracy': self.relative_accuracy,
+            'files': self.files,
+            'dirty': sorted(self.dirty),
+            'charts': self.charts,
+        }
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(state, file)
+        os.replace(temporary_path, self.path)
+
+
+    # Read the rows added to csv_path since the last checkpoint and fold them into its aggregates.
+    # Returns the number of rows read.
+    def update_file(self, csv_path):
+        key = os.path.abspath(csv_path)
+        stat = os.stat(key)
+        with open(key, 'rb') as file:
+            header = file.readline()
+
+        state = self.files.get(key)
+        # A new inode means the file was rotated or replaced, and a shorter file or a different header
+        # means it was rewritten; either way the rows counted before no longer describe this file
+        if state and (state['inode'] != stat.st_ino or state['header'] != header.decode('utf-8')
+                      or stat.st_size < state['offset']):
+            self.drop_file(key)
+            state = None
+
+        if state is None:
+            state = self.moved_state(key, stat, header.decode('utf-8'))
+        if state is None:
+            if not header.endswith(b'\n'):
+                return 0
+            state = {
+                'path': key, 'inode': stat.st_ino, 'header': header.decode('utf-8'), 'offset': len(header),
+                'rows': 0, 'days': {}, 'sketches': {}, 'baselines': {}, 'samples': {}, 'pages': {},
+            }
+            self.files[key] = state
+
+        rows = 0
+        for frame, offset in HistoryLoader.read_rows(key, state['offset']):
+            rows += self.add_rows(state, frame)
+            state['offset'] = offset
+
+        state['rows'] += rows
+        return rows
+
+
+    # The scanner sets a speed_check.csv aside with os.replace when its columns change, which keeps the
+    # inode, so the rows already counted are carried over to the new name instead of being read again
+    def moved_state(self, key, stat, header):
+        for old_key, state in list(self.files.items()):
+            if state['inode'] != stat.st_ino or state['header'] != header or state['offset'] > stat.st_size:
+                continue
+            try:
+                moved = os.stat(old_key).st_ino != stat.st_ino
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                state = self.files.pop(old_key)
+                state['path'] = key
+                self.files[key] = state
+                if old_key in self.sketches:
+                    self.sketches[key] = self.sketches.pop(old_key)
+                return state
+        return None
+
+
+    # Forget a file's aggregates, marking its pages to be redrawn
+    def drop_file(self, key):
+        state = self.files.pop(key, None)
+        self.sketches.pop(key, None)
+        if state:
+            for site, pages in state['days'].items():
+                self.dirty.update((site, page) for page in pages)
+
+
+    # chunk is a frame normalised by HistoryLoader
+    def add_rows(self, state, chunk):
+        if chunk.empty:
+            return 0
+
+        frame = pd.DataFrame({
+            'site': chunk['site'].astype(str), 'page': chunk['page_name'].astype(str),
+            'url': chunk['page_url'].astype(str), 'load': chunk['load_time'].astype('float64'),
+            'requests': chunk['number_requests'].astype('float64'), 'note': chunk['note'].astype(str),
+            'date': chunk['timestamp'].dt.normalize(),
+        })
+        frame = frame[frame['load'].notna() & frame['date'].notna() & (frame['site'] != '')]
+        if frame.empty:
+            return len(chunk)
+
+        frame['load_squared'] = frame['load'] ** 2
+        grouped = frame.groupby(['site', 'page', 'date'], sort=False).agg(
+            rows=('load', 'size'), low=('load', 'min'), high=('load', 'max'), total=('load', 'sum'),
+            total_squares=('load_squared', 'sum'), request_rows=('requests', 'count'), request_total=('requests', 'sum'),
+        )
+        for (site, page, date), values in zip(grouped.index, grouped.itertuples(index=False)):
+            date = date.strftime('%Y-%m-%d')
+            self.dirty.add((site, page))
+            days = state['days'].setdefault(site, {}).setdefault(page, {})
+            days[date] = self.merge_day(days.get(date), [
+                int(values.rows), float(values.low), float(values.high), float(values.total),
+                float(values.total_squares), int(values.request_rows), float(values.request_total),
+            ])
+
+        for (site, page), url in frame.groupby(['site', 'page'], sort=False)['url'].first().items():
+            state['pages'].setdefault(site, {}).setdefault(page, url)
+
+        sketches = self.file_sketches(state)
+        for (site, page), loads in frame.groupby(['site', 'page'], sort=False)['load']:
+            sketch = sketches.setdefault(site, {}).setdefault(page, QuantileSketch(self.relative_accuracy))
+            for value in loads.to_numpy():
+                sketch.add(float(value))
+
+        baselines = frame[frame['note'] == 'Baseline']
+        for (site, page), loads in baselines.groupby(['site', 'page'], sort=False)['load']:
+            baseline = state['baselines'].setdefault(site, {}).setdefault(page, [0, 0.0, 0.0])
+            baseline[0] += int(loads.size)
+            baseline[1] += float(loads.sum())
+            baseline[2] += float((loads ** 2).sum())
+
+        # Reservoir sampling keeps every row equally likely to be in the sample however long the history
+        paired = frame[frame['requests'].notna()]
+        for site, requests, load in zip(paired['site'], paired['requests'].to_numpy(), paired['load'].to_numpy()):
+            seen, points = state['samples'].setdefault(site, [0, []])
+            seen += 1
+            if len(points) < self.RESERVOIR_SIZE:
+                points.append([float(requests), float(load)])
+            else:
+                slot = random.randrange(seen)
+                if slot < self.RESERVOIR_SIZE:
+                    points[slot] = [float(requests), float(load)]
+            state['samples'][site][0] = seen
+
+        return len(chunk)
+
+
+    # Sketches are decoded from the checkpoint the first time a file needs them
+    def file_sketches(self, state):
+        key = state['path']
+        if key not in self.sketches:
+            self.sketches[key] = {
+                site: {page: QuantileSketch.from_bytes(base64.b64decode(blob), self.relative_accuracy)
+                       for page, blob in pages.items()}
+                for site, pages in state['sketches'].items()
+            }
+        return self.sketches[key]
+
+
+    # [count, min, max, sum, sum of squares, request count, request sum]
+    @staticmethod
+    def merge_day(current, other):
+        if current is None:
+            return list(other)
+        return [
+            current[0] + other[0], min(current[1], other[1]), max(current[2], other[2]), current[3] + other[3],
+            current[4] + other[4], current[5] + other[5], current[6] + other[6],
+        ]
+
+
+    # Mean and sample standard deviation (as pandas' std) from a count, sum and sum of squares
+    @staticmethod
+    def mean_std(count, total, total_squares):
+        if count == 0:
+            return None, None
+        mean = total / count
+        if count < 2:
+            return mean, None
+        variance = max(total_squares - count * mean * mean, 0.0) / (count - 1)
+        return mean, math.sqrt(variance)
+
+
+    def sites(self):
+        return sorted({site for state in self.files.values() for site in state['days']})
+
+
+    def dirty_sites(self):
+        return sorted({site for site, _ in self.dirty})
+
+
+    # Everything known about one site, merged across its files
+    def site_summary(self, site):
+        summary = {'days': {}, 'sketches': {}, 'baselines': {}, 'samples': [], 'pages': {}}
+        for state in self.files.values():
+            for page, days in state['days'].get(site, {}).items():
+                merged = summary['days'].setdefault(page, {})
+                for date, day in days.items():
+                    merged[date] = self.merge_day(merged.get(date), day)
+
+            for page, sketch in self.file_sketches(state).get(site, {}).items():
+                summary['sketches'].setdefault(page, QuantileSketch(self.relative_accuracy)).merge(sketch)
+
+            for page, baseline in state['baselines'].get(site, {}).items():
+                merged = summary['baselines'].setdefault(page, [0, 0.0, 0.0])
+                for index, value in enumerate(baseline):
+                    merged[index] += value
+
+            summary['samples'] += state['samples'].get(site, [0, []])[1]
+            for page, url in state['pages'].get(site, {}).items():
+                summary['pages'].setdefault(page, url)
+
+        # Seeded, so an unchanged history gives the same sample (and the scatter plot is not redrawn)
+        if len(summary['samples']) > self.RESERVOIR_SIZE:
+            summary['samples'] = random.Random(0).sample(summary['samples'], self.RESERVOIR_SIZE)
+        return summary
+
+
+    def mark_drawn(self, site, page=None):
+        self.dirty = {pair for pair in self.dirty if pair[0] != site or (page is not None and pair[1] != page)}
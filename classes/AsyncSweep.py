@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+
+import aiohttp
+
+
+class AsyncSweep:
+    # measurement_options are passed to the measurement class as keyword arguments
+    def __init__(self, config, measurement_class, measurement_options=None, session_cache=None):
+        config = config or {}
+        self.measurement_class = measurement_class
+        self.session_cache = session_cache
+        self.measurement_options = measurement_options or {}
+        self.concurrency = int(config.get("concurrency", 20))
+        self.connection_limit = int(config.get("connection_limit", self.concurrency))
+        self.per_host_limit = int(config.get("per_host_limit", 6))
+        self.timeout = float(config.get("timeout", 30))
+        self.keepalive_timeout = float(config.get("keepalive_timeout", 30))
+
+
+    # One pooled session for the whole sweep so keep-alive connections are reused across pages.
+    # The connector enforces both the global and the per-host connection limits; concurrency caps pages in flight.
+    def create_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.per_host_limit,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[self.create_trace_config()])
+
+
+    # Requests made with trace_request_ctx={'dns': 0, 'connect': 0, 'queued': 0} get those seconds filled in.
+    # aiohttp does TLS inside connection creation, so 'connect' includes the handshake.
+    @staticmethod
+    def create_trace_config():
+        trace_config = aiohttp.TraceConfig()
+
+        def start(name):
+            async def handler(session, context, params):
+                context.started = getattr(context, 'started', {})
+                context.started[name] = time.perf_counter()
+            return handler
+
+        def end(name):
+            async def handler(session, context, params):
+                timings = context.trace_request_ctx
+                if isinstance(timings, dict):
+                    timings[name] = timings.get(name, 0.0) + time.perf_counter() - context.started[name]
+            return handler
+
+        trace_config.on_connection_queued_start.append(start('queued'))
+        trace_config.on_connection_queued_end.append(end('queued'))
+        trace_config.on_connection_create_start.append(start('create'))
+        trace_config.on_connection_create_end.append(end('create'))
+        trace_config.on_dns_resolvehost_start.append(start('dns'))
+        trace_config.on_dns_resolvehost_end.append(end('dns'))
+
+        return trace_config
+
+
+    # Measure every job and call on_result(job, metrics) as each one finishes.
+    # Jobs are dicts with at least a 'url' key and are pulled lazily, so the iterable can be a generator.
+    def run(self, jobs, on_result, sites=None):
+        self.open(sites)
+        try:
+            self.run_batch(jobs, on_result)
+        finally:
+            self.close()
+
+
+    # Start the event loop and session and log in to any sites that need it.
+    # Between open() and close() the session stays warm, so repeated batches reuse its connections.
+    def open(self, sites=None):
+        self.loop = asyncio.new_event_loop()
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sweep-writer')
+        self.session = self.loop.run_until_complete(self._open(sites or []))
+
+
+    def run_batch(self, jobs, on_result):
+        self.loop.run_until_complete(self._run_batch(iter(jobs), on_result))
+
+
+    def close(self):
+        try:
+            self.loop.run_until_complete(self.session.close())
+        finally:
+            self.loop.close()
+            self.writer.shutdown()
+
+
+    async def _open(self, sites):
+        session = self.create_session()
+        for site in sites:
+            if "authentication" in site:
+                await self.measurement_class.authenticate(site=site, session=session, session_cache=self.session_cache)
+
+        return session
+
+
+    async def _run_batch(self, jobs, on_result):
+        self.job_lock = asyncio.Lock()
+        workers = [
+            asyncio.create_task(self._worker(self.session, jobs, on_result))
+            for _ in range(self.concurrency)
+        ]
+        await asyncio.gather(*workers)
+
+
+    # Jobs can come from a generator that does blocking I/O (e.g. streaming a sitemap), so advance
+    # it on a thread to keep in-flight timings clean, and one worker at a time since generators aren't re-entrant
+    async def next_job(self, jobs):
+        async with self.job_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, next, jobs, None)
+
+
+    async def _worker(self, session, jobs, on_result):
+        while True:
+            job = await self.next_job(jobs)
+            if job is None:
+                break
+
+            measurement = self.measurement_class(job['url'], session, **self.measurement_options)
+
+            try:
+                metrics = await measurement.measure_performance()
+            except Exception as e:
+                # Network errors and timeouts, but also anything else a bad page throws (a malformed header or
+                # redirect, say): never let one page take a worker and its share of the jobs down
+                metrics = self.failed_metrics(measurement, e)
+
+            # on_result writes CSV rows, the results store and the journal (with fsyncs); doing that on the loop
+            # would stall every page in flight and inflate its load time, so it runs on the single writer thread,
+            # which also keeps the writes one at a time and in the order results arrive
+            await asyncio.get_running_loop().run_in_executor(self.writer, on_result, job, metrics)
+
+
+    @staticmethod
+    def failed_metrics(measurement, error):
+        metrics = measurement.get_performance_metrics()
+        metrics['loadTime'] = None
+        metrics['error'] = str(error) or error.__class__.__name__
+        return metrics
@@ -0,0 +1,295 @@
+from datetime import datetime
+import math
+import time
+
+from QuantileSketch import QuantileSketch
+from ResultsStore import ResultsStore
+
+# Named baseline snapshots, kept in the results store's database. A snapshot holds summary statistics
+# (count, mean, variance, min, max, p50, p95) for every page, measurement method, profile, cache mode and
+# metric of a run or time window, e.g. "before-deploy". Comparing is a keyed lookup of one summary against
+# another, with Welch's t-test for whether the difference in means is significant, so it costs one pass
+# over the rows summarised however many samples either side holds.
+class BaselineStore:
+    SERIES_COLUMNS = ['site', 'page_name', 'measurement_method', 'emulation_profile', 'cache_mode']
+    DEFAULT_METRICS = ['loadTime', 'ttfb', 'firstPaint', 'domContentLoaded', 'lcp']
+    STAT_COLUMNS = ['count', 'mean', 'variance', 'min', 'max', 'p50', 'p95']
+
+    # Shares the results store's connection and lock, like RollupStore
+    def __init__(self, results_store, config=None):
+        config = config or {}
+        self.results_store = results_store
+        self.connection = results_store.connection
+        self.lock = results_store.lock
+        self.alpha = config.get("alpha", 0.05)
+        self.relative_accuracy = config.get("relative_accuracy", 0.01)
+
+        columns = {key: (column, sql_type) for column, _, key, sql_type in ResultsStore.COLUMNS}
+        self.metrics = [
+            columns[key][0] for key in config.get("metrics", self.DEFAULT_METRICS)
+            if key in columns and columns[key][1] == 'REAL'
+        ]
+        if not results_store.read_only:
+            self.create_schema()
+
+
+    def create_schema(self):
+        with self.lock, self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS baselines (
+                    name TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    description TEXT,
+                    site TEXT,
+                    run_id TEXT,
+                    start REAL,
+                    end REAL,
+                    rows INTEGER NOT NULL
+                )
+            ''')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS baseline_stats (
+                    name TEXT NOT NULL,
+                    site TEXT NOT NULL,
+                    page_name TEXT NOT NULL,
+                    measurement_method TEXT NOT NULL,
+                    emulation_profile TEXT NOT NULL,
+                    cache_mode TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    mean REAL NOT NULL,
+                    variance REAL,
+                    min REAL NOT NULL,
+                    max REAL NOT NULL,
+                    p50 REAL,
+                    p95 REAL,
+                    PRIMARY KEY (name, site, page_name, metric, measurement_method, emulation_profile, cache_mode)
+                ) WITHOUT ROWID
+            ''')
+
+
+    # The most recent run, optionally for one site
+    def latest_run_id(self, site_url=None):
+        if site_url:
+            row = self.results_store.query_one(
+                'SELECT run_id FROM results WHERE site = ? ORDER BY timestamp DESC LIMIT 1', (site_url,)
+            )
+        else:
+            row = self.results_store.query_one('SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 1')
+        return row['run_id'] if row else None
+
+
+    # Summary statistics of the results rows in a run and/or time window (datetimes or epoch seconds),
+    # keyed by the series columns plus the metric. Failed loads and error responses are left out.
+    # Returns (summary, number of rows read).
+    def summarise(self, site_url=None, run_id=None, start=None, end=None):
+        sql = f'SELECT {", ".join(self.SERIES_COLUMNS + self.metrics)} FROM results WHERE (status_code IS NULL OR status_code < 400)'
+        params = []
+        if site_url:
+            sql += ' AND site = ?'
+            params.append(site_url)
+        if run_id:
+            sql += ' AND run_id = ?'
+            params.append(run_id)
+        if start is not None:
+            sql += ' AND timestamp >= ?'
+            params.append(ResultsStore.to_epoch(start))
+        if end is not None:
+            sql += ' AND timestamp < ?'
+            params.append(ResultsStore.to_epoch(end))
+
+        # Welford's running mean and sum of squared deviations, with a sketch for the percentiles
+        running = {}
+        rows = 0
+        with self.lock:
+            for row in self.connection.execute(sql, params):
+                rows += 1
+                series = tuple(row[column] or '' for column in self.SERIES_COLUMNS)
+                for metric in self.metrics:
+                    value = row[metric]
+                    if value is None:
+                        continue
+                    state = running.get(series + (metric,))
+                    if state is None:
+                        state = running[series + (metric,)] = [0, 0.0, 0.0, value, value, QuantileSketch(self.relative_accuracy)]
+                    state[0] += 1
+                    delta = value - state[1]
+                    state[1] += delta / state[0]
+                    state[2] += delta * (value - state[1])
+                    state[3] = min(state[3], value)
+                    state[4] = max(state[4], value)
+                    state[5].add(value)
+
+        summary = {
+            key: {
+                'count': count, 'mean': mean, 'variance': squares / (count - 1) if count > 1 else None,
+                'min': low, 'max': high, 'p50': sketch.quantile(0.5), 'p95': sketch.quantile(0.95),
+            }
+            for key, (count, mean, squares, low, high, sketch) in running.items()
+        }
+        return summary, rows
+
+
+    # Save a snapshot of a run or time window under name; returns the number of series stored.
+    # run_id 'latest' means the most recent run (of site_url, if given).
+    def create(self, name, site_url=None, run_id=None, start=None, end=None, description='', replace=False):
+        if run_id == 'latest':
+            run_id = self.latest_run_id(site_url)
+            if run_id is None:
+                raise ValueError('There are no runs in the results store')
+
+        if not replace and self.get(name):
+            raise ValueError(f'Baseline {name} already exists')
+        summary, rows = self.summarise(site_url, run_id, start, end)
+        if not summary:
+            raise ValueError(f'No results found for baseline {name}')
+
+        key_columns = ['name'] + self.SERIES_COLUMNS + ['metric']
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM baselines WHERE name = ?', (name,))
+            self.connection.execute('DELETE FROM baseline_stats WHERE name = ?', (name,))
+            self.connection.execute(
+                'INSERT INTO baselines (name, created_at, description, site, run_id, start, end, rows) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (name, time.time(), description, site_url, run_id,
+                 ResultsStore.to_epoch(start) if start is not None else None,
+                 ResultsStore.to_epoch(end) if end is not None else None, rows)
+            )
+            self.connection.executemany(
+                f'INSERT INTO baseline_stats ({", ".join(key_columns + self.STAT_COLUMNS)}) '
+                f'VALUES ({", ".join("?" for _ in key_columns + self.STAT_COLUMNS)})',
+                [(name,) + key + tuple(stats[column] for column in self.STAT_COLUMNS) for key, stats in summary.items()]
+            )
+        return len(summary)
+
+
+    def get(self, name):
+        return self.results_store.query_one('SELECT * FROM baselines WHERE name = ?', (name,))
+
+
+    def list(self):
+        return self.results_store.query('SELECT * FROM baselines ORDER BY created_at')
+
+
+    def delete(self, name):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM baseline_stats WHERE name = ?', (name,))
+            return self.connection.execute('DELETE FROM baselines WHERE name = ?', (name,)).rowcount
+
+
+    # A stored snapshot in the same shape as summarise() returns
+    def snapshot(self, name, site_url=None):
+        sql = 'SELECT * FROM baseline_stats WHERE name = ?'
+        params = [name]
+        if site_url:
+            sql += ' AND site = ?'
+            params.append(site_url)
+        return {
+            tuple(row[column] for column in self.SERIES_COLUMNS) + (row['metric'],):
+                {column: row[column] for column in self.STAT_COLUMNS}
+            for row in self.results_store.query(sql, params)
+        }
+
+
+    # Every series in both summaries, each with the baseline and current statistics, the change in the
+    # mean and the result of Welch's t-test. Positive changes are slower (every stored metric is lower-is-better).
+    def compare(self, baseline, current):
+        comparisons = []
+        for key, now in current.items():
+            before = baseline.get(key)
+            if before is None:
+                continue
+
+            t, degrees, p_value = self.welch(before, now)
+            change = now['mean'] - before['mean']
+            significant = p_value is not None and p_value < self.alpha
+            comparisons.append({
+                **dict(zip(self.SERIES_COLUMNS + ['metric'], key)),
+                'baseline': before, 'current': now, 'change': change,
+                'change_percent': change / before['mean'] * 100 if before['mean'] else None,
+                't': t, 'degrees_of_freedom': degrees, 'p_value': p_value, 'significant': significant,
+                'verdict': ('slower' if change > 0 else 'faster') if significant else 'no significant change',
+            })
+        return sorted(comparisons, key=lambda comparison: tuple(comparison[column] for column in self.SERIES_COLUMNS + ['metric']))
+
+
+    # Combine summaries of the same quantity (e.g. one page's series across methods), as count, mean
+    # and variance; min and max carry over but the percentiles cannot be combined exactly
+    @staticmethod
+    def merge(first, second):
+        if first is None:
+            return dict(second)
+        count = first['count'] + second['count']
+        delta = second['mean'] - first['mean']
+        squares = ((first['variance'] or 0) * (first['count'] - 1) + (second['variance'] or 0) * (second['count'] - 1)
+                   + delta * delta * first['count'] * second['count'] / count)
+        return {
+            'count': count, 'mean': first['mean'] + delta * second['count'] / count,
+            'variance': squares / (count - 1) if count > 1 else None,
+            'min': min(first['min'], second['min']), 'max': max(first['max'], second['max']), 'p50': None, 'p95': None,
+        }
+
+
+    # Welch's unequal-variance t-test on two summaries; (t, degrees of freedom, two-sided p-value), with
+    # None where either side has fewer than two samples
+    @classmethod
+    def welch(cls, first, second):
+        if first['count'] < 2 or second['count'] < 2 or first['variance'] is None or second['variance'] is None:
+            return None, None, None
+
+        first_error = first['variance'] / first['count']
+        second_error = second['variance'] / second['count']
+        error = first_error + second_error
+        difference = second['mean'] - first['mean']
+        if error == 0:
+            return None, None, 1.0 if difference == 0 else 0.0
+
+        t = difference / math.sqrt(error)
+        degrees = error * error / (first_error * first_error / (first['count'] - 1) + second_error * second_error / (second['count'] - 1))
+        p_value = cls.incomplete_beta(degrees / (degrees + t * t), degrees / 2, 0.5)
+        return t, degrees, p_value
+
+
+    # The regularised incomplete beta function I_x(a, b), by its continued fraction (Lentz's method).
+    # The two-sided p-value of Student's t with v degrees of freedom is I_{v/(v+t^2)}(v/2, 1/2).
+    @classmethod
+    def incomplete_beta(cls, x, a, b):
+        if x <= 0:
+            return 0.0
+        if x >= 1:
+            return 1.0
+        front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+        if x < (a + 1) / (a + b + 2):
+            return front * cls.beta_fraction(x, a, b) / a
+        return 1 - front * cls.beta_fraction(1 - x, b, a) / b
+
+
+    @staticmethod
+    def beta_fraction(x, a, b):
+        tiny = 1e-300
+        c = 1.0
+        d = 1 - (a + b) * x / (a + 1)
+        d = 1 / (d if abs(d) > tiny else tiny)
+        result = d
+        for m in range(1, 300):
+            for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                              -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+                d = 1 + numerator * d
+                d = 1 / (d if abs(d) > tiny else tiny)
+                c = 1 + numerator / c
+                c = c if abs(c) > tiny else tiny
+                result *= d * c
+            if abs(d * c - 1) < 1e-12:
+                break
+        return result
+
+
+    @staticmethod
+    def describe(baseline):
+        if baseline['run_id']:
+            source = f'run {baseline["run_id"]}'
+        else:
+            start = datetime.fromtimestamp(baseline['start']).strftime('%Y-%m-%d %H:%M') if baseline['start'] else 'the start'
+            end = datetime.fromtimestamp(baseline['end']).strftime('%Y-%m-%d %H:%M') if baseline['end'] else 'now'
+            source = f'{start} to {end}'
+        site = f' of {baseline["site"]}' if baseline['site'] else ''
+        return f'{baseline["name"]}: {source}{site}, {baseline["rows"]} rows' + (f' ({baseline["description"]})' if baseline['description'] else '')
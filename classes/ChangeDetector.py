@@ -0,0 +1,333 @@
+from datetime import datetime
+import json
+import os
+
+# Flags level shifts and variance increases in each page's history as rows are written, well before a slow
+# regression crosses target_load_time. Every series (site, page, method, profile, cache mode and metric)
+# keeps a handful of numbers:
+#   - a baseline level and spread (median and MAD, so an outlier can't skew them), learned from the first
+#     `warmup` values of the current regime and then held fixed, so a gradual drift keeps adding up instead
+#     of being absorbed into the baseline
+#   - two-sided CUSUM sums of the standardised values, which flag a shift up (regression) or down
+#   - a CUSUM of the absolute standardised values, which flags the spread getting wider
+# Standardised values are clipped at `clip`, so one outlier can't trigger an alert on its own. After an
+# alert the series learns a new baseline. Alerts go to the log and to a JSON Lines events file.
+class ChangeDetector:
+    DEFAULTS = {
+        'metrics': ['loadTime', 'ttfb', 'lcp'],
+        'warmup': 20,
+        'drift': 0.5,
+        'threshold': 8,
+        'variance_drift': 0.4,
+        'variance_threshold': 10,
+        'clip': 3,
+        'min_relative_std': 0.05,
+        'min_std': 0.005
+    }
+
+    # E|z| for a standard normal; the mean absolute deviation grows with the square root of the variance
+    MEAN_ABS_Z = 0.7979
+
+    def __init__(self, config, state_path, events_path, logger=None):
+        self.settings = dict(self.DEFAULTS, **{key: value for key, value in config.items() if key in self.DEFAULTS})
+        self.metrics = self.settings['metrics']
+        self.state_path = state_path
+        self.events_path = events_path
+        self.logger = logger
+        self.state = self.load_state()
+        self.dirty = False
+
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r') as file:
+            return json.load(file)
+
+
+    # Written once per sweep or batch, like last_run.json
+    def save_state(self):
+        if not self.dirty:
+            return
+
+        folder = os.path.dirname(self.state_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        temp_path = f'{self.state_path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.state, file)
+        os.replace(temp_path, self.state_path)
+        self.dirty = False
+
+
+    # Rows measured with a different backend, profile or cache mode aren't comparable, so each gets its own series
+    @staticmethod
+    def series_name(page_name, measurement_method, profile='', cache_mode=''):
+        return ' | '.join(str(part) for part in (page_name, measurement_method, profile, cache_mode) if part)
+
+
+    # 'window' holds the values seen while learning a baseline (at most `warmup` of them) and is empty afterwards
+    @staticmethod
+    def new_series():
+        return {'window': [], 'mean': None, 'std': None, 'hi': 0.0, 'hi_sum': 0.0, 'hi_n': 0,
+                'lo': 0.0, 'lo_sum': 0.0, 'lo_n': 0, 'var': 0.0, 'var_sum': 0.0, 'var_n': 0}
+
+
+    # Feed one written row; returns the events it raised. Failed loads and error pages are skipped.
+    def update(self, site_url, page_name, metrics, measurement_method, timestamp, run_id=''):
+        if not self.is_usable(metrics.get('loadTime'), metrics.get('statusCode')):
+            return []
+
+        series = self.series_name(page_name, measurement_method, metrics.get('emulationProfile'), metrics.get('cacheMode'))
+        site_state = self.state.setdefault(site_url, {}).setdefault(series, {})
+        events = []
+
+        for metric in self.metrics:
+            value = metrics.get(metric)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+
+            state = site_state.setdefault(metric, self.new_series())
+            event = self.step(state, float(value))
+            if event:
+                event.update({
+                    'timestamp': datetime.fromtimestamp(timestamp).isoformat(' ', 'microseconds'),
+                    'runId': run_id, 'site': site_url, 'series': series, 'metric': metric, 'source': 'scan'
+                })
+                events.append(event)
+
+        self.dirty = True
+        self.record(events)
+        return events
+
+
+    @staticmethod
+    def is_usable(load_time, status_code):
+        return load_time is not None and not (isinstance(status_code, int) and status_code >= 400)
+
+
+    # One CUSUM step in O(1). Returns an event dict when the series changes, otherwise None.
+    def step(self, state, value):
+        settings = self.settings
+
+        # Learning the baseline for this regime
+        if state['mean'] is None:
+            state['window'].append(value)
+            if len(state['window']) >= settings['warmup']:
+                state['mean'], state['std'] = self.baseline(sorted(state['window']))
+                state['window'] = []
+            return None
+
+        mean = state['mean']
+        std = state['std']
+        z = max(-settings['clip'], min(settings['clip'], (value - mean) / std))
+
+        # Each side remembers the values since it was last at zero, which is where the change most likely began
+        state['hi'], state['hi_sum'], state['hi_n'] = self.accumulate(state['hi'], z - settings['drift'], state['hi_sum'], state['hi_n'], value)
+        state['lo'], state['lo_sum'], state['lo_n'] = self.accumulate(state['lo'], -z - settings['drift'], state['lo_sum'], state['lo_n'], value)
+        state['var'], state['var_sum'], state['var_n'] = self.accumulate(
+            state['var'], abs(z) - self.MEAN_ABS_Z - settings['variance_drift'], state['var_sum'], state['var_n'], abs(z)
+        )
+
+        event = None
+        if state['hi'] > settings['threshold'] or state['lo'] > settings['threshold']:
+            direction = 'up' if state['hi'] >= state['lo'] else 'down'
+            level_sum, count = (state['hi_sum'], state['hi_n']) if direction == 'up' else (state['lo_sum'], state['lo_n'])
+            event = {
+                'kind': 'level_shift', 'direction': direction, 'value': value,
+                'baseline': round(mean, 6), 'baselineStd': round(std, 6),
+                'level': round(level_sum / count, 6), 'samples': count
+            }
+        elif state['var'] > settings['variance_threshold']:
+            event = {
+                'kind': 'variance_increase', 'direction': 'up', 'value': value,
+                'baseline': round(mean, 6), 'baselineStd': round(std, 6),
+                'varianceRatio': round(self.variance_ratio(state['var_sum'], state['var_n']), 3), 'samples': state['var_n']
+            }
+
+        # Start learning the new regime from the next value
+        if event:
+            state.update(self.new_series())
+        return event
+
+
+    @classmethod
+    def variance_ratio(cls, abs_z_sum, count):
+        return (abs_z_sum / count / cls.MEAN_ABS_Z) ** 2
+
+
+    @staticmethod
+    def accumulate(total, increment, value_sum, count, value):
+        if total + increment <= 0:
+            return 0.0, 0.0, 0
+        return total + increment, value_sum + value, count + 1
+
+
+    # Median and scaled MAD of the sorted warm-up values. The spread is floored so a page that has been
+    # perfectly steady doesn't alert on the first millisecond of noise.
+    def baseline(self, values):
+        median = self.median(values)
+        mad = self.median(sorted(abs(value - median) for value in values))
+        return median, max(1.4826 * mad, abs(median) * self.settings['min_relative_std'], self.settings['min_std'])
+
+
+    @staticmethod
+    def median(sorted_values):
+        middle = len(sorted_values) // 2
+        if len(sorted_values) % 2:
+            return sorted_values[middle]
+        return (sorted_values[middle - 1] + sorted_values[middle]) / 2
+
+
+    # Append events to the events file and report them; regressions are warnings, improvements are info
+    def record(self, events):
+        if not events:
+            return
+
+        folder = os.path.dirname(self.events_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with open(self.events_path, 'a') as file:
+            for event in events:
+                file.write(json.dumps(event) + '\n')
+
+        for event in events:
+            message = self.describe(event)
+            if self.logger:
+                if event['direction'] == 'up':
+                    self.logger.warning(message)
+                else:
+                    self.logger.info(message)
+            if event['source'] == 'scan':
+                colour = '\033[91m' if event['direction'] == 'up' else '\033[92m'
+                print(f'{colour}{message}\033[0m')
+
+
+    @staticmethod
+    def describe(event):
+        where = f'{event["site"]} {event["series"]} {event["metric"]}'
+        if event['kind'] == 'variance_increase':
+            return (f'Variance increase: {where} is {event["varianceRatio"]:.1f}x as variable as its baseline '
+                    f'(over {event["samples"]} runs)')
+
+        label = 'Regression' if event['direction'] == 'up' else 'Improvement'
+        return (f'{label}: {where} moved from {event["baseline"]:.3f} to {event["level"]:.3f} '
+                f'(over the last {event["samples"]} runs)')
+
+
+    # Replay stored history through the same detector, vectorised with NumPy. rows must be ordered by time within
+    # each series and carry the results table columns. Replaces the state for the series it sees and returns the events.
+    def backfill(self, rows):
+        import numpy as np
+        from ResultsStore import ResultsStore
+
+        columns = {key: column for column, _, key, _ in ResultsStore.COLUMNS}
+        grouped = {}
+        for row in rows:
+            if not self.is_usable(row['load_time'], row['status_code']):
+                continue
+            series = self.series_name(row['page_name'], row['measurement_method'], row.get('emulation_profile'), row.get('cache_mode'))
+            grouped.setdefault((row['site'], series), []).append(row)
+
+        events = []
+        for (site_url, series), series_rows in grouped.items():
+            site_state = self.state.setdefault(site_url, {}).setdefault(series, {})
+            for metric in self.metrics:
+                column = columns.get(metric)
+                if column is None:
+                    continue
+
+                points = [(row['timestamp'], row[column], row['run_id']) for row in series_rows if row.get(column) is not None]
+                if not points:
+                    continue
+
+                timestamps = np.array([point[0] for point in points], dtype=float)
+                values = np.array([point[1] for point in points], dtype=float)
+                state, found = self.backfill_series(np, values)
+                site_state[metric] = state
+
+                for index, event in found:
+                    event.update({
+                        'timestamp': datetime.fromtimestamp(timestamps[index]).isoformat(' ', 'microseconds'),
+                        'runId': points[index][2], 'site': site_url, 'series': series, 'metric': metric, 'source': 'backfill'
+                    })
+                    events.append(event)
+
+        self.dirty = True
+        self.record(events)
+        return events
+
+
+    # The same rules as step(), a regime at a time. A CUSUM that resets at zero is the cumulative sum minus its
+    # running minimum, so each regime is a few array operations; only the (rare) alerts are looped over.
+    def backfill_series(self, np, values):
+        settings = self.settings
+        warmup = settings['warmup']
+        events = []
+        start = 0
+
+        while len(values) - start > warmup:
+            state = self.new_series()
+            state['mean'], state['std'] = self.baseline(np.sort(values[start:start + warmup]).tolist())
+            std = state['std']
+
+            rest = values[start + warmup:]
+            z = np.clip((rest - state['mean']) / std, -settings['clip'], settings['clip'])
+            hi = self.reset_cusum(np, z - settings['drift'])
+            lo = self.reset_cusum(np, -z - settings['drift'])
+            var = self.reset_cusum(np, np.abs(z) - self.MEAN_ABS_Z - settings['variance_drift'])
+
+            level_alarms = np.flatnonzero((hi > settings['threshold']) | (lo > settings['threshold']))
+            variance_alarms = np.flatnonzero(var > settings['variance_threshold'])
+            alarms = level_alarms[:1].tolist() + variance_alarms[:1].tolist()
+            if not alarms:
+                # No change: carry the end-of-history sums into the online state
+                state['hi'], state['hi_sum'], state['hi_n'] = self.run_state(np, hi, rest)
+                state['lo'], state['lo_sum'], state['lo_n'] = self.run_state(np, lo, rest)
+                state['var'], state['var_sum'], state['var_n'] = self.run_state(np, var, np.abs(z))
+                return state, events
+
+            index = min(alarms)
+            if len(level_alarms) and level_alarms[0] == index:
+                direction = 'up' if hi[index] >= lo[index] else 'down'
+                cusum = hi if direction == 'up' else lo
+                _, level_sum, count = self.run_state(np, cusum[:index + 1], rest[:index + 1])
+                event = {
+                    'kind': 'level_shift', 'direction': direction, 'value': float(rest[index]),
+                    'baseline': round(state['mean'], 6), 'baselineStd': round(std, 6),
+                    'level': round(level_sum / count, 6), 'samples': count
+                }
+            else:
+                _, variance_sum, count = self.run_state(np, var[:index + 1], np.abs(z[:index + 1]))
+                event = {
+                    'kind': 'variance_increase', 'direction': 'up', 'value': float(rest[index]),
+                    'baseline': round(state['mean'], 6), 'baselineStd': round(std, 6),
+                    'varianceRatio': round(self.variance_ratio(variance_sum, count), 3), 'samples': count
+                }
+
+            events.append((start + warmup + index, event))
+            start += warmup + index + 1
+
+        # Too few values since the last change to finish learning a baseline
+        state = self.new_series()
+        for value in values[start:]:
+            self.step(state, float(value))
+        return state, events
+
+
+    # max(0, S[n-1] + x[n]) for every n, without a Python loop
+    @staticmethod
+    def reset_cusum(np, increments):
+        totals = np.cumsum(increments)
+        return totals - np.minimum(np.minimum.accumulate(totals), 0)
+
+
+    # The final CUSUM value, plus the sum and count of the values since it was last at zero
+    @staticmethod
+    def run_state(np, cusum, values):
+        zeros = np.flatnonzero(cusum <= 0)
+        first = zeros[-1] + 1 if len(zeros) else 0
+        since = values[first:]
+        return float(cusum[-1]), float(since.sum()), int(len(since))
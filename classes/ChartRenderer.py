@@ -0,0 +1,115 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import pandas as pd
+
+# Draws the charts for data-analysis.py. Each chart is described by a spec: a dict of plain data with
+# its kind, path, title and series. Specs can be sent to worker processes and fingerprinted, and a chart
+# whose spec has not changed since it was last drawn is skipped. Charts are drawn on standalone Agg
+# figures rather than through pyplot, so no display or GUI backend is needed and nothing is kept
+# between charts.
+class ChartRenderer:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+
+
+    @staticmethod
+    def fingerprint(spec):
+        return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+    # Draw the specs whose fingerprint differs from the one recorded for their path (or whose file is
+    # missing). Returns the fingerprints of every spec, for the caller to keep for the next run.
+    def render(self, specs, drawn):
+        fingerprints = {spec['path']: self.fingerprint(spec) for spec in specs}
+        pending = [spec for spec in specs
+                   if drawn.get(spec['path']) != fingerprints[spec['path']] or not os.path.exists(spec['path'])]
+
+        if self.workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+                for message in executor.map(self.draw, pending, chunksize=4):
+                    print(message)
+        else:
+            for spec in pending:
+                print(self.draw(spec))
+        return fingerprints, len(pending)
+
+
+    @classmethod
+    def draw(cls, spec):
+        figure = Figure(figsize=spec.get('size', (10, 6)))
+        FigureCanvasAgg(figure)
+        axes = figure.subplots()
+        getattr(cls, f'draw_{spec["kind"]}')(figure, axes, spec)
+
+        axes.set_title(spec['title'])
+        axes.set_xlabel(spec['xlabel'])
+        axes.set_ylabel(spec['ylabel'])
+        figure.tight_layout()
+        folder = os.path.dirname(spec['path'])
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        figure.savefig(spec['path'])
+        return spec['message']
+
+
+    @staticmethod
+    def draw_bar(figure, axes, spec):
+        axes.bar(spec['labels'], spec['values'], color='skyblue')
+        axes.tick_params(axis='x', labelrotation=45)
+        for label in axes.get_xticklabels():
+            label.set_horizontalalignment('right')
+
+
+    # A mean line over a shaded min to max band, by date
+    @staticmethod
+    def draw_band(figure, axes, spec):
+        dates = pd.to_datetime(spec['dates'])
+        axes.plot(dates, spec['means'], marker='o', label=spec['label'])
+        axes.fill_between(dates, spec['lows'], spec['highs'], alpha=0.1)
+        axes.tick_params(axis='x', labelrotation=45)
+        axes.legend()
+
+
+    @staticmethod
+    def draw_line(figure, axes, spec):
+        axes.plot(pd.to_datetime(spec['dates']), spec['values'], marker='o')
+        axes.tick_params(axis='x', labelrotation=45)
+
+
+    # Boxes from precomputed quartiles and whiskers (the stats matplotlib's bxp takes)
+    @staticmethod
+    def draw_box(figure, axes, spec):
+        axes.bxp(spec['boxes'], showfliers=False)
+        axes.tick_params(axis='x', labelrotation=45)
+        for label in axes.get_xticklabels():
+            label.set_horizontalalignment('right')
+
+
+    # Weighted values, so bucket midpoints and their counts give the histogram of the raw values
+    @staticmethod
+    def draw_histogram(figure, axes, spec):
+        axes.hist(spec['values'], bins=spec.get('bins', 20), weights=spec['weights'])
+
+
+    @staticmethod
+    def draw_scatter(figure, axes, spec):
+        axes.scatter(spec['x'], spec['y'])
+
+
+    # Rows by columns of values, annotated when there are few enough cells to read
+    @staticmethod
+    def draw_heatmap(figure, axes, spec):
+        image = axes.imshow(spec['values'], aspect='auto', cmap='YlGnBu')
+        figure.colorbar(image, ax=axes, label=spec.get('colorbar', ''))
+        if len(spec['rows']) * len(spec['columns']) <= 400:
+            for row, values in enumerate(spec['values']):
+                for column, value in enumerate(values):
+                    if value is not None and value == value:
+                        axes.text(column, row, f'{value:.1f}', ha='center', va='center', fontsize=8)
+        axes.set_xticks(range(len(spec['columns'])), spec['columns'], rotation=45, ha='right')
+        axes.set_yticks(range(len(spec['rows'])), spec['rows'])
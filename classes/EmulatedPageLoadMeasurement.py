@@ -0,0 +1,243 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+import asyncio
+import codecs
+import re
+import time
+
+from AsyncRequestsPerformanceMeasurement import AsyncRequestsPerformanceMeasurement
+from BasePerformanceMeasurement import BasePerformanceMeasurement
+
+# @import "x.css", @import url(x.css) and url(...) references inside CSS
+CSS_URL_PATTERN = re.compile(r'''@import\s+['"]([^'"]+)['"]|url\(\s*['"]?([^'")]+?)['"]?\s*\)''', re.IGNORECASE)
+
+
+# Collects subresource references from HTML as it is fed, like a browser's preload scanner
+class ResourceParser(HTMLParser):
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.discovered = []
+        self.in_head = True
+        self.in_style = False
+
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == 'body':
+            self.in_head = False
+        elif tag == 'base' and attrs.get('href'):
+            self.base_url = urljoin(self.base_url, attrs['href'])
+        elif tag == 'link':
+            rel = (attrs.get('rel') or '').lower().split()
+            href = attrs.get('href')
+            if href and 'stylesheet' in rel:
+                self.add(href, 'css', blocking=True)
+            elif href and ('preload' in rel or 'modulepreload' in rel):
+                self.add(href, 'css' if attrs.get('as') == 'style' else 'other')
+            elif href and 'icon' in rel:
+                self.add(href, 'other')
+        elif tag == 'script' and attrs.get('src'):
+            # Classic scripts block the parser; async, defer and module scripts don't
+            blocking = not any(name in attrs for name in ('async', 'defer')) and attrs.get('type') != 'module'
+            self.add(attrs['src'], 'other', blocking=blocking)
+        elif tag in ('img', 'source', 'input', 'video'):
+            src = attrs.get('src') or attrs.get('poster')
+            if src and (tag != 'input' or attrs.get('type') == 'image'):
+                self.add(src, 'other')
+            elif attrs.get('srcset'):
+                # Browsers pick one candidate; take the first as the default density
+                self.add(attrs['srcset'].split(',')[0].strip().split(' ')[0], 'other')
+        elif tag == 'style':
+            self.in_style = True
+
+        if attrs.get('style'):
+            self.add_css_urls(attrs['style'], self.base_url)
+
+
+    def handle_endtag(self, tag):
+        if tag == 'style':
+            self.in_style = False
+        elif tag == 'head':
+            self.in_head = False
+
+
+    def handle_data(self, data):
+        if self.in_style:
+            self.add_css_urls(data, self.base_url)
+
+
+    def add_css_urls(self, css, base_url):
+        for import_url, url in CSS_URL_PATTERN.findall(css):
+            if import_url:
+                self.add(import_url, 'css', base_url=base_url)
+            else:
+                self.add(url, 'css' if url.lower().split('?')[0].endswith('.css') else 'other', base_url=base_url)
+
+
+    def add(self, url, kind, blocking=False, base_url=None):
+        url = url.strip()
+        if not url or url.startswith(('data:', 'javascript:', 'about:', '#')):
+            return
+        self.discovered.append((urljoin(base_url or self.base_url, url).split('#')[0], kind, blocking and self.in_head))
+
+
+    # Hand over everything found since the last call
+    def pop_discovered(self):
+        discovered, self.discovered = self.discovered, []
+        return discovered
+
+
+class EmulatedPageLoadMeasurement(BasePerformanceMeasurement):
+    def __init__(self, url, session, page_host_limit=6, max_resources=500):
+        super().__init__(url)
+        self.session = session
+        self.page_host_limit = page_host_limit
+        self.max_resources = max_resources
+
+        self.host_limits = {}
+        self.seen = set()
+        self.tasks = []
+        self.blocking_tasks = []
+        self.started_tasks = []
+        self.request_count = 0
+        self.total_bytes = 0
+        self.failed_requests = 0
+
+
+    @staticmethod
+    async def authenticate(site, session, session_cache=None):
+        await AsyncRequestsPerformanceMeasurement.authenticate(site=site, session=session, session_cache=session_cache)
+
+
+    # firstPaint and domContentLoaded are emulated: the document plus its render-blocking
+    # stylesheets, and the document plus every blocking stylesheet and script in the head
+    def get_performance_metrics(self):
+        metrics = {
+            'loadTime': 0,
+            'statusCode': 0,
+            'firstPaint': '',
+            'domContentLoaded': '',
+            'numberRequests': 0,
+            'pageWeightBytes': 0
+        }
+        return metrics
+
+
+    # Download the document, start fetching subresources as soon as the streaming parser finds them,
+    # and report the time until the last one (including fonts and images referenced from CSS) arrives.
+    # If the page fails partway, the fetches still running are cancelled so they don't hold on to the
+    # shared connection pool.
+    async def measure_performance(self):
+        try:
+            return await self.load_page()
+        finally:
+            await self.cancel_outstanding()
+
+
+    async def load_page(self):
+        measured_at = time.time()
+        start_time = time.perf_counter_ns()
+        self.seen.add(self.url)
+
+        async with self.session.get(self.url) as response:
+            status_code = response.status
+            parser = ResourceParser(str(response.url))
+            decoder = codecs.getincrementaldecoder(self.get_charset(response))(errors='replace')
+
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                self.total_bytes += len(chunk)
+                parser.feed(decoder.decode(chunk))
+                self.schedule(parser.pop_discovered())
+
+            parser.feed(decoder.decode(b'', final=True))
+            parser.close()
+            self.schedule(parser.pop_discovered())
+
+        self.request_count += 1
+        document_time = time.perf_counter_ns()
+
+        # Render-blocking stylesheets gate first paint; blocking scripts as well gate DOMContentLoaded
+        stylesheets = [task for task, kind in self.blocking_tasks if kind == 'css']
+        await asyncio.gather(*stylesheets)
+        first_paint_time = max(time.perf_counter_ns(), document_time)
+        await asyncio.gather(*[task for task, _ in self.blocking_tasks])
+        dom_content_loaded_time = time.perf_counter_ns()
+
+        # Stylesheets add more tasks as they load, so keep going until nothing new turns up
+        while self.tasks:
+            tasks, self.tasks = self.tasks, []
+            await asyncio.gather(*tasks)
+
+        end_time = time.perf_counter_ns()
+
+        metrics = self.get_performance_metrics()
+        metrics['measuredAt'] = measured_at
+        metrics['loadTime'] = round((end_time - start_time) / 1e9, 4)
+        metrics['statusCode'] = status_code
+        metrics['firstPaint'] = round((first_paint_time - start_time) / 1e9, 4)
+        metrics['domContentLoaded'] = round((dom_content_loaded_time - start_time) / 1e9, 4)
+        metrics['numberRequests'] = self.request_count
+        metrics['pageWeightBytes'] = self.total_bytes
+        metrics['failedRequests'] = self.failed_requests
+
+        return metrics
+
+
+    # Cancel unfinished fetches and collect every fetch's outcome, so none is left running or unretrieved
+    async def cancel_outstanding(self):
+        for task in self.started_tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self.started_tasks, return_exceptions=True)
+
+
+    def schedule(self, resources):
+        for url, kind, blocking in resources:
+            if url in self.seen or len(self.seen) > self.max_resources or not url.startswith(('http://', 'https://')):
+                continue
+            self.seen.add(url)
+
+            task = asyncio.ensure_future(self.fetch(url, kind))
+            self.tasks.append(task)
+            self.started_tasks.append(task)
+            if blocking:
+                self.blocking_tasks.append((task, kind))
+
+
+    # Fetch one subresource under a browser-like limit on parallel connections per host
+    async def fetch(self, url, kind):
+        host = urlsplit(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.page_host_limit)
+
+        async with self.host_limits[host]:
+            try:
+                async with self.session.get(url) as response:
+                    if kind == 'css' and response.status == 200:
+                        body = await response.read()
+                        self.total_bytes += len(body)
+
+                        # Browsers only fetch CSS url()s that match the page, so this slightly over-counts
+                        parser = ResourceParser(str(response.url))
+                        parser.add_css_urls(body.decode(self.get_charset(response), errors='replace'), str(response.url))
+                        self.schedule(parser.pop_discovered())
+                    else:
+                        async for chunk in response.content.iter_chunked(64 * 1024):
+                            self.total_bytes += len(chunk)
+            except Exception:
+                # Network errors and timeouts, but also a bad URL or anything else one resource throws:
+                # a browser shows the page without it, so count it as a failed request and carry on
+                self.failed_requests += 1
+
+        self.request_count += 1
+
+
+    # The response's declared charset, or utf-8 when there is none or Python doesn't know it
+    @staticmethod
+    def get_charset(response):
+        try:
+            return codecs.lookup(response.charset or 'utf-8').name
+        except LookupError:
+            return 'utf-8'
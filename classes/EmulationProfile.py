@@ -0,0 +1,132 @@
+import copy
+
+# Used when a profile asks for a mobile user agent and the headers config doesn't list one
+DEFAULT_MOBILE_USER_AGENT = (
+    'Mozilla/5.0 (Linux; Android 11; moto g power (2022)) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36'
+)
+
+
+# A named set of network, CPU and device conditions applied to a Chrome driver over DevTools Protocol
+class EmulationProfile:
+    # Network figures follow the Lighthouse and DevTools presets: latency is the added round trip in
+    # milliseconds and throughput is in kilobits per second. cpu_slowdown multiplies script and layout time.
+    BUILT_IN = {
+        'desktop': {},
+        'desktop cable': {
+            'network': {'latency_ms': 40, 'download_kbps': 10240, 'upload_kbps': 10240},
+            'cpu_slowdown': 1,
+            'device': {'width': 1350, 'height': 940, 'device_scale_factor': 1, 'mobile': False}
+        },
+        '4G mobile': {
+            'network': {'latency_ms': 150, 'download_kbps': 1638.4, 'upload_kbps': 750},
+            'cpu_slowdown': 4,
+            'device': {'width': 412, 'height': 823, 'device_scale_factor': 1.75, 'mobile': True},
+            'user_agent': 'mobile-user-agents.chrome'
+        },
+        'slow 3G': {
+            'network': {'latency_ms': 400, 'download_kbps': 400, 'upload_kbps': 400},
+            'cpu_slowdown': 6,
+            'device': {'width': 412, 'height': 823, 'device_scale_factor': 1.75, 'mobile': True},
+            'user_agent': 'mobile-user-agents.chrome'
+        }
+    }
+
+    def __init__(self, name, settings, user_agent=None):
+        self.name = name
+        self.network = settings.get('network')
+        self.cpu_slowdown = settings.get('cpu_slowdown', 1)
+        self.device = settings.get('device')
+        self.user_agent = user_agent
+
+
+    # Every setting is sent on each apply, so switching a driver between profiles never leaves
+    # throttling from the previous one behind
+    def apply(self, driver):
+        if getattr(driver, 'emulation_profile', None) == self.name:
+            return
+
+        if not hasattr(driver, 'default_user_agent'):
+            driver.default_user_agent = driver.execute_cdp_cmd('Browser.getVersion', {})['userAgent']
+
+        driver.execute_cdp_cmd('Network.enable', {})
+        if self.network:
+            driver.execute_cdp_cmd('Network.emulateNetworkConditions', {
+                'offline': False,
+                'latency': self.network.get('latency_ms', 0),
+                'downloadThroughput': self.to_bytes_per_second(self.network.get('download_kbps')),
+                'uploadThroughput': self.to_bytes_per_second(self.network.get('upload_kbps'))
+            })
+        else:
+            driver.execute_cdp_cmd('Network.emulateNetworkConditions', {
+                'offline': False, 'latency': 0, 'downloadThroughput': -1, 'uploadThroughput': -1
+            })
+
+        driver.execute_cdp_cmd('Emulation.setCPUThrottlingRate', {'rate': self.cpu_slowdown})
+
+        if self.device:
+            mobile = self.device.get('mobile', False)
+            driver.execute_cdp_cmd('Emulation.setDeviceMetricsOverride', {
+                'width': self.device['width'],
+                'height': self.device['height'],
+                'deviceScaleFactor': self.device.get('device_scale_factor', 1),
+                'mobile': mobile
+            })
+            driver.execute_cdp_cmd('Emulation.setTouchEmulationEnabled', {'enabled': mobile})
+        else:
+            driver.execute_cdp_cmd('Emulation.clearDeviceMetricsOverride', {})
+            driver.execute_cdp_cmd('Emulation.setTouchEmulationEnabled', {'enabled': False})
+
+        driver.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': self.user_agent or driver.default_user_agent})
+        driver.emulation_profile = self.name
+
+
+    # None or a non-positive value turns throughput throttling off
+    @staticmethod
+    def to_bytes_per_second(kbps):
+        if not kbps or kbps <= 0:
+            return -1
+        return kbps * 1024 / 8
+
+
+# The built-in profiles plus any defined under selenium.profiles, resolved once per name
+class EmulationProfiles:
+    def __init__(self, config):
+        selenium_config = config.get('selenium', {})
+        self.default = selenium_config.get('profile', 'desktop')
+        self.headers = config.get('headers', {})
+        self.settings = copy.deepcopy(EmulationProfile.BUILT_IN)
+        self.settings.update(selenium_config.get('profiles', {}))
+        self.profiles = {}
+
+
+    # A site can pick its own profile; otherwise selenium.profile applies
+    def for_site(self, site):
+        return self.get(site.get('profile') or self.default)
+
+
+    def get(self, name):
+        if name not in self.profiles:
+            if name not in self.settings:
+                raise ValueError(f"Unknown emulation profile: {name}")
+
+            settings = self.settings[name]
+            self.profiles[name] = EmulationProfile(name, settings, self.resolve_user_agent(settings.get('user_agent')))
+
+        return self.profiles[name]
+
+
+    # user_agent is either a literal string or "<group>.<browser>" naming a list in the headers config,
+    # e.g. "mobile-user-agents.chrome"; the first entry in the list is used so runs stay comparable
+    def resolve_user_agent(self, user_agent):
+        if not user_agent or '.' not in user_agent or ' ' in user_agent:
+            return user_agent
+
+        group, browser = user_agent.split('.', 1)
+        if group not in self.headers and group not in ('desktop-user-agents', 'mobile-user-agents'):
+            return user_agent
+
+        agents = self.headers.get(group, {}).get(browser, [])
+        if agents:
+            return agents[0]
+        return DEFAULT_MOBILE_USER_AGENT if group == 'mobile-user-agents' else None
@@ -0,0 +1,123 @@
+import io
+import os
+import re
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from ResultsStore import ResultsStore
+
+# Reads the speed_check.csv files written by the scanner and the selenium_*_tests.csv files written by
+# main.py into one normalised frame. Columns are named as in the results store (timestamp, site, page_name,
+# page_url, the metric columns, measurement_method, note) plus the source file. Text is categorical,
+# REAL metrics are float64 (timings from perf_counter_ns carry more digits than float32 holds) and INTEGER
+# metrics nullable Int32, and timestamps are parsed as each block is read. Files are read in blocks of
+# whole lines, so memory follows the block size rather than the file.
+# AnalysisCheckpoint keeps the offset each file has been read to, so a run only reads the rows added since.
+class HistoryLoader:
+    BLOCK_BYTES = 8 * 1024 * 1024
+    TEXT_COLUMNS = ['site', 'page_name', 'page_url', 'measurement_method', 'note', 'source']
+    # A site is its scheme and host, so a site configured with a path shares one key with its pages' URLs
+    SITE_PATTERN = r'^([a-zA-Z]+://[^/]+)'
+
+    # Yield (normalised frame, offset after it) for each block of whole lines after offset, or after the
+    # header when offset is None. A last line without its newline is left for the next read, since a
+    # scan may still be writing it.
+    @classmethod
+    def read_rows(cls, path, offset=None):
+        with open(path, 'rb') as file:
+            header = file.readline()
+            if not header.endswith(b'\n'):
+                return
+            columns = list(pd.read_csv(io.BytesIO(header), nrows=0).columns)
+            if offset is None:
+                offset = len(header)
+            file.seek(offset)
+
+            source = os.path.basename(path)
+            remainder = b''
+            while True:
+                block = file.read(cls.BLOCK_BYTES)
+                if not block:
+                    break
+                block = remainder + block
+                end = block.rfind(b'\n') + 1
+                remainder = block[end:]
+                if end == 0:
+                    continue
+
+                chunk = pd.read_csv(io.BytesIO(block[:end]), names=columns, header=None, dtype=str,
+                                    keep_default_na=False, on_bad_lines='warn')
+                offset += end
+                yield cls.normalise(chunk, source), offset
+
+
+    # Map either CSV layout onto the results store's columns
+    @classmethod
+    def normalise(cls, chunk, source):
+        blank = pd.Series('', index=chunk.index)
+        frame = pd.DataFrame({'timestamp': cls.parse_timestamps(chunk)}, index=chunk.index)
+
+        # main.py's files name the site; speed_check.csv rows belong to the site of the page URL
+        page_url = chunk.get('Page URL', blank)
+        site_url = chunk['Site URL'] if 'Site URL' in chunk else page_url
+        frame['site'] = site_url.str.extract(cls.SITE_PATTERN, expand=False).fillna('')
+        frame['page_name'] = chunk.get('Page Name', blank)
+        frame['page_url'] = page_url
+
+        for name, header, _, sql_type in ResultsStore.COLUMNS:
+            values = chunk.get(header, blank)
+            if sql_type == 'TEXT':
+                frame[name] = values
+            elif sql_type == 'REAL':
+                frame[name] = pd.to_numeric(values, errors='coerce').astype('float64')
+            else:
+                frame[name] = pd.to_numeric(values, errors='coerce').round().astype('Int32')
+
+        # main.py's files record page weight in megabytes
+        if 'Site URL' in chunk:
+            megabytes = pd.to_numeric(chunk.get('Page Weight Bytes', blank), errors='coerce')
+            frame['page_weight_bytes'] = (megabytes * 1000000).round().astype('Int32')
+
+        frame['measurement_method'] = chunk.get('Measurement Method', blank)
+        frame['note'] = chunk.get('Note', blank)
+        frame['source'] = source
+        text_columns = cls.TEXT_COLUMNS + [name for name, _, _, sql_type in ResultsStore.COLUMNS if sql_type == 'TEXT']
+        return frame.astype({name: 'category' for name in text_columns})
+
+
+    # Each measurement's own time where the file records it, otherwise the row's timestamp
+    @staticmethod
+    def parse_timestamps(chunk):
+        timestamps = pd.Series(pd.NaT, index=chunk.index, dtype='datetime64[ns]')
+        if 'Measured At' in chunk:
+            timestamps = pd.to_datetime(chunk['Measured At'], format='ISO8601', errors='coerce')
+        for timestamp_format in ResultsStore.TIMESTAMP_FORMATS:
+            missing = timestamps.isna()
+            if not missing.any():
+                break
+            timestamps[missing] = pd.to_datetime(chunk.loc[missing, 'Timestamp'], format=timestamp_format, errors='coerce')
+        return timestamps.astype('datetime64[ns]')
+
+
+    # The site key of a URL as normalise() derives it, e.g. for matching the results store's site URLs
+    @classmethod
+    def site_key(cls, url):
+        match = re.match(cls.SITE_PATTERN, url or '')
+        return match.group(1) if match else ''
+
+
+    # Concatenate frames, merging the categories of text columns so they stay categorical
+    @classmethod
+    def concat(cls, frames, columns=None):
+        if not frames:
+            frame = cls.normalise(pd.DataFrame(columns=['Timestamp']), '')
+            return frame[columns] if columns else frame
+        if len(frames) == 1:
+            return frames[0].reset_index(drop=True)
+
+        frame = pd.concat(frames, ignore_index=True)
+        for name in frames[0].columns:
+            if isinstance(frames[0][name].dtype, pd.CategoricalDtype):
+                frame[name] = union_categoricals([part[name] for part in frames])
+        return frame
@@ -0,0 +1,72 @@
+from collections import defaultdict
+import subprocess
+import sys
+import time
+
+# Replays start-up for a measurement method in a fresh interpreter under `python -X importtime`
+# and reports where the time goes: the slowest top-level packages and the slowest single modules
+class ImportProfile:
+    def __init__(self, classes_dir, measurement_method):
+        self.classes_dir = classes_dir
+        self.measurement_method = measurement_method
+        self.modules = []
+        self.wall_time = 0
+
+
+    # The same imports main.py and the scanner make before the first page is measured
+    def run(self):
+        code = (
+            'import sys, argparse, json, os; '
+            f'sys.path.insert(0, {self.classes_dir!r}); '
+            'import PerformanceScanner; '
+            'from MeasurementBackends import MeasurementBackends; '
+            f'MeasurementBackends.load({self.measurement_method!r})'
+        )
+
+        start_time = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+        self.wall_time = time.perf_counter() - start_time
+
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'Import profile failed')
+
+        self.modules = self.parse(result.stderr)
+        return self.modules
+
+
+    # Lines look like "import time:       412 |       1893 |   requests.adapters",
+    # where the indent of the name gives its depth in the import tree
+    @staticmethod
+    def parse(output):
+        modules = []
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+            modules.append((int(self_us), int(cumulative_us), name.strip(), depth))
+        return modules
+
+
+    def report(self, limit=15):
+        packages = defaultdict(int)
+        total_us = 0
+        for _, cumulative_us, name, depth in self.modules:
+            # Top-level imports' cumulative times add up to the whole import phase
+            if depth == 0:
+                packages[name.split('.')[0]] += cumulative_us
+                total_us += cumulative_us
+
+        print(f'\nStart-up import profile for {self.measurement_method}')
+        print(f'Interpreter start and imports: {self.wall_time * 1000:.0f} ms '
+              f'({total_us / 1000:.0f} ms importing {len(self.modules)} modules)\n')
+
+        print('Slowest packages (cumulative)')
+        for name, cumulative_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            share = cumulative_us / total_us * 100 if total_us else 0
+            print(f'{cumulative_us / 1000:>9.1f} ms {share:>5.1f}%  {name}')
+
+        print('\nSlowest modules (self)')
+        for self_us, _, name, _ in sorted(self.modules, reverse=True)[:limit]:
+            print(f'{self_us / 1000:>9.1f} ms  {name}')
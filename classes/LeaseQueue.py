@@ -0,0 +1,145 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# A local job queue with leases, kept in SQLite so it needs no broker. A worker claims jobs for
+# lease_seconds and renews the lease with heartbeats; jobs whose lease runs out go back to the queue
+# for another worker, until max_attempts is reached.
+class LeaseQueue:
+    def __init__(self, path, lease_seconds=60, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        # Shared by the coordinator's request threads, like ResultsStore
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.create_schema()
+
+
+    def create_schema(self):
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    run_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )
+            ''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS jobs_run_state ON jobs (run_id, state, lease_expires)')
+
+
+    # Queue the jobs for a run; payloads must be JSON serialisable. Returns the number added.
+    def add(self, run_id, payloads):
+        count = 0
+        with self.lock, self.connection:
+            for payload in payloads:
+                self.connection.execute('INSERT INTO jobs (run_id, payload) VALUES (?, ?)', (run_id, json.dumps(payload)))
+                count += 1
+        return count
+
+
+    # Drop a run's jobs, e.g. before a resumed run queues what is still missing. Results for dropped
+    # jobs are then turned away by complete(). Returns the number removed.
+    def clear(self, run_id):
+        with self.lock, self.connection:
+            return self.connection.execute('DELETE FROM jobs WHERE run_id = ?', (run_id,)).rowcount
+
+
+    # Lease up to count jobs to a worker: pending ones first, then any whose lease has expired.
+    # Returns (claimed, expired), where expired lists jobs that ran out of attempts and won't be retried.
+    def claim(self, run_id, worker, count):
+        now = time.time()
+        claimed = []
+        expired = []
+
+        with self.lock, self.connection:
+            rows = self.connection.execute('''
+                SELECT id, payload, attempts, worker FROM jobs
+                WHERE run_id = ? AND (state = 'pending' OR (state = 'leased' AND lease_expires < ?))
+                ORDER BY id LIMIT ?
+            ''', (run_id, now, count)).fetchall()
+
+            for row in rows:
+                if row['attempts'] >= self.max_attempts:
+                    self.connection.execute(
+                        "UPDATE jobs SET state = 'failed', error = ? WHERE id = ?",
+                        (f'Lease expired {row["attempts"]} times (last worker {row["worker"]})', row['id'])
+                    )
+                    expired.append(dict(json.loads(row['payload']), id=row['id'], previous_worker=row['worker']))
+                    continue
+
+                self.connection.execute(
+                    "UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + self.lease_seconds, row['id'])
+                )
+                claimed.append(dict(json.loads(row['payload']), id=row['id'], previous_worker=row['worker']))
+
+        return claimed, expired
+
+
+    # Extend the leases a worker still holds; returns the ids that were renewed.
+    # A job missing from the result has been handed to someone else and its result will be ignored.
+    def heartbeat(self, worker, job_ids):
+        if not job_ids:
+            return []
+
+        with self.lock, self.connection:
+            placeholders = ', '.join('?' for _ in job_ids)
+            rows = self.connection.execute(
+                f"SELECT id FROM jobs WHERE worker = ? AND state = 'leased' AND id IN ({placeholders})",
+                [worker] + list(job_ids)
+            ).fetchall()
+            renewed = [row['id'] for row in rows]
+            self.connection.executemany(
+                'UPDATE jobs SET lease_expires = ? WHERE id = ?',
+                [(time.time() + self.lease_seconds, job_id) for job_id in renewed]
+            )
+        return renewed
+
+
+    # Accept a result only from the worker holding the lease, so a reassigned job is recorded once
+    def complete(self, worker, job_id):
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET state = 'done', lease_expires = NULL WHERE id = ? AND worker = ? AND state = 'leased'",
+                (job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+
+    def get_payload(self, job_id):
+        with self.lock:
+            row = self.connection.execute('SELECT payload FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row['payload']) if row else None
+
+
+    # Job counts for a run by state: pending, leased, done and failed
+    def counts(self, run_id):
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        with self.lock:
+            for row in self.connection.execute('SELECT state, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY state', (run_id,)):
+                counts[row[0]] = row[1]
+        return counts
+
+
+    def is_finished(self, run_id):
+        counts = self.counts(run_id)
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
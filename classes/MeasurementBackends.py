@@ -0,0 +1,53 @@
+import importlib
+
+# Every measurement method and the classes it runs on, as (module, class) pairs. A module is only
+# imported the first time its method is used, so a requests run never loads selenium or aiohttp.
+class MeasurementBackends:
+    BACKENDS = {
+        'requests': {
+            'measurement': ('RequestsPerformanceMeasurement', 'RequestsPerformanceMeasurement')
+        },
+        'async_requests': {
+            'measurement': ('AsyncRequestsPerformanceMeasurement', 'AsyncRequestsPerformanceMeasurement'),
+            'sweep': ('AsyncSweep', 'AsyncSweep')
+        },
+        'emulated': {
+            'measurement': ('EmulatedPageLoadMeasurement', 'EmulatedPageLoadMeasurement'),
+            'sweep': ('AsyncSweep', 'AsyncSweep')
+        },
+        'selenium': {
+            'measurement': ('SeleniumPerformanceMeasurement', 'SeleniumPerformanceMeasurement'),
+            'pool': ('SeleniumWorkerPool', 'SeleniumWorkerPool')
+        }
+    }
+
+    # Add a backend (or replace one) without touching this file, e.g.
+    # MeasurementBackends.register('playwright', measurement=('PlaywrightMeasurement', 'PlaywrightMeasurement'))
+    @classmethod
+    def register(cls, measurement_method, **classes):
+        cls.BACKENDS[measurement_method] = classes
+
+
+    # The class filling a role ('measurement', 'sweep' or 'pool') for a method, imported on first use
+    @classmethod
+    def get(cls, measurement_method, role='measurement'):
+        if measurement_method not in cls.BACKENDS:
+            raise ValueError(f"Unknown measurement method: {measurement_method}")
+
+        classes = cls.BACKENDS[measurement_method]
+        if role not in classes:
+            raise ValueError(f"Measurement method {measurement_method} has no {role}")
+
+        module_name, class_name = classes[role]
+        return getattr(importlib.import_module(module_name), class_name)
+
+
+    # Import everything a method needs up front
+    @classmethod
+    def load(cls, measurement_method):
+        return [cls.get(measurement_method, role) for role in cls.BACKENDS.get(measurement_method, {})]
+
+
+    @classmethod
+    def names(cls):
+        return list(cls.BACKENDS)
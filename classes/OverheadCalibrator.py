@@ -0,0 +1,43 @@
+from StandInServer import StandInServer
+
+# Measures the fixed cost the measuring harness adds to every load (WebDriver round trips, HTTP client
+# and event loop overhead) by loading a blank page from a local server that responds immediately.
+# With nothing to wait for on the network, the load time reported for that page is all overhead.
+class OverheadCalibrator:
+    BLANK_PAGE_BYTES = 200
+
+    def __init__(self, scanner, samples=10):
+        self.scanner = scanner
+        self.samples = max(int(samples), 1)
+
+
+    # Returns the median overhead in seconds for the measurement method (None if every blank load failed),
+    # and keeps the individual load times in self.load_times
+    def calibrate(self, measurement_method):
+        server = StandInServer(latency=0, body_bytes=self.BLANK_PAGE_BYTES, subresources=0).start()
+        site = {'url': server.url, 'enabled': True}
+        jobs = [
+            {'site': site, 'page': {'name': f'Calibration {index}', 'url': '/blank'}, 'url': f'{server.url}/blank'}
+            for index in range(self.samples)
+        ]
+        results = []
+
+        try:
+            run_batch, close = self.scanner.open_runner([site], measurement_method)
+            try:
+                # A first load pays for connection set-up and warming the browser, which real pages pay only once too
+                run_batch(iter(jobs[:1]), lambda job, metrics: None)
+                run_batch(iter(jobs), lambda job, metrics: results.append(metrics.get('loadTime')))
+            finally:
+                close()
+        finally:
+            server.stop()
+
+        self.load_times = sorted(load_time for load_time in results if load_time is not None)
+        if not self.load_times:
+            return None
+
+        middle = len(self.load_times) // 2
+        if len(self.load_times) % 2:
+            return self.load_times[middle]
+        return (self.load_times[middle - 1] + self.load_times[middle]) / 2
@@ -0,0 +1,194 @@
+import heapq
+import itertools
+import os
+import random
+import signal
+import threading
+import time
+
+# Pages are measured on their own intervals, or, with "scheduler": {"enabled": true}, in budgeted cycles
+# where ScanScheduler picks the pages that most need measuring
+class PerformanceDaemon:
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.config = scanner.config
+        self.logger = scanner.logger
+
+        daemon_config = self.config.get("daemon", {})
+        self.default_interval = float(daemon_config.get("default_interval", 300))
+        self.jitter = float(daemon_config.get("jitter", 0.1))
+        self.measurement_method = self.config.get("speed_check_method", "selenium")
+
+        self.stop_event = threading.Event()
+        self.schedule = []
+        self.sequence = itertools.count()
+        self.files = {}
+        self.scheduler = self.create_scheduler()
+
+
+    # Run until SIGTERM/SIGINT, measuring each page whenever it falls due
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+        sites = self.scanner.get_sites()
+        for site in sites:
+            self.scanner.setup_folders(site)
+        if self.scheduler:
+            self.run_cycles(sites)
+            return
+
+        self.schedule_pages(sites)
+        if not self.schedule:
+            self.logAndPrint('Daemon has no pages to measure')
+            return
+
+        self.logAndPrint(f'Daemon started: {len(self.schedule)} pages using {self.measurement_method}')
+        run_batch, close = self.scanner.open_runner(sites, self.measurement_method)
+
+        try:
+            while not self.stop_event.is_set():
+                batch = self.pop_due_jobs()
+                if not batch:
+                    next_due = self.schedule[0][0] - time.monotonic()
+                    self.stop_event.wait(max(next_due, 0))
+                    continue
+
+                self.scanner.report_timestamp = self.scanner.new_run_id()
+                run_batch(self.until_stopped(batch), self.on_result)
+                self.scanner.save_last_runs()
+        finally:
+            close()
+            self.flush()
+            self.logAndPrint('Daemon stopped')
+
+
+    # Every cycle_seconds, measure the pages the scheduler picks within the cycle's budget
+    def run_cycles(self, sites):
+        jobs = list(self.scanner.build_jobs(sites))
+        if not jobs:
+            self.logAndPrint('Daemon has no pages to measure')
+            return
+
+        settings = self.scheduler.settings
+        removed = self.scheduler.prune(jobs)
+        if removed:
+            self.logger.info(f'Scheduler dropped {removed} pages that are no longer configured')
+        shortfall = self.scheduler.coverage_shortfall(len(jobs))
+        if shortfall:
+            self.logger.warning(
+                f'{len(jobs)} pages can\'t all be measured within max_staleness at {settings["max_pages"]} pages every '
+                f'{settings["cycle_seconds"]:g} seconds; overdue pages will go over the budget'
+            )
+
+        self.logAndPrint(f'Daemon started: {len(jobs)} pages using {self.measurement_method}, '
+                         f'up to {settings["max_pages"]} every {settings["cycle_seconds"]:g} seconds')
+        run_batch, close = self.scanner.open_runner(sites, self.measurement_method)
+
+        try:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                batch, overdue = self.scheduler.plan(jobs)
+                if batch:
+                    self.logger.info(f'Cycle: measuring {len(batch)} of {len(jobs)} pages ({overdue} overdue)')
+                    self.scanner.report_timestamp = self.scanner.new_run_id()
+                    run_batch(self.until_stopped(batch), self.on_result)
+                    self.scanner.save_last_runs()
+                    self.scheduler.save_state()
+
+                self.stop_event.wait(max(settings['cycle_seconds'] - (time.monotonic() - started), 0))
+        finally:
+            close()
+            self.flush()
+            self.logAndPrint('Daemon stopped')
+
+
+    # Budgeted scheduling is opt-in; without it every page keeps its fixed interval
+    def create_scheduler(self):
+        scheduler_config = self.config.get("scheduler", {})
+        if not scheduler_config.get("enabled", False):
+            return None
+
+        from ScanScheduler import ScanScheduler
+        return ScanScheduler(
+            scheduler_config, self.config.get("target_load_time", 3),
+            os.path.join(self.scanner.script_root, scheduler_config.get("state_path", "data/scheduler_state.json"))
+        )
+
+
+    def handle_signal(self, signum, frame):
+        self.logger.info(f'Received signal {signum}, finishing in-flight measurements')
+        self.stop_event.set()
+
+
+    # Every page gets a random first slot within its own interval so start-up load is spread out
+    def schedule_pages(self, sites):
+        now = time.monotonic()
+        for site in sites:
+            for page in self.scanner.get_pages(site):
+                interval = self.get_interval(page)
+                self.push(now + random.uniform(0, interval), interval, site, page)
+
+
+    def get_interval(self, page):
+        return float(page.get("interval", self.default_interval))
+
+
+    def push(self, due, interval, site, page):
+        heapq.heappush(self.schedule, (due, next(self.sequence), interval, site, page))
+
+
+    # Pop everything that is due now and book each page's next slot.
+    # Slots are anchored to the previous due time so they don't drift, with jitter on top.
+    def pop_due_jobs(self):
+        now = time.monotonic()
+        batch = []
+
+        while self.schedule and self.schedule[0][0] <= now:
+            due, _, interval, site, page = heapq.heappop(self.schedule)
+            next_due = max(due + interval, now) + interval * random.uniform(-self.jitter, self.jitter)
+            self.push(next_due, interval, site, page)
+
+            batch.append({
+                'site': site,
+                'page': page,
+                'url': f'{site["url"]}{page["url"]}'
+            })
+
+        return batch
+
+
+    # Stop handing out jobs once shutdown is requested; measurements already running still complete
+    def until_stopped(self, jobs):
+        for job in jobs:
+            if self.stop_event.is_set():
+                return
+            yield job
+
+
+    def on_result(self, job, metrics):
+        site = job['site']
+        domain_folder = self.scanner.get_domain_folder(site)
+        if domain_folder not in self.files:
+            self.files[domain_folder] = self.scanner.open_results_csv(site)
+
+        self.scanner.correct_overhead(metrics)
+        self.scanner.report_load_time(job['page'], metrics, site=site)
+        events = self.scanner.write_row(self.files[domain_folder], site, job['page'], metrics, self.measurement_method)
+        if self.scheduler:
+            self.scheduler.update(job, metrics, events)
+
+
+    def flush(self):
+        for file in self.files.values():
+            file.flush()
+            file.close()
+        self.files = {}
+        self.scanner.save_last_runs()
+        if self.scheduler:
+            self.scheduler.save_state()
+
+
+    def logAndPrint(self, message):
+        self.logger.info(message)
+        print(message)
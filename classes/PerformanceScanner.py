@@ -1,12 +1,21 @@
 from datetime import datetime
+import csv
 import json
 import logging
 import os
 import re
-import requests
-
-from RequestsPerformanceMeasurement import RequestsPerformanceMeasurement
-from SeleniumPerformanceMeasurement import SeleniumPerformanceMeasurement
+import sys
+import time
+
+from AdaptiveSampler import AdaptiveSampler
+from ChangeDetector import ChangeDetector
+from EmulationProfile import EmulationProfiles
+from MeasurementBackends import MeasurementBackends
+from ResourceTimingStore import ResourceTimingStore
+from ResultsStore import ResultsStore
+from RollupStore import RollupStore
+from RunJournal import RunJournal
+from SessionCache import SessionCache
 
 class PerformanceScanner:
     config = None
@@ -16,28 +25,132 @@ class PerformanceScanner:
     note = None
     script_root = None
     selenium_driver = None
-
-    def __init__(self, script_root, note):
+    requests_session = None
+    sampler = None
+    harness_overhead = None
+    legacy_csv = None
+
+    # With daemon=True the scanner keeps running and measures pages on their configured intervals.
+    # coordinator=True hands the sweep out to workers; worker_url makes this a worker for that coordinator.
+    # measurement_method overrides speed_check_method from config.json.
+    # calibrate=True only measures and reports the harness overhead for the measurement method.
+    # resume is the run ID of an unfinished sweep (or 'latest') to carry on with, measuring only what's missing.
+    # legacy_csv is a file that also gets every row in main.py's original selenium_*_tests.csv layout.
+    def __init__(self, script_root, note, daemon=False, measurement_method=None, coordinator=False, worker_url=None,
+                 calibrate=False, resume=None, legacy_csv=None):
         self.script_root = script_root
         self.note = note
         self.config = self.read_config()
-        self.report_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        if measurement_method:
+            self.config["speed_check_method"] = measurement_method
+        self.report_timestamp = self.new_run_id()
 
         self.logger = self.setup_global_logger()
         self.welcome_banner()
 
+        # Single sweeps keep a journal of planned and completed jobs; daemon cycles and workers don't
+        self.journal = None
+        if not daemon and not worker_url and not calibrate:
+            self.journal = self.open_journal(resume)
+            if self.journal is None and resume:
+                return
+
         self.selenium_driver = None
-        self.requests_session = requests.Session()
+        self.emulation_profiles = EmulationProfiles(self.config)
+        self.session_cache = self.open_session_cache()
+        self.requests_session = None
+        # Workers send their results to the coordinator and keep nothing locally
+        self.results_store = None if worker_url else self.open_results_store()
+        self.resource_store = ResourceTimingStore(self.results_store) if self.results_store else None
+        self.rollup_store = self.open_rollup_store() if self.results_store else None
+        self.change_detector = None if worker_url else self.open_change_detector()
+        self.legacy_csv = self.open_legacy_csv(legacy_csv) if legacy_csv else None
+        self.last_runs = {}
+        self.dirty_last_runs = set()
+        self.harness_overhead = None
 
         measurement_method = self.config.get("speed_check_method", "selenium")
-        for site in self.config.get("sites", []):
-            self.setup_folders(site)
-            self.run_speed_check(site, measurement_method)
+        selenium_workers = self.config.get("selenium", {}).get("workers", 1)
+
+        # The coordinator doesn't measure anything, and workers calibrate once they know the run's method
+        if not calibrate and not coordinator and not worker_url and self.config.get("calibration", {}).get("enabled", False):
+            self.calibrate_overhead(measurement_method)
+
+        if not calibrate and self.config.get("sampling", {}).get("enabled", False):
+            self.warn_if_sampling_ignored(measurement_method, selenium_workers, daemon, coordinator, worker_url)
+
+        try:
+            if calibrate:
+                self.calibrate_overhead(measurement_method)
+            elif daemon:
+                from PerformanceDaemon import PerformanceDaemon
+                PerformanceDaemon(self).run()
+            elif coordinator:
+                from ScanCoordinator import ScanCoordinator
+                ScanCoordinator(self, resume=bool(resume)).run()
+            elif worker_url:
+                from ScanWorker import ScanWorker
+                ScanWorker(self, worker_url).run()
+            elif measurement_method in ('async_requests', 'emulated'):
+                sites = self.get_sites()
+                for site in sites:
+                    self.setup_folders(site)
+                self.run_async_speed_check(sites, measurement_method)
+            elif measurement_method == 'selenium' and selenium_workers > 1:
+                sites = self.get_sites()
+                for site in sites:
+                    self.setup_folders(site)
+                self.run_pooled_speed_check(sites)
+            else:
+                self.sampler = self.create_sampler()
+                for site in self.get_sites():
+                    self.setup_folders(site)
+                    self.run_speed_check(site, measurement_method)
+        except BaseException:
+            self.close_journal(finish=False)
+            raise
+
+        self.close_journal()
+
+        if not daemon and not worker_url and not calibrate:
+            self.summary()
 
         if self.selenium_driver:
             self.selenium_driver.quit()
+
+        if self.legacy_csv:
+            self.legacy_csv.close()
+
+        if self.results_store:
+            self.results_store.close()
     
 
+    # Only the serial requests and single-browser selenium sweeps take repeated samples; say so rather
+    # than quietly measuring each page once when sampling is enabled for anything else
+    def warn_if_sampling_ignored(self, measurement_method, selenium_workers, daemon, coordinator, worker_url):
+        if daemon:
+            ignored_by = 'daemon mode'
+        elif coordinator or worker_url:
+            ignored_by = 'distributed scans'
+        elif measurement_method in ('async_requests', 'emulated'):
+            ignored_by = f'the {measurement_method} method'
+        elif measurement_method == 'selenium' and selenium_workers > 1:
+            ignored_by = f'the selenium worker pool ("workers": {selenium_workers})'
+        else:
+            return
+
+        self.logAndPrint(
+            f'"sampling" is enabled but {ignored_by} measures each page once; only requests and selenium '
+            f'with "workers": 1 take repeated samples', 'warning'
+        )
+
+
+    # Run IDs are the start time to the microsecond, so sweeps started in the same second stay apart
+    @staticmethod
+    def new_run_id():
+        return datetime.now().strftime(ResultsStore.RUN_ID_FORMAT)
+
+
     # Print the welcome banner to the console
     def welcome_banner(self):
         self.clear_console()
@@ -55,8 +168,10 @@ class PerformanceScanner:
         print('\n')
 
 
+    # ANSI clear-screen rather than spawning `clear`; skipped when output goes to a log file
     def clear_console(self):
-        os.system('cls' if os.name == 'nt' else 'clear')
+        if sys.stdout.isatty():
+            print('\033[2J\033[H', end='', flush=True)
 
 
     # Create folders for each site if they don't already exist
@@ -86,6 +201,29 @@ class PerformanceScanner:
             self.logger.info(f'Folders already exist for {domain_folder}')
 
 
+    # Sites may be configured as a keyed object (see config.json) or a plain list; disabled sites are skipped
+    def get_sites(self):
+        sites = self.config.get("sites", [])
+        if isinstance(sites, dict):
+            sites = list(sites.values())
+
+        return [site for site in sites if site.get("enabled", True)]
+
+
+    # The configured pages, followed by any pages from the site's sitemap that aren't already configured.
+    # Sitemap pages are streamed, so this is safe to iterate for sites with tens of thousands of URLs.
+    def get_pages(self, site):
+        pages = self.config.get("pages", [])
+        yield from pages
+
+        if "sitemap" in site:
+            from SitemapSource import SitemapSource
+            configured_urls = {page["url"] for page in pages}
+            for page in SitemapSource(site, session=self.get_requests_session(), logger=self.logger):
+                if page["url"] not in configured_urls:
+                    yield page
+
+
     def get_domain_folder(self, site):
         self.logger.info('> Extracting domain folder from URL')
         site_url = site['url']
@@ -125,41 +263,38 @@ class PerformanceScanner:
         return logger
 
 
+    # Print the latest result for every page (and cache mode) from each site's last_run.json index.
+    # The index only holds one entry per page and mode, so this never touches the CSV history.
     def summary(self):
         print('')
         print('-' * 25)
         print('Speed Test Report Summary')
         print('-' * 25)
 
-        for site in self.config.get("sites", []):
-            self.logAndPrint(f'Site: {site["url"]}', 'info')
+        target_load_time = self.config.get("target_load_time", 3)
 
-            for page in self.config.get("pages", []):
-                url = f'{site["url"]}{page["url"]}'
-                page_name = page["name"]
-                target_load_time = self.config.get("target_load_time", 3)
-
-                # Read data from the consolidated CSV file
-                domain_folder = self.get_domain_folder(site)
-                csv_path = f'{self.script_root}/data/{domain_folder}/speed_check.csv'
-                slow_pages = 0
-
-                if os.path.exists(csv_path):
-                    with open(csv_path, 'r') as f:
-                        lines = f.readlines()[1:]  # Skip the header row
-                        for line in lines:
-                            page_name_csv, load_time = line.strip().split(',')
-                            load_time = float(load_time)
-
-                            if page_name_csv == page_name:
-                                if load_time > target_load_time:
-                                    print(f'\033[91m{page_name} Page ({url}) - Load Time: {load_time:.2f} seconds\033[0m', 'info')
-                                    self.logger.error(f'{page_name} Page ({url}) - Load Time: {load_time:.2f} seconds (SLOW)')
-                                    slow_pages += 1
-                                else:
-                                    print(f'\033[92m{page_name} Page ({url}) - Load Time: {load_time:.2f} seconds\033[0m')
-                                    self.logger.success(f'{page_name} Page ({url}) - Load Time: {load_time:.2f} seconds (OK)')
-                                
+        for site in self.get_sites():
+            self.logAndPrint(f'Site: {site["url"]}', 'info')
+            slow_pages = 0
+
+            for page_name, result in self.load_last_run(site).items():
+                url = result.get('url')
+                load_time = result.get('loadTime')
+                label = f'{result.get("page", page_name)} Page ({url})'
+                if result.get('cacheMode'):
+                    label += f' [{result["cacheMode"]} cache]'
+
+                if load_time is None:
+                    print(f'\033[91m{label} - Failed\033[0m')
+                    self.logger.error(f'{label} - Failed')
+                    slow_pages += 1
+                elif load_time > target_load_time:
+                    print(f'\033[91m{label} - Load Time: {load_time:.2f} seconds\033[0m')
+                    self.logger.error(f'{label} - Load Time: {load_time:.2f} seconds (SLOW)')
+                    slow_pages += 1
+                else:
+                    print(f'\033[92m{label} - Load Time: {load_time:.2f} seconds\033[0m')
+                    self.logger.info(f'{label} - Load Time: {load_time:.2f} seconds (OK)')
 
             if slow_pages > 0:
                 self.logAndPrint(f'Slow Pages: {slow_pages} (Longer than {target_load_time} seconds)', 'error')
@@ -167,18 +302,83 @@ class PerformanceScanner:
                 self.logAndPrint(f'All pages meet the target load time ({target_load_time} seconds)', 'success')
 
 
+    def get_last_run_path(self, site):
+        domain_folder = self.get_domain_folder(site)
+        return f'{self.script_root}/data/{domain_folder}/last_run.json'
+
+
+    # The latest result for each page of a site, keyed by page name, or by page name and cache mode for
+    # sampled rows (cached in memory once read)
+    def load_last_run(self, site):
+        last_run_path = self.get_last_run_path(site)
+        if last_run_path not in self.last_runs:
+            pages = {}
+            if os.path.exists(last_run_path):
+                with open(last_run_path, 'r') as f:
+                    pages = json.load(f)
+            self.last_runs[last_run_path] = pages
+
+        return self.last_runs[last_run_path]
+
+
+    # With more than one cache mode each mode keeps its own entry; entries keyed the other way are
+    # dropped, so switching sampling on or off doesn't leave stale results in the summary
+    def update_last_run(self, site, page, metrics, measurement_method):
+        pages = self.load_last_run(site)
+        cache_mode = metrics.get('cacheMode') or None
+        mode_keys = [f'{page["name"]} ({mode} cache)' for mode in AdaptiveSampler.CACHE_MODES]
+        for stale_key in mode_keys if cache_mode is None else [page["name"]]:
+            pages.pop(stale_key, None)
+
+        key = page["name"] if cache_mode is None else f'{page["name"]} ({cache_mode} cache)'
+        pages[key] = {
+            'page': page["name"],
+            'url': f'{site["url"]}{page["url"]}',
+            'runId': self.report_timestamp,
+            'loadTime': metrics.get('loadTime'),
+            'statusCode': metrics.get('statusCode'),
+            'cacheMode': cache_mode,
+            'measurementMethod': measurement_method
+        }
+        self.dirty_last_runs.add(self.get_last_run_path(site))
+
+
+    # Write the changed last_run.json files; called once per sweep or batch rather than per row
+    def save_last_runs(self):
+        for last_run_path in self.dirty_last_runs:
+            temp_path = f'{last_run_path}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self.last_runs[last_run_path], f, indent=4)
+            os.replace(temp_path, last_run_path)
+
+        self.dirty_last_runs = set()
+
+        if self.change_detector:
+            self.change_detector.save_state()
+
+        # Roll this sweep's rows up into the hourly and daily tiers; the retention policy is applied by
+        # rollup-history.py, so a sweep never deletes raw rows
+        if self.rollup_store:
+            self.rollup_store.update()
+
+
     def create_measurement(self, measurement_method, site, page_url):
         # Create and return the appropriate measurement object
         url = f'{site["url"]}{page_url}'
         
         if measurement_method == 'requests':
             print('Using Requests')
-            return RequestsPerformanceMeasurement(url, self.requests_session)
+            return MeasurementBackends.get('requests')(url, self.get_requests_session(), self.get_requests_timeout())
         elif measurement_method == 'selenium':
+            selenium_config = self.config.get("selenium", {})
+            profile = self.emulation_profiles.for_site(site)
+            SeleniumPerformanceMeasurement = MeasurementBackends.get('selenium')
             if not self.selenium_driver:
-                selenium_config = self.config.get("selenium", {})
-                self.selenium_driver = SeleniumPerformanceMeasurement.create_driver(selenium_config)
-            return SeleniumPerformanceMeasurement(url, self.selenium_driver)
+                self.selenium_driver = SeleniumPerformanceMeasurement.create_driver(selenium_config, profile=profile)
+            return SeleniumPerformanceMeasurement(
+                url, self.selenium_driver, selenium_config.get("settle_ms", 1000),
+                selenium_config.get("capture_resources", True), profile
+            )
         else:
             raise ValueError(f"Unknown measurement method: {measurement_method}")
 
@@ -188,74 +388,489 @@ class PerformanceScanner:
         self.logger.info(f'Running Speed Check for {site["url"]}')
         print(f'\nRunning Speed Check for {site["url"]}\n')
 
-        domain_folder = self.get_domain_folder(site)
-        csv_file = f'{self.script_root}/data/{domain_folder}/speed_check.csv'
-        write_header = not os.path.exists(csv_file)
-
-        # Perform authentication if necessary
-        if "authentication" in site:            
+        # Perform authentication if necessary, logging in the driver or session that takes the measurements
+        if "authentication" in site:
             if measurement_method == 'selenium':
-                driver = SeleniumPerformanceMeasurement.create_driver(self.config.get("selenium", {}))
-                SeleniumPerformanceMeasurement.authenticate(site=site, driver=driver)
+                SeleniumPerformanceMeasurement = MeasurementBackends.get('selenium')
+                if not self.selenium_driver:
+                    self.selenium_driver = SeleniumPerformanceMeasurement.create_driver(
+                        self.config.get("selenium", {}), profile=self.emulation_profiles.for_site(site)
+                    )
+                SeleniumPerformanceMeasurement.authenticate(site=site, driver=self.selenium_driver, session_cache=self.session_cache)
             elif measurement_method == 'requests':
-                RequestsPerformanceMeasurement.authenticate(site=site, session=self.requests_session)
+                MeasurementBackends.get('requests').authenticate(
+                    site=site, session=self.get_requests_session(), session_cache=self.session_cache,
+                    timeout=self.get_requests_timeout()
+                )
 
         # Save the load time to a CSV file
-        with open(csv_file, 'a') as file:
-            if write_header:
-                headers = [
-                    'Timestamp', 
-                    'Page URL', 
-                    'Page Name', 
-                    'Load Time', 
-                    'Status Code',
-                    'First Paint', 
-                    'DOM Content Loaded', 
-                    'Number Requests',
-                    'Page Weight Bytes', 
-                    'Measurement Method', 
-                    'Note'
-                ]
-                file.write(','.join(headers) + '\n')
-
-            for page in self.config.get("pages", []):
+        with self.open_results_csv(site) as file:
+            for job in self.plan_jobs(self.build_jobs([site])):
+                page = job['page']
                 self.logger.info(f'Running Speed Check for {page["name"]} Page')   
-                url = f'{site["url"]}{page["url"]}'
-                target_load_time = self.config.get("target_load_time", 3)
 
                 measurement = self.create_measurement(measurement_method=measurement_method, site=site, page_url=page['url'])
-                metrics = measurement.measure_performance(site=site, page_url=page['url'])
-                load_time = metrics.get('loadTime')
-
-                if load_time > target_load_time:
-                    print(f'\033[91m{page["name"]} Page - Load Time: {load_time:.2f} seconds (SLOW)\033[0m')
-                    self.logger.error(f'{page["name"]} Page - Load Time: {load_time:.2f} seconds (SLOW)')
+                measure = self.guard_measurement(measurement, measurement_method)
+                if self.sampler:
+                    results = self.sampler.measure(measure, lambda: self.clear_cache(measurement_method))
                 else:
-                    print(f'\033[92m{page["name"]} Page - Load Time: {load_time:.2f} seconds (OK)\033[0m')
-                    self.logger.info(f'{page["name"]} Page - Load Time: {load_time:.2f} seconds (OK)')
-
-                row = [
-                    self.report_timestamp, 
-                    f'{url}', 
-                    page["name"],
-                    metrics.get('loadTime', ''), 
-                    metrics.get('statusCode', ''),
-                    metrics.get('firstPaint', ''), 
-                    metrics.get('domContentLoaded', ''),
-                    metrics.get('numberRequests', ''), 
-                    metrics.get('pageWeightBytes', ''),
-                    measurement_method, 
-                    self.note
-                ]
-                file.write(','.join(map(str, row)) + '\n')
-
-                self.logger.info('CSV File Updated Successfully')
+                    results = [measure()]
+
+                for metrics in results:
+                    self.correct_overhead(metrics)
+                    self.report_load_time(page, metrics)
+                    self.write_row(file, site, page, metrics, measurement_method)
+                self.complete_job(job, results[-1] if results else {}, file)
+
+        self.save_last_runs()
 
         # Quit the Selenium driver after processing all pages if using Selenium
         if self.selenium_driver:
             self.selenium_driver.quit()
+            self.selenium_driver = None
 
         print("")
+
+
+    # A requests page that times out, can't be fetched or throws anything else is recorded as failed rather
+    # than ending the sweep or the daemon, as AsyncSweep and SeleniumWorkerPool do for their pages
+    def guard_measurement(self, measurement, measurement_method):
+        if measurement_method != 'requests':
+            return measurement.measure_performance
+
+        def measure():
+            try:
+                return measurement.measure_performance()
+            except Exception as e:
+                return {'loadTime': None, 'statusCode': '', 'measuredAt': time.time(), 'error': str(e) or e.__class__.__name__}
+
+        return measure
+
+
+    def get_requests_timeout(self):
+        return float(self.config.get("requests", {}).get("timeout", 30))
+
+
+    # One shared requests session (and its connection pool), created the first time something needs it
+    def get_requests_session(self):
+        if self.requests_session is None:
+            self.requests_session = MeasurementBackends.get('requests').create_session()
+        return self.requests_session
+
+
+    # Repeated measurements per page when sampling is enabled; one sampler covers a whole sweep so
+    # sweep_budget bounds the total number of loads across every site
+    def create_sampler(self):
+        sampling_config = self.config.get("sampling", {})
+        if not sampling_config.get("enabled", False):
+            return None
+        return AdaptiveSampler(sampling_config, self.config.get("target_load_time", 3))
+
+
+    def clear_cache(self, measurement_method):
+        if measurement_method == 'selenium' and self.selenium_driver:
+            MeasurementBackends.get('selenium').clear_cache(self.selenium_driver)
+        elif measurement_method == 'requests':
+            MeasurementBackends.get('requests').clear_cache(self.get_requests_session())
+
+
+    # Measure every page of every site concurrently and write rows as results arrive
+    def run_async_speed_check(self, sites, measurement_method='async_requests'):
+        self.logger.info(f'Running Async Speed Check ({measurement_method}) for {len(sites)} sites')
+        print(f'\nRunning Async Speed Check ({measurement_method}) for {len(sites)} sites\n')
+
+        sweep = self.create_async_sweep(measurement_method)
+        self.run_sweep(sites, measurement_method, lambda jobs, on_result: sweep.run(jobs, on_result, sites=sites))
+
+
+    # async_requests fetches the document only; emulated also fetches its subresources like a browser would
+    def create_async_sweep(self, measurement_method):
+        if measurement_method == 'emulated':
+            emulated_config = self.config.get("emulated", {})
+            measurement_options = {
+                'page_host_limit': emulated_config.get("page_host_limit", 6),
+                'max_resources': emulated_config.get("max_resources", 500)
+            }
+            return MeasurementBackends.get('emulated', 'sweep')(
+                emulated_config, MeasurementBackends.get('emulated'), measurement_options, self.session_cache
+            )
+
+        return MeasurementBackends.get('async_requests', 'sweep')(
+            self.config.get("async_requests", {}), MeasurementBackends.get('async_requests'), session_cache=self.session_cache
+        )
+
+
+    # Spread the (site, page) jobs over a pool of headless Chrome workers
+    def run_pooled_speed_check(self, sites):
+        pool = MeasurementBackends.get('selenium', 'pool')(
+            self.config.get("selenium", {}), self.logger, self.emulation_profiles, self.session_cache
+        )
+        self.logger.info(f'Running Selenium Speed Check on {pool.size} workers')
+        print(f'\nRunning Selenium Speed Check on {pool.size} workers\n')
+
+        self.run_sweep(sites, 'selenium', pool.run)
+
+
+    # Open a backend that stays warm across batches (sessions, connections and browsers are reused) and
+    # return (run_batch, close). run_batch(jobs, on_result) measures one batch; used by the daemon and workers.
+    def open_runner(self, sites, measurement_method):
+        if measurement_method in ('async_requests', 'emulated'):
+            sweep = self.create_async_sweep(measurement_method)
+            sweep.open(sites)
+            return sweep.run_batch, sweep.close
+
+        elif measurement_method == 'selenium':
+            pool = MeasurementBackends.get('selenium', 'pool')(
+                self.config.get("selenium", {}), self.logger, self.emulation_profiles, self.session_cache
+            )
+            pool.start()
+            return pool.run_batch, pool.stop
+
+        elif measurement_method == 'requests':
+            RequestsPerformanceMeasurement = MeasurementBackends.get('requests')
+            session = self.get_requests_session()
+            for site in sites:
+                if "authentication" in site:
+                    RequestsPerformanceMeasurement.authenticate(
+                        site=site, session=session, session_cache=self.session_cache, timeout=self.get_requests_timeout()
+                    )
+
+            def run_batch(jobs, on_result):
+                for job in jobs:
+                    measurement = RequestsPerformanceMeasurement(job['url'], session, self.get_requests_timeout())
+                    on_result(job, self.guard_measurement(measurement, 'requests')())
+
+            return run_batch, session.close
+
+        else:
+            raise ValueError(f"Unknown measurement method: {measurement_method}")
+
+
+    # Load a blank local page repeatedly to measure the fixed cost of the measuring harness itself.
+    # With "subtract": true the overhead is taken off every load time in the run (see correct_overhead).
+    def calibrate_overhead(self, measurement_method):
+        from OverheadCalibrator import OverheadCalibrator
+
+        calibration_config = self.config.get("calibration", {})
+        calibrator = OverheadCalibrator(self, calibration_config.get("samples", 10))
+        print(f'Calibrating harness overhead for {measurement_method}...')
+        overhead = calibrator.calibrate(measurement_method)
+
+        if overhead is None:
+            self.logAndPrint(f'Harness overhead calibration for {measurement_method} failed; load times are uncorrected', 'warning')
+            return None
+
+        self.logAndPrint(
+            f'Harness overhead ({measurement_method}): {overhead * 1000:.1f} ms median of {len(calibrator.load_times)} '
+            f'blank-page loads ({calibrator.load_times[0] * 1000:.1f}-{calibrator.load_times[-1] * 1000:.1f} ms)', 'info'
+        )
+        if calibration_config.get("subtract", False):
+            self.harness_overhead = overhead
+        return overhead
+
+
+    # Take the calibrated harness overhead off the load time (and the sampled percentiles), never below zero.
+    # The amount is recorded in the row, and metrics that have already been corrected are left alone.
+    def correct_overhead(self, metrics):
+        if not self.harness_overhead or metrics.get('loadTime') is None or metrics.get('overheadSubtracted') not in (None, ''):
+            return metrics
+
+        for key in ('loadTime', 'loadTimeP50', 'loadTimeP90', 'loadTimeP95', 'loadTimeCiLow', 'loadTimeCiHigh'):
+            if isinstance(metrics.get(key), (int, float)):
+                metrics[key] = round(max(metrics[key] - self.harness_overhead, 0), 4)
+        metrics['overheadSubtracted'] = round(self.harness_overhead, 4)
+        return metrics
+
+
+    # Feed the jobs for all sites to runner(jobs, on_result), writing each result to its site's CSV
+    def run_sweep(self, sites, measurement_method, runner):
+        files = {}
+
+        def on_result(job, metrics):
+            site = job['site']
+            domain_folder = self.get_domain_folder(site)
+            if domain_folder not in files:
+                files[domain_folder] = self.open_results_csv(site)
+
+            self.correct_overhead(metrics)
+            self.report_load_time(job['page'], metrics, site=site)
+            self.write_row(files[domain_folder], site, job['page'], metrics, measurement_method)
+            self.complete_job(job, metrics, files[domain_folder])
+
+        try:
+            runner(self.plan_jobs(self.build_jobs(sites)), on_result)
+        finally:
+            for file in files.values():
+                file.close()
+            self.save_last_runs()
+
+        print("")
+
+
+    # Yield one job per (site, page) pair without building the whole list up front
+    def build_jobs(self, sites):
+        for site in sites:
+            for page in self.get_pages(site):
+                yield {
+                    'site': site,
+                    'page': page,
+                    'url': f'{site["url"]}{page["url"]}'
+                }
+
+
+    # With a journal, record each job as it is handed out and leave out the ones this run already measured
+    def plan_jobs(self, jobs):
+        if self.journal is None:
+            yield from jobs
+            return
+
+        for job in jobs:
+            if self.journal.is_done(job):
+                continue
+            self.journal.plan(job)
+            yield job
+
+
+    # Record a job as completed once its rows are written; with fsync on, the rows reach the disk first
+    def complete_job(self, job, metrics, file=None):
+        if self.journal is None:
+            return
+
+        if file is not None and self.journal.fsync:
+            os.fsync(file.fileno())
+        self.journal.complete(job, metrics)
+
+
+    # Start this sweep's journal, or reopen the one for the run being resumed (its run ID, note and
+    # measurement method carry over). Returns None when journaling is off or the run can't be resumed.
+    def open_journal(self, resume=None):
+        journal_config = self.config.get("journal", {})
+        if not journal_config.get("enabled", True):
+            if resume:
+                self.logAndPrint('Cannot resume a run with the journal disabled ("journal": {"enabled": false})', 'error')
+            return None
+
+        folder = os.path.join(self.script_root, journal_config.get("path", "data/journal"))
+        fsync = journal_config.get("fsync", True)
+
+        if not resume:
+            removed = RunJournal.prune(folder, journal_config.get("keep_days", 30))
+            if removed:
+                self.logger.info(f'Removed {removed} old run journals')
+            for run_id in RunJournal.unfinished_run_ids(folder):
+                journal = RunJournal(folder, run_id)
+                self.logAndPrint(
+                    f'Run {run_id} stopped with {journal.missing()} of {len(journal.planned)} pages not measured; '
+                    f'resume it with: python3 main.py --resume {run_id}', 'warning'
+                )
+
+            # A fresh run never adds to another run's journal; if the ID is taken, take a new one
+            while True:
+                try:
+                    return RunJournal(folder, self.report_timestamp, fsync).create(
+                        self.config.get("speed_check_method", "selenium"), self.note, self.get_sites()
+                    )
+                except FileExistsError:
+                    self.report_timestamp = self.new_run_id()
+
+        if resume == 'latest':
+            unfinished = RunJournal.unfinished_run_ids(folder)
+            if not unfinished:
+                self.logAndPrint('There are no unfinished runs to resume', 'error')
+                return None
+            resume = unfinished[0]
+
+        journal = RunJournal(folder, resume, fsync)
+        if not journal.exists():
+            self.logAndPrint(f'There is no journal for run {resume} in {folder}', 'error')
+            return None
+        if journal.finished:
+            self.logAndPrint(f'Run {resume} has already finished', 'error')
+            return None
+
+        self.report_timestamp = journal.run_id
+        self.note = journal.start.get('note') or self.note
+        if journal.start.get('measurement_method'):
+            self.config["speed_check_method"] = journal.start['measurement_method']
+        self.logAndPrint(
+            f'Resuming run {journal.run_id}: {len(journal.completed)} of {len(journal.planned)} planned pages already measured', 'info'
+        )
+        return journal.resume()
+
+
+    def close_journal(self, finish=True):
+        if self.journal is None:
+            return
+
+        if self.journal.close(finish):
+            self.logger.info(f'Run {self.journal.run_id} finished')
+        else:
+            self.logAndPrint(
+                f'Run {self.journal.run_id} stopped with {self.journal.missing()} pages not measured; '
+                f'resume it with: python3 main.py --resume {self.journal.run_id}', 'warning'
+            )
+        self.journal = None
+
+
+    # Open the site's speed_check.csv for appending, writing the header row for a new file.
+    # A file written with an older set of columns is moved aside (speed_check.<date>.csv) first, and a
+    # half-written last row left by a crash is cut off.
+    def open_results_csv(self, site):
+        domain_folder = self.get_domain_folder(site)
+        csv_file = f'{self.script_root}/data/{domain_folder}/speed_check.csv'
+
+        headers = ['Timestamp', 'Measured At', 'Page URL', 'Page Name']
+        headers += [header for _, header, _, _ in ResultsStore.COLUMNS]
+        headers += ['Measurement Method', 'Note']
+
+        if os.path.exists(csv_file):
+            with open(csv_file, 'r', newline='') as f:
+                existing_headers = next(csv.reader(f), None)
+
+            if existing_headers and existing_headers != headers:
+                modified = datetime.fromtimestamp(os.path.getmtime(csv_file)).strftime("%Y-%m-%d_%H-%M-%S")
+                rotated_file = f'{self.script_root}/data/{domain_folder}/speed_check.{modified}.csv'
+                os.replace(csv_file, rotated_file)
+                self.logger.info(f'Column layout changed, moved old results to {rotated_file}')
+
+        dropped = RunJournal.truncate_partial_line(csv_file)
+        if dropped:
+            self.logger.warning(f'Removed a partly written row ({dropped} bytes) from the end of {csv_file}')
+
+        write_header = not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0
+
+        file = open(csv_file, 'a', newline='')
+        if write_header:
+            csv.writer(file).writerow(headers)
+
+        return file
+
+
+    # main.py's original layout, one file for every site: page weight in megabytes and a timestamp per row
+    def open_legacy_csv(self, csv_file):
+        dropped = RunJournal.truncate_partial_line(csv_file)
+        if dropped:
+            self.logger.warning(f'Removed a partly written row ({dropped} bytes) from the end of {csv_file}')
+
+        write_header = not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0
+        file = open(csv_file, 'a', newline='')
+        if write_header:
+            csv.writer(file).writerow([
+                'Timestamp', 'Site URL', 'Page Name', 'Page URL', 'Load Time', 'First Paint', 'DOM Content Loaded',
+                'Number Requests', 'Page Weight Bytes', 'Measurement Method', 'Note'
+            ])
+        return file
+
+
+    # Failed loads get a row too, with the metrics left blank
+    def write_legacy_row(self, site, page, metrics, measurement_method):
+        page_weight = metrics.get('pageWeightBytes')
+        row = [
+            datetime.fromtimestamp(metrics.get('measuredAt') or time.time()).strftime('%Y-%m-%d %H:%M:%S'),
+            site['url'], page['name'], f'{site["url"]}{page["url"]}',
+            metrics.get('loadTime'), metrics.get('firstPaint'), metrics.get('domContentLoaded'),
+            metrics.get('numberRequests'), round(page_weight / 1000000, 2) if isinstance(page_weight, (int, float)) else '',
+            measurement_method, self.note
+        ]
+        csv.writer(self.legacy_csv).writerow(['' if value is None else value for value in row])
+        self.legacy_csv.flush()
+
+
+    # The indexed results store sits alongside the CSV files; disable it with "results_store": {"enabled": false}
+    def open_results_store(self):
+        store_config = self.config.get("results_store", {})
+        if not store_config.get("enabled", True):
+            return None
+
+        path = os.path.join(self.script_root, store_config.get("path", "data/results.sqlite"))
+        return ResultsStore(path)
+
+
+    # Saved login cookies shared by every backend and every run (data/.sessions by default)
+    def open_session_cache(self):
+        cache_config = self.config.get("session_cache", {})
+        if not cache_config.get("enabled", True):
+            return None
+
+        path = os.path.join(self.script_root, cache_config.get("path", "data/.sessions"))
+        return SessionCache(
+            path, cache_config.get("max_age", 43200), cache_config.get("revalidate_after", 300), self.logger
+        )
+
+
+    # Hourly and daily aggregates in the results store; disable with "rollups": {"enabled": false}
+    def open_rollup_store(self):
+        rollup_config = self.config.get("rollups", {})
+        if not rollup_config.get("enabled", True):
+            return None
+        return RollupStore(self.results_store, rollup_config)
+
+
+    # Regression and change-point alerts per page; disable with "change_detection": {"enabled": false}
+    def open_change_detector(self):
+        detection_config = self.config.get("change_detection", {})
+        if not detection_config.get("enabled", True):
+            return None
+
+        return ChangeDetector(
+            detection_config,
+            os.path.join(self.script_root, detection_config.get("state_path", "data/change_state.json")),
+            os.path.join(self.script_root, detection_config.get("events_path", "data/change_events.jsonl")),
+            self.logger
+        )
+
+
+    # Timestamp is the run the row belongs to; Measured At is when this page's measurement started.
+    # Returns the change events the row raised.
+    def write_row(self, file, site, page, metrics, measurement_method):
+        url = f'{site["url"]}{page["url"]}'
+        measured_at = metrics.get('measuredAt') or time.time()
+        row = [self.report_timestamp, datetime.fromtimestamp(measured_at).isoformat(' ', 'microseconds'), url, page["name"]]
+        row += [metrics.get(key, '') for _, _, key, _ in ResultsStore.COLUMNS]
+        row += [measurement_method, self.note]
+
+        csv.writer(file).writerow(['' if value is None else value for value in row])
+        file.flush()
+
+        if self.legacy_csv:
+            self.write_legacy_row(site, page, metrics, measurement_method)
+
+        self.update_last_run(site, page, metrics, measurement_method)
+
+        if self.results_store:
+            result_id = self.results_store.insert(
+                self.report_timestamp, site["url"], page["name"], url, metrics, measurement_method, self.note,
+                timestamp=measured_at
+            )
+
+            # Per-resource waterfall entries are kept in the columnar store, linked to the result row
+            if self.resource_store and metrics.get('resources'):
+                self.resource_store.add(result_id, metrics['resources'])
+
+        events = []
+        if self.change_detector:
+            events = self.change_detector.update(site["url"], page["name"], metrics, measurement_method, measured_at, self.report_timestamp)
+
+        self.logger.info('CSV File Updated Successfully')
+        return events
+
+
+    def report_load_time(self, page, metrics, site=None):
+        load_time = metrics.get('loadTime')
+        target_load_time = self.config.get("target_load_time", 3)
+        label = f'{page["name"]} Page' if site is None else f'{site["url"]} {page["name"]} Page'
+        if metrics.get('samples'):
+            label += f' ({metrics.get("cacheMode")} cache, {metrics["samples"]} samples)'
+
+        if load_time is None:
+            print(f'\033[91m{label} - Failed: {metrics.get("error", "no response")}\033[0m')
+            self.logger.error(f'{label} - Failed: {metrics.get("error", "no response")}')
+        elif load_time > target_load_time:
+            print(f'\033[91m{label} - Load Time: {load_time:.2f} seconds (SLOW)\033[0m')
+            self.logger.error(f'{label} - Load Time: {load_time:.2f} seconds (SLOW)')
+        else:
+            print(f'\033[92m{label} - Load Time: {load_time:.2f} seconds (OK)\033[0m')
+            self.logger.info(f'{label} - Load Time: {load_time:.2f} seconds (OK)')
         
 
     def run_lighthouse_checks(self, site):
@@ -298,7 +913,8 @@ class PerformanceScanner:
         elif level == 'warning':
             self.logger.warning(message)
         elif level == 'success':
-            self.logger.success(message)
+            # logging has no success level; keep these at info
+            self.logger.info(message)
         else:
             self.logger.info(message)
         
@@ -0,0 +1,90 @@
+from array import array
+import math
+import sys
+
+# A mergeable quantile sketch with relative error guarantees (the DDSketch bucketing). Values are counted
+# in logarithmic buckets, so any quantile comes back within relative_accuracy of the true value, and two
+# sketches merge by adding their bucket counts. That makes hourly sketches add up to exact daily ones.
+# Load times are non-negative; zero (and anything below min_value) has a bucket of its own.
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01, min_value=1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+
+    def add(self, value, count=1):
+        if value < self.min_value:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+
+
+    # Both sketches must use the same relative_accuracy
+    def merge(self, other):
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+
+    # q between 0 and 1; None for an empty sketch
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # The midpoint of the bucket (gamma^(key-1), gamma^key] in relative terms
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+
+    # Little-endian header (zero count, bucket count) followed by the bucket keys and their counts
+    def to_bytes(self):
+        keys = sorted(self.bins)
+        return (self.pack('Q', [self.zero_count, len(keys)]) + self.pack('i', keys)
+                + self.pack('Q', [self.bins[key] for key in keys]))
+
+
+    @classmethod
+    def from_bytes(cls, blob, relative_accuracy=0.01, min_value=1e-6):
+        sketch = cls(relative_accuracy, min_value)
+        zero_count, size = cls.unpack('Q', blob[:16])
+        keys = cls.unpack('i', blob[16:16 + size * 4])
+        counts = cls.unpack('Q', blob[16 + size * 4:16 + size * 12])
+        sketch.bins = dict(zip(keys, counts))
+        sketch.zero_count = zero_count
+        sketch.count = zero_count + sum(counts)
+        return sketch
+
+
+    # Blobs are always little-endian so a database can be copied between machines
+    @staticmethod
+    def pack(type_code, values):
+        packed = array(type_code, values)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        return packed.tobytes()
+
+
+    @staticmethod
+    def unpack(type_code, blob):
+        values = array(type_code)
+        values.frombytes(blob)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
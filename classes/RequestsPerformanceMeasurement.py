@@ -1,17 +1,42 @@
 from BasePerformanceMeasurement import BasePerformanceMeasurement
+from SessionCache import SessionCache
+from TimedHTTPAdapter import TimedHTTPAdapter
+import requests
 import time
 class RequestsPerformanceMeasurement(BasePerformanceMeasurement):
-    def __init__(self, url, session):
+    # timeout is the seconds to wait for a connection or for the next bytes of the response, so a
+    # stalled server fails the page instead of hanging the sweep
+    def __init__(self, url, session, timeout=30):
         super().__init__(url)
         self.session = session
+        self.timeout = timeout
         self.response_code = None  # Initialise the response_code attribute
 
-    def authenticate(site, session):
+    # A session whose connections report DNS, connect and TLS timings
+    @staticmethod
+    def create_session():
+        session = requests.Session()
+        adapter = TimedHTTPAdapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+
+    # With a session_cache, saved login cookies are reused while they are still valid
+    # and the credentials are only posted when they have expired
+    @staticmethod
+    def authenticate(site, session, session_cache=None, timeout=30):
         if not site:
             raise ValueError("Site not defined")
         
         if not session:
             raise ValueError("Session not defined")
+
+        if session_cache:
+            cookies = session_cache.get_valid(site)
+            if cookies:
+                SessionCache.add_to_jar(session.cookies, cookies)
+                return
         
         username = site['authentication']['username']
         password = site['authentication']['password']
@@ -19,36 +44,76 @@ class RequestsPerformanceMeasurement(BasePerformanceMeasurement):
             'username': username,
             'password': password
         }
-        response = session.post(site['url'], data=login_data)
+        response = session.post(site['url'], data=login_data, timeout=timeout)
 
         # Check if the authentication was successful
         if response.status_code != 200:
             raise Exception("Authentication failed")
+
+        if session_cache:
+            session_cache.save(site, SessionCache.cookies_from_jar(session.cookies))
         
 
+    # requests keeps no HTTP cache, so a cold load is one that has to open new connections
+    @staticmethod
+    def clear_cache(session):
+        for adapter in session.adapters.values():
+            adapter.close()
+
+
+    # firstPaint and domContentLoaded need a browser, so they are left blank in requests mode
     def get_performance_metrics(self):
         metrics = {
             'loadTime': 0,
             'statusCode': 0,
-            'firstPaint': 0,
-            'domContentLoaded': 0,
-            'numberRequests': 0,
-            'pageWeightBytes': 0
+            'firstPaint': '',
+            'domContentLoaded': '',
+            'numberRequests': 1,
+            'pageWeightBytes': 0,
+            'dnsTime': 0,
+            'connectTime': 0,
+            'tlsTime': 0,
+            'ttfb': 0,
+            'downloadTime': 0,
+            'transferBytes': 0,
+            'decodedBytes': 0
         }
         return metrics
 
 
-    def measure_performance(self, site, page_url):
-        url = f"{site}{page_url}"
-        response = self.session.get(url)
-        response_code = response.status_code
-        
-        # Get elapsed time as seconds, round to 2 decimal places
-        load_time_rounded = round(response.elapsed.total_seconds(), 2)
+    # Stream the body so the load time covers the whole document, and split it into phases:
+    # DNS + connect + TLS + TTFB (waiting for the first byte once connected) + download = load time
+    def measure_performance(self):
+        TimedHTTPAdapter.reset_timings()
+        measured_at = time.time()
+        start_time = time.perf_counter_ns()
+
+        with self.session.get(self.url, stream=True, timeout=self.timeout) as response:
+            headers_time = time.perf_counter_ns()
+
+            decoded_bytes = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                decoded_bytes += len(chunk)
+
+            end_time = time.perf_counter_ns()
+            transfer_bytes = response.raw.tell()
+            response_code = response.status_code
+
+        timings = TimedHTTPAdapter.get_timings()
+        setup_time = timings['dns'] + timings['connect'] + timings['tls']
 
         metrics = self.get_performance_metrics()
-        metrics['loadTime'] = load_time_rounded
+        metrics['measuredAt'] = measured_at
+        metrics['loadTime'] = round((end_time - start_time) / 1e9, 4)
         metrics['statusCode'] = response_code
+        metrics['pageWeightBytes'] = transfer_bytes
+        metrics['dnsTime'] = round(timings['dns'], 4)
+        metrics['connectTime'] = round(timings['connect'], 4)
+        metrics['tlsTime'] = round(timings['tls'], 4)
+        metrics['ttfb'] = round(max((headers_time - start_time) / 1e9 - setup_time, 0), 4)
+        metrics['downloadTime'] = round((end_time - headers_time) / 1e9, 4)
+        metrics['transferBytes'] = transfer_bytes
+        metrics['decodedBytes'] = decoded_bytes
 
         # Print metrics key and values
         print()
@@ -56,4 +121,4 @@ class RequestsPerformanceMeasurement(BasePerformanceMeasurement):
         for key, value in metrics.items():
             print(f"{key}: {value}")
 
-        return metrics
\ No newline at end of file
+        return metrics
@@ -0,0 +1,187 @@
+from array import array
+from collections import defaultdict
+import heapq
+import sys
+
+class ResourceTimingStore:
+    # One BLOB column per field, typed with array codes: (column, array type, index in a captured entry)
+    # Captured entries are [url, initiatorType, startTime, duration, transferSize, nextHopProtocol]
+    FIELDS = [
+        ('url_ids', 'I', 0),
+        ('initiator_ids', 'I', 1),
+        ('starts', 'f', 2),
+        ('durations', 'f', 3),
+        ('transfer_sizes', 'I', 4),
+        ('protocol_ids', 'I', 5),
+    ]
+    INTERNED_FIELDS = (0, 1, 5)
+
+    # Shares the results store's connection so each page's resources sit next to its result row
+    def __init__(self, results_store):
+        self.results_store = results_store
+        self.connection = results_store.connection
+        self.lock = results_store.lock
+        self.string_ids = {}
+        self.strings = {}
+        self.create_schema()
+
+
+    def create_schema(self):
+        blob_columns = ''.join(f',\n                    {name} BLOB NOT NULL' for name, _, _ in self.FIELDS)
+
+        with self.lock, self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS resource_strings (
+                    id INTEGER PRIMARY KEY,
+                    value TEXT NOT NULL UNIQUE
+                )
+            ''')
+            self.connection.execute(f'''
+                CREATE TABLE IF NOT EXISTS resource_timings (
+                    result_id INTEGER PRIMARY KEY REFERENCES results (id),
+                    count INTEGER NOT NULL{blob_columns}
+                )
+            ''')
+
+
+    # Store every resource entry for one results row as packed columns (24 bytes per resource).
+    # URLs, initiator types and protocols are interned so repeated assets cost 4 bytes each.
+    def add(self, result_id, resources):
+        if not resources:
+            return
+
+        # Strings first inserted here only join the cache once the transaction has committed; a rollback would
+        # otherwise leave ids cached that no row in resource_strings has
+        interned = {}
+        with self.lock:
+            with self.connection:
+                columns = []
+                for _, type_code, index in self.FIELDS:
+                    if index in self.INTERNED_FIELDS:
+                        values = [self.intern(str(resource[index] or ''), interned) for resource in resources]
+                    elif type_code == 'I':
+                        values = [max(int(resource[index] or 0), 0) for resource in resources]
+                    else:
+                        values = [float(resource[index] or 0) for resource in resources]
+                    columns.append(self.pack(type_code, values))
+
+                placeholders = ', '.join('?' for _ in range(len(self.FIELDS) + 2))
+                names = ', '.join(name for name, _, _ in self.FIELDS)
+                self.connection.execute(
+                    f'INSERT OR REPLACE INTO resource_timings (result_id, count, {names}) VALUES ({placeholders})',
+                    [result_id, len(resources)] + columns
+                )
+
+            for value, string_id in interned.items():
+                self.string_ids[value] = string_id
+                self.strings[string_id] = value
+
+
+    # Called with the lock held; ids not yet cached are collected in interned for add() to cache after commit
+    def intern(self, value, interned):
+        if value in self.string_ids:
+            return self.string_ids[value]
+        if value in interned:
+            return interned[value]
+
+        self.connection.execute('INSERT OR IGNORE INTO resource_strings (value) VALUES (?)', (value,))
+        string_id = self.connection.execute('SELECT id FROM resource_strings WHERE value = ?', (value,)).fetchone()[0]
+        interned[value] = string_id
+        return string_id
+
+
+    # Blobs are always little-endian so a database can be copied between machines
+    @staticmethod
+    def pack(type_code, values):
+        packed = array(type_code, values)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        return packed.tobytes()
+
+
+    @staticmethod
+    def unpack(type_code, blob):
+        values = array(type_code)
+        values.frombytes(blob)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+
+    # The resources captured for one results row, as dicts
+    def get_resources(self, result_id):
+        with self.lock:
+            row = self.connection.execute('SELECT * FROM resource_timings WHERE result_id = ?', (result_id,)).fetchone()
+        if row is None:
+            return []
+
+        columns = {name: self.unpack(type_code, row[name]) for name, type_code, _ in self.FIELDS}
+        return [
+            {
+                'url': self.lookup(columns['url_ids'][i]),
+                'initiatorType': self.lookup(columns['initiator_ids'][i]),
+                'startTime': columns['starts'][i],
+                'duration': columns['durations'][i],
+                'transferSize': columns['transfer_sizes'][i],
+                'protocol': self.lookup(columns['protocol_ids'][i])
+            }
+            for i in range(row['count'])
+        ]
+
+
+    # The resources that contributed the most total load time to a page over a time range.
+    # Only the url and duration columns are decoded, so long ranges stay cheap.
+    def top_resources(self, site_url, page_name, start=None, end=None, limit=10):
+        sql = '''
+            SELECT t.url_ids, t.durations, t.transfer_sizes FROM resource_timings t
+            JOIN results r ON r.id = t.result_id
+            WHERE r.site = ? AND r.page_name = ?
+        '''
+        params = [site_url, page_name]
+        if start is not None:
+            sql += ' AND r.timestamp >= ?'
+            params.append(self.results_store.to_epoch(start))
+        if end is not None:
+            sql += ' AND r.timestamp < ?'
+            params.append(self.results_store.to_epoch(end))
+
+        total_time = defaultdict(float)
+        total_bytes = defaultdict(int)
+        counts = defaultdict(int)
+        page_loads = 0
+
+        with self.lock:
+            for row in self.connection.execute(sql, params):
+                page_loads += 1
+                url_ids = self.unpack('I', row['url_ids'])
+                durations = self.unpack('f', row['durations'])
+                sizes = self.unpack('I', row['transfer_sizes'])
+                for url_id, duration, size in zip(url_ids, durations, sizes):
+                    total_time[url_id] += duration
+                    total_bytes[url_id] += size
+                    counts[url_id] += 1
+
+        top = heapq.nlargest(limit, total_time.items(), key=lambda item: item[1])
+        return [
+            {
+                'url': self.lookup(url_id),
+                'totalTime': round(time_ms / 1000, 3),
+                'meanTime': round(time_ms / counts[url_id] / 1000, 3),
+                'requests': counts[url_id],
+                'pageLoads': page_loads,
+                'transferBytes': total_bytes[url_id]
+            }
+            for url_id, time_ms in top
+        ]
+
+
+    # Unknown ids read as '' but aren't cached, so an id inserted later still resolves
+    def lookup(self, string_id):
+        if string_id not in self.strings:
+            with self.lock:
+                row = self.connection.execute('SELECT value FROM resource_strings WHERE id = ?', (string_id,)).fetchone()
+            if row is None:
+                return ''
+            self.strings[string_id] = row[0]
+            self.string_ids.setdefault(row[0], string_id)
+        return self.strings[string_id]
@@ -0,0 +1,317 @@
+from datetime import datetime
+import csv
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+class ResultsStore:
+    # Metric columns shared by the results table and speed_check.csv: (column, CSV header, metrics key, SQL type)
+    COLUMNS = [
+        ('load_time', 'Load Time', 'loadTime', 'REAL'),
+        ('status_code', 'Status Code', 'statusCode', 'INTEGER'),
+        ('first_paint', 'First Paint', 'firstPaint', 'REAL'),
+        ('dom_content_loaded', 'DOM Content Loaded', 'domContentLoaded', 'REAL'),
+        ('number_requests', 'Number Requests', 'numberRequests', 'INTEGER'),
+        ('page_weight_bytes', 'Page Weight Bytes', 'pageWeightBytes', 'INTEGER'),
+        ('dns_time', 'DNS Time', 'dnsTime', 'REAL'),
+        ('connect_time', 'Connect Time', 'connectTime', 'REAL'),
+        ('tls_time', 'TLS Time', 'tlsTime', 'REAL'),
+        ('ttfb', 'TTFB', 'ttfb', 'REAL'),
+        ('download_time', 'Download Time', 'downloadTime', 'REAL'),
+        ('transfer_bytes', 'Transfer Bytes', 'transferBytes', 'INTEGER'),
+        ('decoded_bytes', 'Decoded Bytes', 'decodedBytes', 'INTEGER'),
+        ('lcp', 'LCP', 'lcp', 'REAL'),
+        ('cls', 'CLS', 'cls', 'REAL'),
+        ('inp', 'INP', 'inp', 'REAL'),
+        ('tbt', 'TBT', 'tbt', 'REAL'),
+        ('long_task_total', 'Long Task Time', 'longTaskTotal', 'REAL'),
+        ('long_task_count', 'Long Tasks', 'longTaskCount', 'INTEGER'),
+        ('emulation_profile', 'Emulation Profile', 'emulationProfile', 'TEXT'),
+        ('samples', 'Samples', 'samples', 'INTEGER'),
+        ('load_time_p50', 'Load Time P50', 'loadTimeP50', 'REAL'),
+        ('load_time_p90', 'Load Time P90', 'loadTimeP90', 'REAL'),
+        ('load_time_p95', 'Load Time P95', 'loadTimeP95', 'REAL'),
+        ('load_time_ci_low', 'Load Time CI Low', 'loadTimeCiLow', 'REAL'),
+        ('load_time_ci_high', 'Load Time CI High', 'loadTimeCiHigh', 'REAL'),
+        ('cache_mode', 'Cache Mode', 'cacheMode', 'TEXT'),
+        ('overhead_subtracted', 'Overhead Subtracted', 'overheadSubtracted', 'REAL'),
+        ('failed_requests', 'Failed Requests', 'failedRequests', 'INTEGER'),
+    ]
+
+    # Run IDs written by PerformanceScanner, which are also the Timestamp column of speed_check.csv
+    RUN_ID_FORMAT = '%Y-%m-%d_%H-%M-%S-%f'
+
+    # Timestamp formats written by PerformanceScanner (current and older run IDs) and by main.py
+    TIMESTAMP_FORMATS = [RUN_ID_FORMAT, '%Y-%m-%d_%H-%M-%S', '%Y-%m-%d %H:%M:%S']
+
+    # read_only opens an existing database for queries only: nothing is created, and a missing database
+    # raises sqlite3.OperationalError
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+
+        # Measurements can arrive from worker threads, so the connection is shared behind a lock
+        self.lock = threading.Lock()
+        if read_only:
+            uri = f'{Path(os.path.abspath(path)).as_uri()}?mode=ro'
+            self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            return
+
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.create_schema()
+
+
+    def create_schema(self):
+        metric_columns = ''.join(f',\n                {name} {sql_type}' for name, _, _, sql_type in self.COLUMNS)
+
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    started_at REAL NOT NULL,
+                    measurement_method TEXT,
+                    note TEXT
+                )
+            ''')
+            self.connection.execute(f'''
+                CREATE TABLE IF NOT EXISTS results (
+                    id INTEGER PRIMARY KEY,
+                    run_id TEXT NOT NULL,
+                    timestamp REAL NOT NULL,
+                    site TEXT NOT NULL,
+                    page_name TEXT NOT NULL,
+                    page_url TEXT NOT NULL{metric_columns},
+                    measurement_method TEXT,
+                    note TEXT,
+                    source TEXT
+                )
+            ''')
+            self.add_missing_columns()
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_site_page_time ON results (site, page_name, timestamp)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_run ON results (run_id)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_time ON results (timestamp)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at)')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS imported_files (
+                    path TEXT PRIMARY KEY,
+                    rows INTEGER NOT NULL,
+                    imported_at REAL NOT NULL
+                )
+            ''')
+
+
+    # Databases created before a metric column was added get it on open (NULL for older rows)
+    def add_missing_columns(self):
+        existing = {row['name'] for row in self.connection.execute('PRAGMA table_info(results)')}
+        for name, _, _, sql_type in self.COLUMNS:
+            if name not in existing:
+                self.connection.execute(f'ALTER TABLE results ADD COLUMN {name} {sql_type}')
+
+
+    # Record one measurement and return its row id
+    def insert(self, run_id, site_url, page_name, page_url, metrics, measurement_method, note, timestamp=None, source='scanner'):
+        timestamp = timestamp if timestamp is not None else datetime.now().timestamp()
+        row = self.build_row(run_id, timestamp, site_url, page_name, page_url, metrics, measurement_method, note, source)
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR IGNORE INTO runs (run_id, started_at, measurement_method, note) VALUES (?, ?, ?, ?)',
+                (run_id, timestamp, measurement_method, note)
+            )
+            cursor = self.connection.execute(self.insert_sql(), row)
+
+        return cursor.lastrowid
+
+
+    def build_row(self, run_id, timestamp, site_url, page_name, page_url, metrics, measurement_method, note, source):
+        values = [self.clean(metrics.get(key)) for _, _, key, _ in self.COLUMNS]
+        return [run_id, timestamp, site_url, page_name, page_url] + values + [measurement_method, note, source]
+
+
+    def insert_sql(self):
+        columns = ['run_id', 'timestamp', 'site', 'page_name', 'page_url']
+        columns += [name for name, _, _, _ in self.COLUMNS]
+        columns += ['measurement_method', 'note', 'source']
+        placeholders = ', '.join('?' for _ in columns)
+        return f'INSERT INTO results ({", ".join(columns)}) VALUES ({placeholders})'
+
+
+    # Blank strings from the CSV writers and failed measurements are stored as NULL
+    @staticmethod
+    def clean(value):
+        if value == '' or value is None:
+            return None
+        return value
+
+
+    # Every page of the most recent run (optionally for one site)
+    def latest_run(self, site_url=None):
+        if site_url:
+            row = self.query_one(
+                'SELECT run_id FROM results WHERE site = ? ORDER BY timestamp DESC LIMIT 1', (site_url,)
+            )
+        else:
+            row = self.query_one('SELECT run_id FROM runs ORDER BY started_at DESC LIMIT 1')
+
+        if row is None:
+            return []
+
+        results = self.run_results(row['run_id'])
+        if site_url:
+            results = [result for result in results if result['site'] == site_url]
+        return results
+
+
+    # One page over a time range; start and end are datetimes or epoch seconds and may be omitted
+    def page_history(self, site_url, page_name, start=None, end=None):
+        sql = 'SELECT * FROM results WHERE site = ? AND page_name = ?'
+        params = [site_url, page_name]
+
+        if start is not None:
+            sql += ' AND timestamp >= ?'
+            params.append(self.to_epoch(start))
+        if end is not None:
+            sql += ' AND timestamp < ?'
+            params.append(self.to_epoch(end))
+
+        return self.query(sql + ' ORDER BY timestamp', params)
+
+
+    # All pages measured in one run
+    def run_results(self, run_id):
+        return self.query('SELECT * FROM results WHERE run_id = ? ORDER BY site, timestamp', (run_id,))
+
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, params)]
+
+
+    def query_one(self, sql, params=()):
+        with self.lock:
+            row = self.connection.execute(sql, params).fetchone()
+        return dict(row) if row else None
+
+
+    @staticmethod
+    def to_epoch(value):
+        if isinstance(value, datetime):
+            return value.timestamp()
+        return float(value)
+
+
+    @classmethod
+    def parse_timestamp(cls, value):
+        for timestamp_format in cls.TIMESTAMP_FORMATS:
+            try:
+                return datetime.strptime(value, timestamp_format).timestamp()
+            except ValueError:
+                continue
+        raise ValueError(f'Unrecognised timestamp: {value}')
+
+
+    # Import a data/<domain>/speed_check*.csv or data/selenium_*_tests.csv file.
+    # Files are only imported once unless force is set; returns the number of rows imported.
+    def import_csv(self, path, force=False):
+        path = os.path.abspath(path)
+        if not force and self.query_one('SELECT path FROM imported_files WHERE path = ?', (path,)):
+            return 0
+
+        with open(path, newline='') as file:
+            reader = csv.reader(file)
+            headers = next(reader, None)
+            if not headers:
+                return 0
+
+            rows = []
+            runs = {}
+            previous = None
+            for values in reader:
+                if not values:
+                    continue
+
+                # Old writers didn't quote fields, so any extra commas belong to the trailing Note
+                if len(values) > len(headers):
+                    values = values[:len(headers) - 1] + [','.join(values[len(headers) - 1:])]
+                record = dict(zip(headers, values))
+
+                row, previous = self.import_row(record, path, previous)
+                rows.append(row)
+                runs.setdefault(row[0], (row[1], row[-3], row[-2]))
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO runs (run_id, started_at, measurement_method, note) VALUES (?, ?, ?, ?)',
+                [(run_id,) + run for run_id, run in runs.items()]
+            )
+            self.connection.executemany(self.insert_sql(), rows)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO imported_files (path, rows, imported_at) VALUES (?, ?, ?)',
+                (path, len(rows), datetime.now().timestamp())
+            )
+
+        return len(rows)
+
+
+    def import_row(self, record, path, previous):
+        timestamp = self.parse_timestamp(record['Timestamp'])
+        measured_at = record.get('Measured At')
+        page_url = record.get('Page URL', '')
+        note = record.get('Note', '')
+        parts = urlsplit(page_url)
+        site_url = record.get('Site URL') or f'{parts.scheme}://{parts.netloc}'
+
+        metrics = {key: self.to_number(record.get(header), sql_type) for _, header, key, sql_type in self.COLUMNS}
+
+        # main.py's CSV files record page weight in megabytes
+        if 'Site URL' in record:
+            megabytes = self.to_number(record.get('Page Weight Bytes'), 'REAL')
+            if megabytes is not None:
+                metrics['pageWeightBytes'] = int(megabytes * 1000000)
+
+        # speed_check.csv rows share their run timestamp; main.py stamps each page, so group rows
+        # written within two minutes of each other under the same note into one run
+        if '_' in record['Timestamp']:
+            run_id = record['Timestamp']
+        elif previous and previous[1] == note and timestamp - previous[2] <= 120:
+            run_id = previous[0]
+        else:
+            run_id = f'{os.path.basename(path)}@{record["Timestamp"]}'
+
+        # Rows written since each measurement carried its own time are placed at that time, not the run start
+        if measured_at:
+            timestamp = datetime.fromisoformat(measured_at).timestamp()
+
+        row = self.build_row(
+            run_id, timestamp, site_url, record.get('Page Name', ''), page_url, metrics,
+            record.get('Measurement Method', ''), note, os.path.basename(path)
+        )
+        return row, (run_id, note, timestamp)
+
+
+    @staticmethod
+    def to_number(value, sql_type):
+        if value is None or value == '':
+            return None
+        if sql_type == 'TEXT':
+            return value
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        return int(number) if sql_type == 'INTEGER' else number
+
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
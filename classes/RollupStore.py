@@ -0,0 +1,329 @@
+from datetime import datetime
+import time
+
+from QuantileSketch import QuantileSketch
+from ResultsStore import ResultsStore
+
+# Hourly and daily aggregates of the results table (count, min, max, sum and a QuantileSketch per metric),
+# kept in the results store's database. update() folds in only the rows written since it last ran, and
+# compact() applies the retention policy: raw rows older than raw_days (if set) are deleted once they are
+# rolled up, hourly buckets go after hourly_days, and daily buckets are kept unless daily_days is set.
+# Each measurement is rolled up once, however often it is imported: rollup_results keeps the identity of
+# every row already counted (run, page URL, time, profile and cache mode), and a row imported again from
+# the CSV files, e.g. by import-results.py --force, is skipped. Re-importing brings back raw rows that
+# compact() deleted, until the next compact() deletes them again.
+# series() answers trend queries from the coarsest tier that still has the resolution asked for.
+class RollupStore:
+    # (tier, bucket length in seconds); days start at local midnight
+    TIERS = [('hourly', 3600), ('daily', 86400)]
+    SERIES_COLUMNS = ['site', 'page_name', 'measurement_method', 'emulation_profile', 'cache_mode']
+    DEFAULT_METRICS = ['loadTime', 'ttfb', 'firstPaint', 'domContentLoaded', 'lcp']
+    BATCH_SIZE = 10000
+
+    # A measurement's identity, the same whether it was written by the scanner or imported from its CSV row.
+    # Times are kept to the millisecond, since the CSV's Measured At round-trips the float only that closely.
+    IDENTITY_SQL = "run_id, page_url, ROUND(timestamp, 3), COALESCE(emulation_profile, ''), COALESCE(cache_mode, '')"
+
+    # Shares the results store's connection and lock, like ResourceTimingStore
+    def __init__(self, results_store, config=None):
+        config = config or {}
+        self.results_store = results_store
+        self.connection = results_store.connection
+        self.lock = results_store.lock
+        self.raw_days = config.get("raw_days")
+        self.hourly_days = config.get("hourly_days", 730)
+        self.daily_days = config.get("daily_days")
+        self.relative_accuracy = config.get("relative_accuracy", 0.01)
+
+        columns = {key: (column, sql_type) for column, _, key, sql_type in ResultsStore.COLUMNS}
+        self.metrics = [
+            columns[key][0] for key in config.get("metrics", self.DEFAULT_METRICS)
+            if key in columns and columns[key][1] == 'REAL'
+        ]
+        self.create_schema()
+
+
+    def create_schema(self):
+        with self.lock, self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS rollups (
+                    tier TEXT NOT NULL,
+                    site TEXT NOT NULL,
+                    page_name TEXT NOT NULL,
+                    measurement_method TEXT NOT NULL,
+                    emulation_profile TEXT NOT NULL,
+                    cache_mode TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    bucket_start REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    min REAL NOT NULL,
+                    max REAL NOT NULL,
+                    sum REAL NOT NULL,
+                    sketch BLOB NOT NULL,
+                    PRIMARY KEY (tier, site, page_name, metric, bucket_start, measurement_method, emulation_profile, cache_mode)
+                ) WITHOUT ROWID
+            ''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS rollups_time ON rollups (tier, bucket_start)')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_progress (
+                    name TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                )
+            ''')
+
+            exists = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_results'"
+            ).fetchone()
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_results (
+                    run_id TEXT NOT NULL,
+                    page_url TEXT NOT NULL,
+                    timestamp REAL NOT NULL,
+                    emulation_profile TEXT NOT NULL,
+                    cache_mode TEXT NOT NULL,
+                    PRIMARY KEY (run_id, page_url, timestamp, emulation_profile, cache_mode)
+                ) WITHOUT ROWID
+            ''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS rollup_results_time ON rollup_results (timestamp)')
+
+            # Databases rolled up before rows were tracked: everything up to the watermark is already counted
+            if not exists:
+                row = self.connection.execute("SELECT value FROM rollup_progress WHERE name = 'last_result_id'").fetchone()
+                if row:
+                    self.connection.execute(
+                        f'INSERT OR IGNORE INTO rollup_results SELECT {self.IDENTITY_SQL} FROM results WHERE id <= ?', (row[0],)
+                    )
+
+
+    def get_progress(self, name, default=0):
+        with self.lock:
+            row = self.connection.execute('SELECT value FROM rollup_progress WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else default
+
+
+    @staticmethod
+    def bucket_start(tier, timestamp):
+        if tier == 'hourly':
+            return timestamp - timestamp % 3600
+        return datetime.fromtimestamp(timestamp).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+    # Fold every results row written since the last call into the tiers, skipping any measurement that has
+    # been rolled up before. Rows are read by id in batches, so the first call on a large history stays within
+    # bounded memory. Returns the number of rows added.
+    def update(self):
+        last_id = int(self.get_progress('last_result_id'))
+        columns = ', '.join(['id', 'timestamp', 'run_id', 'page_url'] + self.SERIES_COLUMNS + self.metrics)
+        total = 0
+
+        while True:
+            # Reading the batch, marking its rows as counted and merging them all commit together
+            with self.lock, self.connection:
+                rows = self.connection.execute(
+                    f'SELECT {columns} FROM results WHERE id > ? ORDER BY id LIMIT ?', (last_id, self.BATCH_SIZE)
+                ).fetchall()
+                if not rows:
+                    return total
+
+                new_rows = [row for row in rows if self.connection.execute(
+                    'INSERT OR IGNORE INTO rollup_results VALUES (?, ?, ROUND(?, 3), ?, ?)',
+                    (row['run_id'], row['page_url'], row['timestamp'], row['emulation_profile'] or '', row['cache_mode'] or '')
+                ).rowcount]
+
+                last_id = rows[-1]['id']
+                self.merge_buckets(self.aggregate(new_rows), last_id)
+                total += len(new_rows)
+
+
+    # [count, min, max, sum, sketch] per (tier, series, metric, bucket start)
+    def aggregate(self, rows):
+        buckets = {}
+        for row in rows:
+            series = tuple(row[column] or '' for column in self.SERIES_COLUMNS)
+            for metric in self.metrics:
+                value = row[metric]
+                if value is None:
+                    continue
+                for tier, _ in self.TIERS:
+                    key = (tier,) + series + (metric, self.bucket_start(tier, row['timestamp']))
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        bucket = buckets[key] = [0, value, value, 0.0, QuantileSketch(self.relative_accuracy)]
+                    bucket[0] += 1
+                    bucket[1] = min(bucket[1], value)
+                    bucket[2] = max(bucket[2], value)
+                    bucket[3] += value
+                    bucket[4].add(value)
+        return buckets
+
+
+    # Merge new buckets into the stored ones and move the watermark; called inside update()'s transaction
+    def merge_buckets(self, buckets, last_id):
+        key_columns = ['tier'] + self.SERIES_COLUMNS + ['metric', 'bucket_start']
+        where = ' AND '.join(f'{column} = ?' for column in key_columns)
+
+        for key, (count, low, high, total, sketch) in buckets.items():
+            stored = self.connection.execute(f'SELECT count, min, max, sum, sketch FROM rollups WHERE {where}', key).fetchone()
+            if stored:
+                count += stored['count']
+                low = min(low, stored['min'])
+                high = max(high, stored['max'])
+                total += stored['sum']
+                sketch.merge(QuantileSketch.from_bytes(stored['sketch'], self.relative_accuracy))
+
+            self.connection.execute(
+                f'INSERT OR REPLACE INTO rollups ({", ".join(key_columns)}, count, min, max, sum, sketch) '
+                f'VALUES ({", ".join("?" for _ in key_columns)}, ?, ?, ?, ?, ?)',
+                key + (count, low, high, total, sketch.to_bytes())
+            )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO rollup_progress (name, value) VALUES ('last_result_id', ?)", (last_id,)
+        )
+
+
+    # Apply the retention policy. Raw rows are only deleted once update() has rolled them up, along with
+    # their resource timings. Returns the number of raw rows deleted.
+    def compact(self, now=None):
+        now = now if now is not None else time.time()
+        self.update()
+        last_id = int(self.get_progress('last_result_id'))
+        deleted = 0
+
+        # Results ids aren't AUTOINCREMENT, so the newest row is always kept; deleting it would let SQLite
+        # hand its id out again, below the watermark, and that row would never be rolled up
+        with self.lock, self.connection:
+            if self.raw_days is not None:
+                cutoff = now - self.raw_days * 86400
+                max_id = self.connection.execute('SELECT MAX(id) FROM results').fetchone()[0] or 0
+                last_id = min(last_id, max_id - 1)
+                has_resources = self.connection.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resource_timings'"
+                ).fetchone()
+                if has_resources:
+                    self.connection.execute(
+                        'DELETE FROM resource_timings WHERE result_id IN (SELECT id FROM results WHERE timestamp < ? AND id <= ?)',
+                        (cutoff, last_id)
+                    )
+                deleted = self.connection.execute(
+                    'DELETE FROM results WHERE timestamp < ? AND id <= ?', (cutoff, last_id)
+                ).rowcount
+
+            for tier, days in (('hourly', self.hourly_days), ('daily', self.daily_days)):
+                if days is not None:
+                    self.connection.execute(
+                        'DELETE FROM rollups WHERE tier = ? AND bucket_start < ?', (tier, now - days * 86400)
+                    )
+
+            # Once no tier holds a bucket for a time any more, its rows' identities can go as well
+            if self.hourly_days is not None and self.daily_days is not None:
+                oldest = now - (max(self.hourly_days, self.daily_days) + 1) * 86400
+                self.connection.execute('DELETE FROM rollup_results WHERE timestamp < ?', (oldest,))
+
+        return deleted
+
+
+    # Points for one metric of one page between start and end (datetimes or epoch seconds), each a dict of
+    # time, count, min, max, mean, p50 and p95. resolution is the seconds per point wanted; by default the
+    # range is split into about max_points. The coarsest tier finer than the resolution is read, provided it
+    # still covers the start of the range, and its buckets are merged up to the resolution.
+    def series(self, site_url, page_name, metric='loadTime', start=None, end=None, resolution=None,
+               max_points=1000, measurement_method=None, now=None):
+        now = now if now is not None else time.time()
+        column = {key: name for name, _, key, _ in ResultsStore.COLUMNS}.get(metric, metric)
+        end = ResultsStore.to_epoch(end) if end is not None else now
+        start = ResultsStore.to_epoch(start) if start is not None else self.first_timestamp(site_url, page_name)
+        if start is None:
+            return []
+        if resolution is None:
+            resolution = max((end - start) / max_points, 1)
+
+        tier = self.choose_tier(start, resolution, now)
+        if tier == 'raw':
+            return self.raw_points(site_url, page_name, column, start, end, measurement_method)
+        return self.tier_points(tier, site_url, page_name, column, start, end, resolution, measurement_method)
+
+
+    # Coarsest first; a tier only answers if buckets are no longer than the resolution and it still holds the start
+    def choose_tier(self, start, resolution, now):
+        retention = {'raw': self.raw_days, 'hourly': self.hourly_days, 'daily': self.daily_days}
+        tiers = [(tier, seconds) for tier, seconds in reversed(self.TIERS)] + [('raw', 0)]
+        covering = [
+            (tier, seconds) for tier, seconds in tiers
+            if retention[tier] is None or start >= now - retention[tier] * 86400
+        ]
+
+        for tier, seconds in covering:
+            if seconds <= resolution:
+                return tier
+        # Nothing is that fine for the whole range, so use the finest tier that still covers it
+        return covering[-1][0] if covering else 'daily'
+
+
+    def first_timestamp(self, site_url, page_name):
+        with self.lock:
+            row = self.connection.execute(
+                '''SELECT MIN(first) FROM (
+                       SELECT MIN(bucket_start) AS first FROM rollups WHERE site = ? AND page_name = ?
+                       UNION ALL SELECT MIN(timestamp) FROM results WHERE site = ? AND page_name = ?
+                   )''',
+                (site_url, page_name, site_url, page_name)
+            ).fetchone()
+        return row[0]
+
+
+    def raw_points(self, site_url, page_name, column, start, end, measurement_method):
+        sql = f'SELECT timestamp, {column} AS value FROM results WHERE site = ? AND page_name = ? AND timestamp >= ? AND timestamp < ?'
+        params = [site_url, page_name, start, end]
+        if measurement_method:
+            sql += ' AND measurement_method = ?'
+            params.append(measurement_method)
+
+        with self.lock:
+            rows = self.connection.execute(sql + f' AND {column} IS NOT NULL ORDER BY timestamp', params).fetchall()
+        return [
+            {'time': row['timestamp'], 'count': 1, 'min': row['value'], 'max': row['value'],
+             'mean': row['value'], 'p50': row['value'], 'p95': row['value']}
+            for row in rows
+        ]
+
+
+    # Buckets are merged into resolution-sized groups; sketches merge exactly, so p50/p95 stay within the sketch accuracy
+    def tier_points(self, tier, site_url, page_name, column, start, end, resolution, measurement_method):
+        bucket_seconds = dict(self.TIERS)[tier]
+        sql = '''SELECT bucket_start, count, min, max, sum, sketch FROM rollups
+                 WHERE tier = ? AND site = ? AND page_name = ? AND metric = ? AND bucket_start >= ? AND bucket_start < ?'''
+        params = [tier, site_url, page_name, column, self.bucket_start(tier, start), end]
+        if measurement_method:
+            sql += ' AND measurement_method = ?'
+            params.append(measurement_method)
+
+        groups = {}
+        with self.lock:
+            rows = self.connection.execute(sql + ' ORDER BY bucket_start', params).fetchall()
+        for row in rows:
+            group_start = row['bucket_start'] - (row['bucket_start'] - start) % resolution if resolution > bucket_seconds else row['bucket_start']
+            group = groups.get(group_start)
+            sketch = QuantileSketch.from_bytes(row['sketch'], self.relative_accuracy)
+            if group is None:
+                groups[group_start] = [row['count'], row['min'], row['max'], row['sum'], sketch]
+            else:
+                group[0] += row['count']
+                group[1] = min(group[1], row['min'])
+                group[2] = max(group[2], row['max'])
+                group[3] += row['sum']
+                group[4].merge(sketch)
+
+        return [
+            {'time': group_start, 'count': count, 'min': low, 'max': high, 'mean': total / count,
+             'p50': sketch.quantile(0.5), 'p95': sketch.quantile(0.95)}
+            for group_start, (count, low, high, total, sketch) in sorted(groups.items())
+        ]
+
+
+    # Rows held per tier, to see what compaction saves
+    def counts(self):
+        with self.lock:
+            counts = {'raw': self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]}
+            for tier, rows in self.connection.execute('SELECT tier, COUNT(*) FROM rollups GROUP BY tier'):
+                counts[tier] = rows
+        return counts
@@ -0,0 +1,204 @@
+import glob
+import json
+import os
+import threading
+import time
+
+# An append-only journal of one sweep, so a sweep that dies partway (Chrome crashes, the network drops,
+# the machine reboots) can be resumed under the same run ID and measure only what's missing. Each run
+# gets data/journal/<run_id>.jsonl holding one JSON record per line:
+#   start      the run's measurement method, note and sites
+#   planned    a job about to be queued, keyed by its URL (and emulation profile, if any)
+#   completed  a job whose rows have been written, and whether its load failed
+#   finish     every planned job completed
+# Records are written with a single write() on a file opened with O_APPEND, and completed records are
+# fsynced (after the CSV row they vouch for) unless "fsync" is false. A crash can only tear the last
+# line; readers ignore it and the next writer cuts it off before appending.
+# A finished run's journal is renamed to <run_id>.finished.jsonl, so looking for unfinished runs never
+# has to read the finished ones, and journals older than keep_days are deleted by their age alone.
+# Jobs are planned on the thread that pulls the job generator and completed on the thread that writes
+# results, so every read and write of the journal goes through one lock.
+class RunJournal:
+    FINISHED_SUFFIX = '.finished.jsonl'
+
+    def __init__(self, folder, run_id, fsync=True):
+        self.folder = folder
+        self.run_id = run_id
+        self.path = os.path.join(folder, f'{run_id}.jsonl')
+        self.finished_path = os.path.join(folder, f'{run_id}{self.FINISHED_SUFFIX}')
+        self.fsync = fsync
+        self.file_descriptor = None
+        self.lock = threading.RLock()
+
+        self.start = None
+        self.planned = {}
+        self.completed = {}
+        self.finished = os.path.exists(self.finished_path)
+        if not self.finished:
+            for record in self.read(self.path):
+                self.apply(record)
+
+
+    def exists(self):
+        return self.finished or self.start is not None
+
+
+    # Start a new run. The journal file is created exclusively, so a run ID that is already taken
+    # raises FileExistsError instead of mixing two sweeps in one journal.
+    def create(self, measurement_method=None, note=None, sites=None):
+        os.makedirs(self.folder, exist_ok=True)
+        if os.path.exists(self.finished_path):
+            raise FileExistsError(self.finished_path)
+        self.file_descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644)
+        self.append({
+            'type': 'start', 'run_id': self.run_id, 'started_at': time.time(), 'measurement_method': measurement_method,
+            'note': note, 'sites': [site['url'] for site in sites or []]
+        })
+        return self
+
+
+    # Carry on appending to an unfinished run's journal
+    def resume(self):
+        if not self.exists() or self.finished:
+            raise ValueError(f'Run {self.run_id} has no unfinished journal')
+        self.truncate_partial_line(self.path)
+        self.file_descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self.append({'type': 'resume', 'resumed_at': time.time(), 'pid': os.getpid()})
+        return self
+
+
+    # Jobs completed with a successful load; failed loads are measured again when a run is resumed
+    def is_done(self, job):
+        with self.lock:
+            completed = self.completed.get(self.job_key(job))
+        return completed is not None and not completed['failed']
+
+
+    def plan(self, job):
+        key = self.job_key(job)
+        with self.lock:
+            if key not in self.planned:
+                self.append({'type': 'planned', 'key': key})
+
+
+    def complete(self, job, metrics):
+        self.append({'type': 'completed', 'key': self.job_key(job), 'failed': metrics.get('loadTime') is None, 'at': time.time()}, self.fsync)
+
+
+    # Close the journal, marking the run finished if every planned job has completed (unless finish is
+    # False, e.g. when the sweep raised). Returns whether the run is finished.
+    def close(self, finish=True):
+        with self.lock:
+            if self.file_descriptor is None:
+                return self.finished
+
+            finished = finish and self.missing() == 0
+            if finished:
+                failed = sum(1 for record in self.completed.values() if record['failed'])
+                self.append({'type': 'finish', 'finished_at': time.time(), 'completed': len(self.completed), 'failed': failed}, True)
+
+            os.close(self.file_descriptor)
+            self.file_descriptor = None
+            if finished:
+                os.replace(self.path, self.finished_path)
+            return self.finished
+
+
+    # Planned jobs with no completed record
+    def missing(self):
+        with self.lock:
+            return sum(1 for key in self.planned if key not in self.completed)
+
+
+    def append(self, record, sync=False):
+        with self.lock:
+            self.apply(record)
+            os.write(self.file_descriptor, (json.dumps(record) + '\n').encode('utf-8'))
+            if sync:
+                os.fsync(self.file_descriptor)
+
+
+    def apply(self, record):
+        kind = record.get('type')
+        if kind == 'start':
+            self.start = record
+        elif kind == 'planned':
+            self.planned[record['key']] = record
+        elif kind == 'completed':
+            self.completed[record['key']] = record
+        elif kind == 'finish':
+            self.finished = True
+
+
+    # A job's identity within a run; coordinator jobs carry the emulation profile in their site
+    @staticmethod
+    def job_key(job):
+        profile = job['site'].get('profile')
+        return f'{job["url"]}#{profile}' if profile else job['url']
+
+
+    # The complete lines of a journal, skipping a torn or unreadable last record
+    @staticmethod
+    def read(path):
+        if not os.path.exists(path):
+            return []
+
+        records = []
+        with open(path, 'rb') as file:
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+
+    # Cut a file back to its last newline, dropping a line a crash left half-written; returns the bytes dropped
+    @staticmethod
+    def truncate_partial_line(path):
+        if not os.path.exists(path):
+            return 0
+
+        with open(path, 'rb+') as file:
+            size = file.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                start = max(0, end - 65536)
+                file.seek(start)
+                block = file.read(end - start)
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+
+            if end < size:
+                file.truncate(end)
+                file.flush()
+                os.fsync(file.fileno())
+            return size - end
+
+
+    # IDs of the runs that never finished, newest first; only their file names are read
+    @classmethod
+    def unfinished_run_ids(cls, folder):
+        paths = glob.glob(os.path.join(folder, '*.jsonl'))
+        run_ids = [os.path.basename(path)[:-len('.jsonl')] for path in paths if not path.endswith(cls.FINISHED_SUFFIX)]
+        return sorted(run_ids, reverse=True)
+
+
+    # Delete journals, finished or not, that haven't been written to for days; returns how many were removed
+    @staticmethod
+    def prune(folder, days):
+        if days is None:
+            return 0
+
+        removed = 0
+        cutoff = time.time() - days * 86400
+        for path in glob.glob(os.path.join(folder, '*.jsonl')):
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
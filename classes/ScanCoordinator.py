@@ -0,0 +1,247 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hmac
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from LeaseQueue import LeaseQueue
+
+# Splits a sweep into (site, page, profile) jobs and leases them to ScanWorkers over a small JSON API:
+#   GET  /config     measurement method, sites and lease length for a new worker
+#   POST /claim      {"worker", "count"} -> {"jobs", "finished"}
+#   POST /heartbeat  {"worker", "job_ids"} -> {"renewed"}
+#   POST /result     {"worker", "job_id", "metrics"} -> {"accepted"}
+#   GET  /status     job counts by state
+# Every request must carry coordinator.token in the X-Coordinator-Token header. Site credentials are never
+# sent: sites and jobs go out without their authentication block and workers log in with their own config.
+# Results are written to the CSV files and results store here, so workers keep no state of their own.
+# With resume=True the scanner's run is an unfinished one: its old queue entries are dropped and only
+# the jobs its journal has no successful result for are queued again.
+class ScanCoordinator:
+    def __init__(self, scanner, resume=False):
+        self.scanner = scanner
+        self.config = scanner.config
+        self.logger = scanner.logger
+
+        coordinator_config = self.config.get("coordinator", {})
+        self.host = coordinator_config.get("host", "127.0.0.1")
+        self.token = coordinator_config.get("token") or ''
+        self.port = int(coordinator_config.get("port", 8780))
+        self.profiles = coordinator_config.get("profiles", [])
+        self.local_workers = int(coordinator_config.get("local_workers", 0))
+        self.lease_seconds = float(coordinator_config.get("lease_seconds", 60))
+        self.measurement_method = self.config.get("speed_check_method", "selenium")
+        self.run_id = scanner.report_timestamp
+        self.resume = resume
+
+        queue_path = os.path.join(scanner.script_root, coordinator_config.get("queue_path", "data/queue.sqlite"))
+        self.queue = LeaseQueue(queue_path, self.lease_seconds, int(coordinator_config.get("max_attempts", 3)))
+
+        self.stop_event = threading.Event()
+        self.write_lock = threading.Lock()
+        self.files = {}
+        self.sites = []
+
+
+    def run(self):
+        if not self.token:
+            self.logAndPrint('Set coordinator.token in config.json (the same value on every worker) before starting a coordinator')
+            return
+
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+        self.sites = self.scanner.get_sites()
+        for site in self.sites:
+            self.scanner.setup_folders(site)
+
+        if self.resume:
+            self.queue.clear(self.run_id)
+        total = self.queue.add(self.run_id, self.scanner.plan_jobs(self.build_payloads(self.sites)))
+        server = self.start_server()
+        self.logAndPrint(f'Coordinator listening on {self.host}:{self.port} with {total} jobs ({self.measurement_method})')
+
+        workers = self.start_local_workers()
+        try:
+            while not self.stop_event.wait(5):
+                counts = self.queue.counts(self.run_id)
+                self.logAndPrint(f'Jobs: {counts["done"]} done, {counts["leased"]} leased, '
+                                 f'{counts["pending"]} pending, {counts["failed"]} failed')
+                if counts['pending'] == 0 and counts['leased'] == 0:
+                    break
+        finally:
+            # Let local workers see the run is finished (or was stopped) before the API goes away
+            self.stop_event.set()
+            for worker in workers:
+                try:
+                    worker.wait(timeout=self.lease_seconds)
+                except subprocess.TimeoutExpired:
+                    worker.terminate()
+
+            server.shutdown()
+            server.server_close()
+            with self.write_lock:
+                for file in self.files.values():
+                    file.close()
+                self.files = {}
+                self.scanner.save_last_runs()
+            self.queue.close()
+            self.logAndPrint('Coordinator stopped')
+
+
+    def handle_signal(self, signum, frame):
+        self.logger.info(f'Received signal {signum}, stopping the coordinator')
+        self.stop_event.set()
+
+
+    def start_server(self):
+        server = ThreadingHTTPServer((self.host, self.port), CoordinatorRequestHandler)
+        server.daemon_threads = True
+        server.coordinator = self
+        threading.Thread(target=server.serve_forever, name='coordinator-http', daemon=True).start()
+        return server
+
+
+    # One job per (site, page, profile); profiles only apply to selenium, so other methods get one job per page
+    def build_payloads(self, sites):
+        profiles = self.profiles if self.measurement_method == 'selenium' and self.profiles else [None]
+        for job in self.scanner.build_jobs(sites):
+            site = self.without_credentials(job['site'])
+            for profile in profiles:
+                yield {'site': dict(site, profile=profile) if profile else site, 'page': job['page'], 'url': job['url']}
+
+
+    # The queue, the journal and every response only ever see a site without its login
+    @staticmethod
+    def without_credentials(site):
+        return {key: value for key, value in site.items() if key != 'authentication'}
+
+
+    def is_authorised(self, token):
+        return bool(self.token) and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+
+
+    # Workers started on this machine, mainly for testing the queue without more boxes
+    def start_local_workers(self):
+        url = f'http://127.0.0.1:{self.port}'
+        main_path = os.path.join(self.scanner.script_root, 'main.py')
+        return [
+            subprocess.Popen([sys.executable, main_path, '--worker', url, '--note', self.scanner.note])
+            for _ in range(self.local_workers)
+        ]
+
+
+    def get_config(self):
+        return {
+            'run_id': self.run_id,
+            'measurement_method': self.measurement_method,
+            'sites': [self.without_credentials(site) for site in self.sites],
+            'lease_seconds': self.lease_seconds
+        }
+
+
+    def claim(self, worker, count):
+        if self.stop_event.is_set():
+            return {'jobs': [], 'finished': True}
+
+        jobs, expired = self.queue.claim(self.run_id, worker, max(1, int(count)))
+        for job in jobs:
+            if job['previous_worker']:
+                self.logger.warning(f'Lease on {job["url"]} expired for {job["previous_worker"]}, reassigned to {worker}')
+
+        # Jobs that kept losing their workers are recorded as failed rather than retried forever
+        for job in expired:
+            self.write_result(job, {'loadTime': None, 'statusCode': '', 'error': 'Worker lease expired too many times'})
+
+        return {'jobs': jobs, 'finished': self.queue.is_finished(self.run_id)}
+
+
+    def heartbeat(self, worker, job_ids):
+        return {'renewed': self.queue.heartbeat(worker, job_ids)}
+
+
+    def complete(self, worker, job_id, metrics):
+        if not self.queue.complete(worker, job_id):
+            self.logger.warning(f'Ignoring result for job {job_id} from {worker}: its lease was reassigned')
+            return {'accepted': False}
+
+        self.write_result(self.queue.get_payload(job_id), metrics)
+        return {'accepted': True}
+
+
+    def write_result(self, job, metrics):
+        site = job['site']
+        with self.write_lock:
+            domain_folder = self.scanner.get_domain_folder(site)
+            if domain_folder not in self.files:
+                self.files[domain_folder] = self.scanner.open_results_csv(site)
+
+            self.scanner.report_load_time(job['page'], metrics, site=site)
+            self.scanner.write_row(self.files[domain_folder], site, job['page'], metrics, self.measurement_method)
+            self.scanner.complete_job(job, metrics, self.files[domain_folder])
+
+
+    def logAndPrint(self, message):
+        self.logger.info(message)
+        print(message)
+
+
+class CoordinatorRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        coordinator = self.server.coordinator
+        if not self.check_token():
+            return
+
+        if self.path == '/config':
+            self.send_json(coordinator.get_config())
+        elif self.path == '/status':
+            self.send_json(coordinator.queue.counts(coordinator.run_id))
+        else:
+            self.send_json({'error': 'Not found'}, 404)
+
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        if not self.check_token():
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path == '/claim':
+                self.send_json(coordinator.claim(body['worker'], body.get('count', 1)))
+            elif self.path == '/heartbeat':
+                self.send_json(coordinator.heartbeat(body['worker'], body.get('job_ids', [])))
+            elif self.path == '/result':
+                self.send_json(coordinator.complete(body['worker'], body['job_id'], body['metrics']))
+            else:
+                self.send_json({'error': 'Not found'}, 404)
+        except (KeyError, ValueError) as e:
+            self.send_json({'error': f'Bad request: {e}'}, 400)
+
+
+    # Turn away any request without the shared token before it can read sites or touch the queue
+    def check_token(self):
+        if self.server.coordinator.is_authorised(self.headers.get('X-Coordinator-Token', '')):
+            return True
+
+        self.server.coordinator.logger.warning(f'Rejected {self.command} {self.path} from {self.address_string()}: bad or missing token')
+        self.send_json({'error': 'Unauthorised'}, 401)
+        return False
+
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    # Route the per-request access log to the scanner's logger instead of stderr
+    def log_message(self, format, *args):
+        self.server.coordinator.logger.debug(f'{self.address_string()} {format % args}')
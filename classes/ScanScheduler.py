@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import time
+
+# Picks which pages the daemon measures each cycle, so a fixed measuring capacity covers a large URL set.
+# Each cycle has a budget of max_pages measurements and/or time_budget seconds of measuring time. Each page
+# has a weight. It starts at the page's configured importance and goes up for:
+#   - recent variance: the coefficient of variation of its load time (capped at 1) times variance_weight
+#   - distance to target: how close its mean load time is to target_load_time (1 at or over it) times target_weight
+#   - change events: a change-detector alert or failed load, decaying over change_decay seconds, times change_weight
+# Pages are then ranked by weight times seconds since they were last measured. A page measured at interval t
+# has reached priority w * t when it is picked, so over time each page is measured at a rate proportional to
+# its weight. Pages not measured for max_staleness seconds are always measured, over the budget if need be,
+# and no page is measured twice within min_interval. Load time means and variances are exponentially
+# weighted over about `window` measurements and saved to state_path after every cycle.
+class ScanScheduler:
+    DEFAULTS = {
+        'cycle_seconds': 300,
+        'max_pages': 50,
+        'time_budget': None,
+        'page_overhead': 1.0,
+        'default_cost': 5.0,
+        'min_interval': 300,
+        'max_staleness': 86400,
+        'variance_weight': 2,
+        'target_weight': 2,
+        'change_weight': 4,
+        'change_decay': 86400,
+        'window': 10
+    }
+
+    def __init__(self, config, target_load_time, state_path):
+        self.settings = dict(self.DEFAULTS, **{key: value for key, value in config.items() if key in self.DEFAULTS})
+        self.target_load_time = target_load_time
+        self.state_path = state_path
+        self.alpha = 2 / (self.settings['window'] + 1)
+        self.state = self.load_state()
+        self.dirty = False
+
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r') as file:
+            return json.load(file)
+
+
+    # Written once per cycle, like the change detector's state
+    def save_state(self):
+        if not self.dirty:
+            return
+
+        folder = os.path.dirname(self.state_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        temp_path = f'{self.state_path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.state, file)
+        os.replace(temp_path, self.state_path)
+        self.dirty = False
+
+
+    @staticmethod
+    def page_key(job):
+        return job['url']
+
+
+    # How many pages the budget can't reach within max_staleness (0 when it covers them all)
+    def coverage_shortfall(self, page_count):
+        cycles = self.settings['max_staleness'] / self.settings['cycle_seconds']
+        return max(0, math.ceil(page_count - cycles * self.settings['max_pages'])) if self.settings['max_pages'] else 0
+
+
+    # The jobs to measure this cycle, most urgent first, and how many of them were overdue
+    def plan(self, jobs, now=None):
+        now = now or time.time()
+        settings = self.settings
+        overdue = []
+        candidates = []
+
+        for job in jobs:
+            state = self.state.get(self.page_key(job))
+            if state is None:
+                # Never measured: ahead of everything that has been, but within the budget
+                candidates.append((math.inf, job))
+                continue
+
+            age = now - state['last']
+            if age >= job['page'].get('max_staleness', settings['max_staleness']):
+                overdue.append((age, job))
+            elif age >= settings['min_interval']:
+                candidates.append((self.weight(job['page'], state, now) * age, job))
+
+        overdue.sort(key=lambda item: item[0], reverse=True)
+        candidates.sort(key=lambda item: item[0], reverse=True)
+
+        batch = [job for _, job in overdue]
+        spent = sum(self.cost(job) for job in batch)
+        for _, job in candidates:
+            if settings['max_pages'] and len(batch) >= settings['max_pages']:
+                break
+            cost = self.cost(job)
+            if settings['time_budget'] and spent + cost > settings['time_budget'] and batch:
+                break
+            batch.append(job)
+            spent += cost
+
+        return batch, len(overdue)
+
+
+    # importance x (1 + variance) x (1 + distance to target) x (1 + recent change)
+    def weight(self, page, state, now):
+        settings = self.settings
+        weight = float(page.get('importance', 1))
+
+        if state['mean']:
+            variation = min(math.sqrt(state['var']) / state['mean'], 1)
+            weight *= 1 + settings['variance_weight'] * variation
+            weight *= 1 + settings['target_weight'] * min(state['mean'] / self.target_load_time, 1)
+
+        if state.get('changed') is not None:
+            weight *= 1 + settings['change_weight'] * math.exp(-(now - state['changed']) / settings['change_decay'])
+
+        return weight
+
+
+    # Estimated seconds to measure a page, from its mean load time
+    def cost(self, job):
+        state = self.state.get(self.page_key(job))
+        mean = state['mean'] if state and state['mean'] else self.settings['default_cost']
+        return mean + self.settings['page_overhead']
+
+
+    # Feed one result and the change events its row raised. A failed load counts as a change, so the page
+    # is checked again soon.
+    def update(self, job, metrics, events=None, now=None):
+        now = now or time.time()
+        state = self.state.setdefault(self.page_key(job), {'mean': None, 'var': 0.0, 'count': 0, 'last': now, 'changed': None})
+        state['last'] = now
+
+        load_time = metrics.get('loadTime')
+        if load_time is None or events:
+            state['changed'] = now
+
+        if load_time is not None:
+            state['count'] += 1
+            if state['mean'] is None:
+                state['mean'] = float(load_time)
+            else:
+                difference = load_time - state['mean']
+                increment = self.alpha * difference
+                state['mean'] += increment
+                state['var'] = (1 - self.alpha) * (state['var'] + difference * increment)
+
+        self.dirty = True
+
+
+    # Forget pages that are no longer configured
+    def prune(self, jobs):
+        keys = {self.page_key(job) for job in jobs}
+        removed = [key for key in self.state if key not in keys]
+        for key in removed:
+            del self.state[key]
+        if removed:
+            self.dirty = True
+        return len(removed)
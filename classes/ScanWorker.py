@@ -0,0 +1,141 @@
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+import json
+import os
+import signal
+import socket
+import threading
+
+# Claims jobs from a ScanCoordinator, measures them on the scanner's backends and posts each result
+# back as soon as it is ready. Leases are renewed from a heartbeat thread while jobs are in hand.
+# The coordinator never sends site credentials, so logins come from this machine's own config.json.
+class ScanWorker:
+    def __init__(self, scanner, coordinator_url):
+        self.scanner = scanner
+        self.logger = scanner.logger
+        self.coordinator_url = coordinator_url.rstrip('/')
+        self.worker_id = f'{socket.gethostname()}-{os.getpid()}'
+
+        worker_config = scanner.config.get("coordinator", {})
+        self.batch_size = int(worker_config.get("batch_size", 4))
+        self.poll_interval = float(worker_config.get("poll_interval", 2))
+        self.token = worker_config.get("token") or ''
+
+        sites = scanner.config.get("sites", [])
+        self.local_sites = {
+            site['url']: site for site in (sites.values() if isinstance(sites, dict) else sites) if 'url' in site
+        }
+
+        self.held_jobs = set()
+        self.held_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+        try:
+            run_config = self.request('GET', '/config')
+        except HTTPError as e:
+            if e.code != 401:
+                raise
+            self.logAndPrint(f'Coordinator rejected worker {self.worker_id}: coordinator.token does not match')
+            return
+
+        run_config['sites'] = [self.with_local_credentials(site) for site in run_config['sites']]
+        self.lease_seconds = run_config['lease_seconds']
+        self.logAndPrint(f'Worker {self.worker_id} joined run {run_config["run_id"]} ({run_config["measurement_method"]})')
+
+        # Each worker corrects for its own harness, since machines differ; the coordinator leaves corrected rows alone
+        if self.scanner.config.get("calibration", {}).get("enabled", False):
+            self.scanner.calibrate_overhead(run_config['measurement_method'])
+
+        run_batch, close = self.scanner.open_runner(run_config['sites'], run_config['measurement_method'])
+        heartbeat = threading.Thread(target=self.send_heartbeats, name='worker-heartbeat', daemon=True)
+        heartbeat.start()
+
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    response = self.request('POST', '/claim', {'worker': self.worker_id, 'count': self.batch_size})
+                except URLError:
+                    # The coordinator shuts its API down once the run is finished
+                    self.logAndPrint('Coordinator is no longer reachable')
+                    break
+
+                if not response['jobs']:
+                    if response['finished']:
+                        break
+                    # Everything left is leased to other workers; wait in case one of them dies
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                jobs = [dict(job, site=self.with_local_credentials(job['site'])) for job in response['jobs']]
+                with self.held_lock:
+                    self.held_jobs.update(job['id'] for job in jobs)
+                run_batch(iter(jobs), self.on_result)
+        finally:
+            self.stop_event.set()
+            close()
+            self.logAndPrint(f'Worker {self.worker_id} stopped')
+
+
+    def handle_signal(self, signum, frame):
+        self.logger.info(f'Received signal {signum}, finishing the current batch')
+        self.stop_event.set()
+
+
+    # Add the login for a site from this worker's config, if it has one for the same URL
+    def with_local_credentials(self, site):
+        local_site = self.local_sites.get(site['url'], {})
+        if 'authentication' not in local_site:
+            return site
+        return dict(site, authentication=local_site['authentication'])
+
+
+    # Stream each result back as it arrives; if the post fails the lease simply runs out and the job is retried
+    def on_result(self, job, metrics):
+        with self.held_lock:
+            self.held_jobs.discard(job['id'])
+
+        self.scanner.correct_overhead(metrics)
+        self.scanner.report_load_time(job['page'], metrics, site=job['site'])
+        try:
+            response = self.request('POST', '/result', {'worker': self.worker_id, 'job_id': job['id'], 'metrics': metrics})
+            if not response['accepted']:
+                self.logger.warning(f'Coordinator rejected the result for {job["url"]} (lease reassigned)')
+        except URLError as e:
+            self.logger.error(f'Could not send the result for {job["url"]}: {e}')
+
+
+    # Renew the leases three times per lease period so one slow or lost heartbeat doesn't cost a job
+    def send_heartbeats(self):
+        while not self.stop_event.wait(self.lease_seconds / 3):
+            with self.held_lock:
+                job_ids = list(self.held_jobs)
+            if not job_ids:
+                continue
+
+            try:
+                renewed = set(self.request('POST', '/heartbeat', {'worker': self.worker_id, 'job_ids': job_ids})['renewed'])
+            except URLError as e:
+                self.logger.warning(f'Heartbeat failed: {e}')
+                continue
+
+            lost = set(job_ids) - renewed
+            if lost:
+                self.logger.warning(f'Lost the lease on jobs {sorted(lost)}; their results will be ignored')
+
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json', 'X-Coordinator-Token': self.token}
+        request = Request(f'{self.coordinator_url}{path}', data=data, method=method, headers=headers)
+        with urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+
+
+    def logAndPrint(self, message):
+        self.logger.info(message)
+        print(message)
@@ -1,4 +1,4 @@
-from datetime import datetime
+import time
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -8,17 +8,142 @@ from selenium.webdriver.chrome.service import Service as ChromeService
 
 from BasePerformanceMeasurement import BasePerformanceMeasurement
 
+# Injected before any page script runs so buffered and live entries are all observed.
+# LCP and CLS (largest session window) follow the web-vitals definitions; INP is the slowest
+# interaction seen, which stays 0 for loads without user input.
+VITALS_OBSERVER_JS = """
+(function () {
+    if (window.__perfVitals) return;
+    var vitals = window.__perfVitals = {lcp: 0, cls: 0, inp: 0, fcp: 0, longTasks: []};
+    var sessionValue = 0, sessionStart = 0, sessionLast = 0;
+
+    // The default resource timing buffer stops at 250 entries; keep every resource for the waterfall
+    if (performance.setResourceTimingBufferSize) performance.setResourceTimingBufferSize(5000);
+
+    function observe(type, callback, options) {
+        try {
+            new PerformanceObserver(function (list) {
+                list.getEntries().forEach(callback);
+            }).observe(Object.assign({type: type, buffered: true}, options || {}));
+        } catch (e) {}
+    }
+
+    observe('largest-contentful-paint', function (entry) {
+        vitals.lcp = entry.renderTime || entry.loadTime || entry.startTime;
+    });
+    observe('layout-shift', function (entry) {
+        if (entry.hadRecentInput) return;
+        if (sessionValue && entry.startTime - sessionLast < 1000 && entry.startTime - sessionStart < 5000) {
+            sessionValue += entry.value;
+        } else {
+            sessionValue = entry.value;
+            sessionStart = entry.startTime;
+        }
+        sessionLast = entry.startTime;
+        vitals.cls = Math.max(vitals.cls, sessionValue);
+    });
+    observe('event', function (entry) {
+        if (entry.interactionId) vitals.inp = Math.max(vitals.inp, entry.duration);
+    }, {durationThreshold: 40});
+    observe('first-input', function (entry) {
+        vitals.inp = Math.max(vitals.inp, entry.duration);
+    });
+    observe('paint', function (entry) {
+        if (entry.name === 'first-contentful-paint') vitals.fcp = entry.startTime;
+    });
+    observe('longtask', function (entry) {
+        vitals.longTasks.push([entry.startTime, entry.duration]);
+    });
+})();
+"""
+
+# Waits for the load event plus the settle window, then returns everything in one round trip.
+# Times are in seconds from navigation start. Page weight uses encodedBodySize so cached resources
+# still count, while transferBytes is what actually came over the network.
+COLLECT_METRICS_JS = """
+var settleMs = arguments[0];
+var captureResources = arguments[1];
+var done = arguments[arguments.length - 1];
+
+function collect() {
+    var nav = performance.getEntriesByType('navigation')[0] || {};
+    var paint = performance.getEntriesByType('paint').filter(function (entry) { return entry.name === 'first-paint'; });
+    var resources = performance.getEntriesByType('resource');
+    var vitals = window.__perfVitals || {lcp: 0, cls: 0, inp: 0, fcp: 0, longTasks: []};
+
+    var transferBytes = nav.transferSize || 0, encodedBytes = nav.encodedBodySize || 0, decodedBytes = nav.decodedBodySize || 0;
+    resources.forEach(function (resource) {
+        transferBytes += resource.transferSize || 0;
+        encodedBytes += resource.encodedBodySize || 0;
+        decodedBytes += resource.decodedBodySize || 0;
+    });
+
+    // Total blocking time: the part of each long task after first contentful paint beyond 50ms
+    var longTaskTotal = 0, totalBlockingTime = 0;
+    vitals.longTasks.forEach(function (task) {
+        longTaskTotal += task[1];
+        if (task[0] >= vitals.fcp) totalBlockingTime += Math.max(task[1] - 50, 0);
+    });
+
+    var secureStart = nav.secureConnectionStart || 0;
+    done({
+        'navigationLoadTime': (nav.loadEventEnd || 0) / 1000,
+        'firstPaint': (paint.length > 0 ? paint[0].startTime : vitals.fcp) / 1000,
+        'domContentLoaded': (nav.domContentLoadedEventEnd || 0) / 1000,
+        'numberRequests': resources.length + 1,
+        'pageWeightBytes': encodedBytes,
+        'dnsTime': ((nav.domainLookupEnd || 0) - (nav.domainLookupStart || 0)) / 1000,
+        'connectTime': ((secureStart || nav.connectEnd || 0) - (nav.connectStart || 0)) / 1000,
+        'tlsTime': secureStart ? ((nav.connectEnd || 0) - secureStart) / 1000 : 0,
+        'ttfb': (nav.responseStart || 0) / 1000,
+        'downloadTime': ((nav.responseEnd || 0) - (nav.responseStart || 0)) / 1000,
+        'transferBytes': transferBytes,
+        'decodedBytes': decodedBytes,
+        'lcp': vitals.lcp / 1000,
+        'cls': vitals.cls,
+        'inp': vitals.inp ? vitals.inp / 1000 : '',
+        'tbt': totalBlockingTime / 1000,
+        'longTaskTotal': longTaskTotal / 1000,
+        'longTaskCount': vitals.longTasks.length,
+        'resources': captureResources ? resources.map(function (resource) {
+            return [resource.name, resource.initiatorType, resource.startTime, resource.duration,
+                    resource.transferSize || 0, resource.nextHopProtocol || ''];
+        }) : []
+    });
+}
+
+if (document.readyState === 'complete') {
+    setTimeout(collect, settleMs);
+} else {
+    window.addEventListener('load', function () { setTimeout(collect, settleMs); });
+}
+"""
+
 class SeleniumPerformanceMeasurement(BasePerformanceMeasurement):
-    def __init__(self, url, driver):
+    # settle_ms is how long to keep observing after the load event (late LCP candidates, layout shifts).
+    # With capture_resources the metrics include a 'resources' list of per-resource timing entries.
+    # profile is the EmulationProfile to load the page under (applied only when the driver isn't already on it).
+    def __init__(self, url, driver, settle_ms=1000, capture_resources=True, profile=None):
         super().__init__(url)
         self.driver = driver
+        self.settle_ms = settle_ms
+        self.capture_resources = capture_resources
+        self.profile = profile
 
 
+    # Log the driver in to the site. With a session_cache, saved cookies are injected instead while they
+    # are valid, and the cookies from a fresh login are saved for the next run (and the other backends)
     @staticmethod
-    def authenticate(site, driver):
+    def authenticate(site, driver, session_cache=None):
         if 'authentication' not in site:
             return  # No authentication data present
 
+        if session_cache:
+            cookies = session_cache.get_valid(site)
+            if cookies:
+                SeleniumPerformanceMeasurement.add_cookies(driver, cookies)
+                return
+
         url = site['url']
         username = site['authentication']['username']
         password = site['authentication']['password']
@@ -35,54 +160,101 @@ class SeleniumPerformanceMeasurement(BasePerformanceMeasurement):
         login_button.click()
         WebDriverWait(driver, 10).until(EC.url_changes(url))
 
+        if session_cache:
+            session_cache.save(site, driver.get_cookies())
+
+
+    # Network.setCookies works before the browser has visited the site, unlike driver.add_cookie
+    @staticmethod
+    def add_cookies(driver, cookies):
+        cdp_cookies = []
+        for cookie in cookies:
+            cdp_cookie = {
+                'name': cookie['name'],
+                'value': cookie['value'],
+                'domain': cookie.get('domain', ''),
+                'path': cookie.get('path', '/'),
+                'secure': cookie.get('secure', False),
+                'httpOnly': cookie.get('httpOnly', False)
+            }
+            if cookie.get('expiry'):
+                cdp_cookie['expires'] = cookie['expiry']
+            cdp_cookies.append(cdp_cookie)
+
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': cdp_cookies})
+
+
+    # Drops the HTTP cache but keeps cookies, so logged-in sessions survive a cold load
+    @staticmethod
+    def clear_cache(driver):
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+
 
+    # Pass a profile_dir to give the browser its own user data directory (cache, cookies, storage),
+    # and an EmulationProfile to start it under that network, CPU and device emulation
     @staticmethod
-    def create_driver(config):
+    def create_driver(config, profile_dir=None, profile=None):
         print("Creating Selenium Driver")
         service = ChromeService(executable_path=config.get("driver_path", "/usr/local/bin/"))
         options = ChromeOptions()
         
         headless = config.get("headless", False)
         window_size = config.get("window_size", {"width": 1920, "height": 1080})
-        options.add_argument(f"--headless={headless} --window-size={window_size['width']}x{window_size['height']}")
+        if headless:
+            options.add_argument("--headless=new")
+        options.add_argument(f"--window-size={window_size['width']},{window_size['height']}")
+
+        if profile_dir:
+            options.add_argument(f"--user-data-dir={profile_dir}")
+
+        driver = webdriver.Chrome(service=service, options=options)
+
+        # Register the Web Vitals observers for every document this driver loads
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': VITALS_OBSERVER_JS})
 
-        return webdriver.Chrome(service=service, options=options)
+        # Set once here so collecting metrics stays a single call; it covers the load event plus the settle window
+        driver.set_script_timeout(config.get("script_timeout", 60))
+
+        if profile:
+            profile.apply(driver)
+
+        return driver
 
 
     def measure_performance(self):
         print(f"Measuring performance for: {self.url}")
+        if self.profile:
+            self.profile.apply(self.driver)
+
+        # driver.get returns once the load event has fired, so the settle window below is never timed.
+        # perf_counter_ns is monotonic, unlike time.time(), so a clock adjustment can't skew the result.
+        measured_at = time.time()
+        start_time = time.perf_counter_ns()
         self.driver.get(self.url)
-        # Wait for the page to load completely
-        WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        end_time = time.perf_counter_ns()
+
+        # Get performance metrics (waits for the load event and the settle window in the browser)
+        metrics = self.get_performance_metrics(self.driver, self.settle_ms, self.capture_resources)
+        metrics['measuredAt'] = measured_at
+        metrics['loadTime'] = round((end_time - start_time) / 1e9, 4)
 
-        # Get performance metrics
-        metrics = self.get_performance_metrics()
+        for key in ('firstPaint', 'domContentLoaded', 'navigationLoadTime', 'dnsTime', 'connectTime', 'tlsTime',
+                    'ttfb', 'downloadTime', 'lcp', 'tbt', 'longTaskTotal', 'inp'):
+            if metrics.get(key) != '':
+                metrics[key] = round(metrics[key], 3)
+        metrics['cls'] = round(metrics['cls'], 4)
+        metrics['emulationProfile'] = self.profile.name if self.profile else ''
 
         # Logging metrics
         print(f"Performance metrics for {self.url}:")
         for key, value in metrics.items():
-            print(f"{key}: {value}")
+            if key != 'resources':
+                print(f"{key}: {value}")
 
+        return metrics
 
-    @staticmethod
-    def get_performance_metrics(driver):
-        # JavaScript to extract performance metrics
-        metrics_js = """
-        var timing = performance.timing;
-        var paint = performance.getEntriesByType('paint');
-        var resources = performance.getEntriesByType('resource');
-        var numberOfRequests = resources.length;
-        var totalSize = 0;
-        for (var resource of resources) {
-            totalSize += resource.transferSize;
-        }
 
-        return {
-            'loadTime': timing.loadEventEnd - timing.navigationStart,
-            'firstPaint': paint.length > 0 ? paint[0].startTime : 0,
-            'domContentLoaded': timing.domContentLoadedEventEnd - timing.navigationStart,
-            'numberOfRequests': numberOfRequests,
-            'pageWeightBytes': totalSize
-        };
-        """
-        return driver.execute_script(metrics_js)
\ No newline at end of file
+    # Navigation Timing Level 2, paint, resource and Web Vitals data in a single execute_script round trip
+    @staticmethod
+    def get_performance_metrics(driver, settle_ms=1000, capture_resources=False):
+        return driver.execute_async_script(COLLECT_METRICS_JS, settle_ms, capture_resources)
@@ -0,0 +1,187 @@
+import queue
+import shutil
+import tempfile
+import threading
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from EmulationProfile import EmulationProfiles
+from SeleniumPerformanceMeasurement import SeleniumPerformanceMeasurement
+
+class SeleniumWorkerPool:
+    # config is the selenium block; profiles resolves each site's EmulationProfile
+    # (built from the selenium block alone when not given) and session_cache holds saved logins
+    def __init__(self, config, logger=None, profiles=None, session_cache=None):
+        self.config = config or {}
+        self.profiles = profiles or EmulationProfiles({'selenium': self.config})
+        self.session_cache = session_cache
+        self.size = max(1, int(self.config.get("workers", 1)))
+        self.max_retries = int(self.config.get("max_retries", 1))
+        self.settle_ms = int(self.config.get("settle_ms", 1000))
+        self.capture_resources = self.config.get("capture_resources", True)
+        self.logger = logger
+
+        # Workers are always headless, whatever the interactive setting is
+        self.driver_config = dict(self.config, headless=True)
+
+        # Bounded so a generator of jobs is only consumed as fast as the workers can measure
+        self.jobs = queue.Queue(maxsize=self.size * 2)
+        self.result_lock = threading.Lock()
+        self.workers = []
+        self.on_result = None
+        self.result_error = None
+
+
+    # Measure every job on the pool and call on_result(job, metrics) for each one.
+    # Jobs are dicts with 'site', 'page' and 'url' keys; on_result is never called concurrently.
+    def run(self, jobs, on_result):
+        self.start()
+        try:
+            self.run_batch(jobs, on_result)
+        finally:
+            self.stop()
+
+
+    # Start the workers; browsers are created on first use and stay open until stop()
+    def start(self):
+        self.workers = [
+            threading.Thread(target=self._worker, args=(index,), name=f'selenium-worker-{index}', daemon=True)
+            for index in range(self.size)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+
+    # Queue a batch of jobs and block until every one of them has been measured. If on_result raises,
+    # the rest of the batch is drained without being measured and the first error is raised here.
+    def run_batch(self, jobs, on_result):
+        self.on_result = on_result
+        self.result_error = None
+        for job in jobs:
+            if self.result_error is not None:
+                break
+            self.jobs.put(job)
+
+        self.jobs.join()
+        if self.result_error is not None:
+            raise self.result_error
+
+
+    def stop(self):
+        # One sentinel per worker so every thread exits once the queue drains
+        for _ in self.workers:
+            self.jobs.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+
+    def _worker(self, index):
+        profile_dir = None
+        driver = None
+        authenticated_sites = set()
+
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    self.jobs.task_done()
+                    break
+                if self.result_error is not None:
+                    self.jobs.task_done()
+                    continue
+
+                attempts = 0
+                while True:
+                    try:
+                        profile = self.profiles.for_site(job['site'])
+                        if driver is None:
+                            profile_dir = tempfile.mkdtemp(prefix=f'selenium-worker-{index}-')
+                            driver = SeleniumPerformanceMeasurement.create_driver(
+                                self.driver_config, profile_dir=profile_dir, profile=profile
+                            )
+                            authenticated_sites = set()
+
+                        site = job['site']
+                        if 'authentication' in site and site['url'] not in authenticated_sites:
+                            SeleniumPerformanceMeasurement.authenticate(site=site, driver=driver, session_cache=self.session_cache)
+                            authenticated_sites.add(site['url'])
+
+                        metrics = SeleniumPerformanceMeasurement(
+                            job['url'], driver, self.settle_ms, self.capture_resources, profile
+                        ).measure_performance()
+                        break
+
+                    except TimeoutException as e:
+                        # The browser is still healthy, the page was just too slow
+                        metrics = self.failed_metrics(job, e)
+                        break
+
+                    except WebDriverException as e:
+                        # Treat anything else as a dead browser: replace it and its profile, then retry the job
+                        self.log('error', f'Worker {index} browser failed on {job["url"]}: {self.describe(e)}')
+                        self.quit_driver(driver, profile_dir)
+                        driver = None
+                        profile_dir = None
+
+                        attempts += 1
+                        if attempts > self.max_retries:
+                            metrics = self.failed_metrics(job, e)
+                            break
+
+                    except Exception as e:
+                        # Never let one bad page take a worker (and its share of the queue) down
+                        metrics = self.failed_metrics(job, e)
+                        break
+
+                # A failed write stops the batch, but the worker stays up so the queue still drains
+                try:
+                    with self.result_lock:
+                        self.on_result(job, metrics)
+                except Exception as e:
+                    self.log('error', f'Writing the result for {job["url"]} failed: {self.describe(e)}')
+                    with self.result_lock:
+                        if self.result_error is None:
+                            self.result_error = e
+                finally:
+                    self.jobs.task_done()
+        finally:
+            self.quit_driver(driver, profile_dir)
+
+
+    def failed_metrics(self, job, error):
+        self.log('error', f'Giving up on {job["url"]}: {self.describe(error)}')
+        try:
+            profile_name = self.profiles.for_site(job['site']).name
+        except ValueError:
+            profile_name = ''
+
+        return {
+            'loadTime': None,
+            'statusCode': '',
+            'emulationProfile': profile_name,
+            'error': self.describe(error)
+        }
+
+
+    @staticmethod
+    def describe(error):
+        message = getattr(error, 'msg', None) or str(error) or error.__class__.__name__
+        return message.strip().splitlines()[0]
+
+
+    @staticmethod
+    def quit_driver(driver, profile_dir):
+        if driver is not None:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+        if profile_dir:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+
+    def log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
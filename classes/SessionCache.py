@@ -0,0 +1,191 @@
+from urllib.parse import urlsplit
+import json
+import os
+import threading
+import time
+
+# Login cookies saved per site under data/.sessions so every run (and every backend) can reuse them.
+# Cookies are kept in the WebDriver format: name, value, domain, path, expiry, secure, httpOnly.
+class SessionCache:
+    def __init__(self, folder, max_age=43200, revalidate_after=300, logger=None):
+        self.folder = folder
+        self.max_age = max_age
+        self.revalidate_after = revalidate_after
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.entries = {}
+
+        if not os.path.exists(folder):
+            os.makedirs(folder, mode=0o700)
+
+
+    def get_path(self, site):
+        host = urlsplit(site['url']).netloc.replace(':', '_')
+        return os.path.join(self.folder, f'{host}.json')
+
+
+    # The cached cookies for a site, or None when there are none or they have expired
+    def load(self, site):
+        entry = self.read_entry(site)
+        if not entry:
+            return None
+
+        now = time.time()
+        if now - entry['saved_at'] > self.max_age:
+            return None
+
+        cookies = [cookie for cookie in entry['cookies'] if not cookie.get('expiry') or cookie['expiry'] > now]
+        if not cookies or len(cookies) < len(entry['cookies']):
+            # A login cookie that has expired means the whole session has
+            return None
+        return cookies
+
+
+    def read_entry(self, site):
+        path = self.get_path(site)
+        with self.lock:
+            if path not in self.entries:
+                entry = None
+                if os.path.exists(path):
+                    try:
+                        with open(path, 'r') as file:
+                            entry = json.load(file)
+                    except (OSError, ValueError):
+                        entry = None
+                self.entries[path] = entry
+            return self.entries[path]
+
+
+    def save(self, site, cookies):
+        now = time.time()
+        self.write_entry(site, {'saved_at': now, 'validated_at': now, 'cookies': cookies})
+        self.log('info', f'Saved login session for {site["url"]}')
+
+
+    # Written to a private temp file and moved into place, so the file is never world-readable or half-written
+    def write_entry(self, site, entry):
+        path = self.get_path(site)
+        with self.lock:
+            temp_path = f'{path}.tmp'
+            descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(entry, file, indent=4)
+            os.replace(temp_path, path)
+            self.entries[path] = entry
+
+
+    def invalidate(self, site):
+        path = self.get_path(site)
+        with self.lock:
+            self.entries[path] = None
+            if os.path.exists(path):
+                os.remove(path)
+
+
+    # A single GET of authentication.check_url (no redirects followed): 200 means the cookies still log us in.
+    # Without a check_url the cookies are trusted until they expire. Checks are skipped for
+    # revalidate_after seconds after the last one, so a 5-minute daemon cycle rarely makes one.
+    def is_valid(self, site, cookies):
+        entry = self.read_entry(site)
+        check_url = site.get('authentication', {}).get('check_url')
+        if not check_url or time.time() - entry.get('validated_at', 0) < self.revalidate_after:
+            return True
+
+        if not check_url.startswith(('http://', 'https://')):
+            check_url = f'{site["url"]}{check_url}'
+
+        # Imported here so the cache doesn't pull requests into start-up for the other backends
+        import requests
+
+        session = requests.Session()
+        self.add_to_jar(session.cookies, cookies)
+        try:
+            response = session.get(check_url, allow_redirects=False, timeout=10)
+        except requests.RequestException as e:
+            self.log('warning', f'Could not check login session for {site["url"]}: {e}')
+            return False
+        finally:
+            session.close()
+
+        if response.status_code != 200:
+            self.log('info', f'Login session for {site["url"]} has expired (check returned {response.status_code})')
+            return False
+
+        self.write_entry(site, dict(entry, validated_at=time.time()))
+        return True
+
+
+    # Cached cookies that are still good, or None when the site needs to log in again
+    def get_valid(self, site):
+        cookies = self.load(site)
+        if cookies and self.is_valid(site, cookies):
+            return cookies
+        return None
+
+
+    @staticmethod
+    def cookies_from_jar(jar):
+        return [
+            {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'expiry': cookie.expires,
+                'secure': cookie.secure,
+                'httpOnly': cookie.has_nonstandard_attr('HttpOnly')
+            }
+            for cookie in jar
+        ]
+
+
+    @staticmethod
+    def add_to_jar(jar, cookies):
+        for cookie in cookies:
+            jar.set(
+                cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'),
+                expires=cookie.get('expiry'), secure=cookie.get('secure', False)
+            )
+
+
+    # aiohttp keeps cookies as Morsels; expires is an HTTP date string there
+    @staticmethod
+    def cookies_from_morsels(morsels, default_domain):
+        from email.utils import parsedate_to_datetime
+
+        cookies = []
+        for morsel in morsels:
+            expiry = None
+            if morsel['expires']:
+                try:
+                    expiry = int(parsedate_to_datetime(morsel['expires']).timestamp())
+                except (TypeError, ValueError):
+                    expiry = None
+
+            cookies.append({
+                'name': morsel.key,
+                'value': morsel.value,
+                'domain': morsel['domain'] or default_domain,
+                'path': morsel['path'] or '/',
+                'expiry': expiry,
+                'secure': bool(morsel['secure']),
+                'httpOnly': bool(morsel['httponly'])
+            })
+        return cookies
+
+
+    @staticmethod
+    def to_simple_cookie(cookies):
+        from http.cookies import SimpleCookie
+
+        simple_cookie = SimpleCookie()
+        for cookie in cookies:
+            simple_cookie[cookie['name']] = cookie['value']
+            simple_cookie[cookie['name']]['domain'] = cookie.get('domain', '')
+            simple_cookie[cookie['name']]['path'] = cookie.get('path', '/')
+        return simple_cookie
+
+
+    def log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
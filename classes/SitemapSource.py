@@ -0,0 +1,169 @@
+from collections import deque
+from urllib.parse import urljoin, urlsplit, urlunsplit
+import hashlib
+import re
+import xml.etree.ElementTree as ET
+import zlib
+
+import requests
+
+class SitemapSource:
+    def __init__(self, site, session=None, logger=None):
+        sitemap_config = site.get("sitemap", {})
+        if isinstance(sitemap_config, str):
+            sitemap_config = {"url": sitemap_config}
+
+        self.site_url = site["url"]
+        site_parts = urlsplit(self.normalise_url(self.site_url))
+        self.site_host = site_parts.netloc
+        # Page URLs are joined onto the site URL, so a site at https://host/blog yields /post/ rather than /blog/post/
+        self.site_path = site_parts.path.rstrip('/')
+        self.sitemap_url = urljoin(self.site_url + '/', sitemap_config.get("url", "/sitemap.xml"))
+        self.include = [re.compile(pattern) for pattern in sitemap_config.get("include", [])]
+        self.exclude = [re.compile(pattern) for pattern in sitemap_config.get("exclude", [])]
+        self.limit = sitemap_config.get("limit")
+        self.timeout = sitemap_config.get("timeout", 30)
+
+        self.session = session or requests.Session()
+        self.logger = logger
+
+
+    # Lazily yield a page dict ({'url': path, 'name': path}) for every unique URL in the sitemap.
+    # Sitemap files are parsed as they stream in and nested index files are only fetched when reached,
+    # so memory stays bounded by the dedup digests rather than the size of the sitemap.
+    def __iter__(self):
+        pending = deque([self.sitemap_url])
+        visited_sitemaps = set()
+        seen = set()
+        count = 0
+
+        while pending:
+            sitemap_url = pending.popleft()
+            if sitemap_url in visited_sitemaps:
+                continue
+            visited_sitemaps.add(sitemap_url)
+
+            try:
+                for kind, loc in self.parse(sitemap_url):
+                    if kind == 'sitemap':
+                        pending.append(urljoin(sitemap_url, loc))
+                        continue
+
+                    url = self.normalise_url(urljoin(sitemap_url, loc))
+                    path = self.get_path(url)
+                    if path is None or not self.is_wanted(path):
+                        continue
+
+                    # 8-byte digests keep the dedup set small for sitemaps with tens of thousands of URLs
+                    digest = hashlib.blake2b(url.encode(), digest_size=8).digest()
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+
+                    yield {'url': path, 'name': path}
+
+                    count += 1
+                    if self.limit and count >= self.limit:
+                        return
+
+            except (requests.RequestException, ET.ParseError, zlib.error) as e:
+                self.log('error', f'Failed to read sitemap {sitemap_url}: {e}')
+
+
+    # Yield ('url', loc) and ('sitemap', loc) pairs from one sitemap or sitemap index file
+    def parse(self, sitemap_url):
+        with self.session.get(sitemap_url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+
+            parser = ET.XMLPullParser(events=('start', 'end'))
+            decompressor = None
+            root = None
+
+            # iter_content undoes any Content-Encoding; .xml.gz files served as plain bytes are unwrapped here
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if decompressor is None:
+                    decompressor = zlib.decompressobj(wbits=31) if chunk[:2] == b'\x1f\x8b' else False
+                if decompressor:
+                    chunk = decompressor.decompress(chunk)
+
+                parser.feed(chunk)
+                for tag, loc, element in self.read_entries(parser):
+                    if root is None:
+                        root = element
+                    elif tag:
+                        # Drop finished entries so the tree never holds more than a chunk's worth of them
+                        root.clear()
+                        if loc:
+                            yield tag, loc
+
+            if decompressor:
+                parser.feed(decompressor.flush())
+            parser.close()
+
+
+    # Yield (None, None, root) for the document element, then (tag, loc, element) for each finished entry
+    def read_entries(self, parser):
+        for event, element in parser.read_events():
+            if event == 'start':
+                if self.local_name(element.tag) in ('urlset', 'sitemapindex'):
+                    yield None, None, element
+                continue
+
+            tag = self.local_name(element.tag)
+            if tag not in ('url', 'sitemap'):
+                continue
+
+            loc = None
+            for child in element:
+                if self.local_name(child.tag) == 'loc' and child.text:
+                    loc = child.text.strip()
+                    break
+
+            yield tag, loc, element
+
+
+    @staticmethod
+    def local_name(tag):
+        return tag.rsplit('}', 1)[-1]
+
+
+    # Lower-case scheme and host, drop default ports and fragments, and give empty paths a '/'
+    @staticmethod
+    def normalise_url(url):
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+
+        port = parts.port
+        if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+            host = f'{host}:{port}'
+
+        return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+    # Pages are stored relative to the site URL; URLs on other hosts or outside the site's path are ignored
+    def get_path(self, url):
+        parts = urlsplit(url)
+        if parts.netloc != self.site_host:
+            return None
+
+        path = parts.path
+        if self.site_path:
+            if path != self.site_path and not path.startswith(self.site_path + '/'):
+                return None
+            path = path[len(self.site_path):] or '/'
+        if parts.query:
+            path += f'?{parts.query}'
+        return path
+
+
+    def is_wanted(self, path):
+        if self.include and not any(pattern.search(path) for pattern in self.include):
+            return False
+        return not any(pattern.search(path) for pattern in self.exclude)
+
+
+    def log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
+        print(message)
@@ -0,0 +1,131 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+import time
+
+# A local web server with known behaviour to benchmark the scanner against. Every page waits
+# `latency` seconds before responding with about body_bytes of HTML that references `subresources`
+# stylesheets, scripts and images, each served after subresource_latency seconds.
+# A share of page requests set by error_rate fail with a 500. `files` maps paths to (content type, bytes)
+# served as they are, e.g. generated sitemaps.
+class StandInServer:
+    def __init__(self, latency=0.1, body_bytes=50000, subresources=10, error_rate=0.0,
+                 subresource_latency=0.02, asset_bytes=5000, host='127.0.0.1', port=0, seed=1, files=None):
+        self.latency = latency
+        self.body_bytes = body_bytes
+        self.subresources = subresources
+        self.error_rate = error_rate
+        self.subresource_latency = subresource_latency
+        self.asset_bytes = asset_bytes
+        self.files = files or {}
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+        self.counts_lock = threading.Lock()
+        self.counts = {'pages': 0, 'assets': 0, 'errors': 0}
+
+        # The default listen backlog of 5 drops connections from concurrent backends, which then retry after a second
+        self.server = ThreadingHTTPServer((host, port), StandInRequestHandler, bind_and_activate=False)
+        self.server.request_queue_size = 128
+        self.server.server_bind()
+        self.server.server_activate()
+        self.server.daemon_threads = True
+        self.server.stand_in = self
+        self.thread = None
+
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='stand-in-server', daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def count(self, key):
+        with self.counts_lock:
+            self.counts[key] += 1
+
+
+    def should_fail(self):
+        if self.error_rate <= 0:
+            return False
+        with self.random_lock:
+            return self.random.random() < self.error_rate
+
+
+    # Render-blocking stylesheets and scripts in the head, images in the body, padded to body_bytes
+    def render_page(self, name):
+        head = []
+        body = []
+        for index in range(self.subresources):
+            kind = ('css', 'js', 'png')[index % 3]
+            if kind == 'css':
+                head.append(f'<link rel="stylesheet" href="/assets/{name}-{index}.css">')
+            elif kind == 'js':
+                head.append(f'<script src="/assets/{name}-{index}.js"></script>')
+            else:
+                body.append(f'<img src="/assets/{name}-{index}.png" alt="">')
+
+        html = f'<!DOCTYPE html><html><head><title>{name}</title>{"".join(head)}</head><body>{"".join(body)}'
+        padding = max(self.body_bytes - len(html) - len('<p></p></body></html>'), 0)
+        return f'{html}<p>{"x" * padding}</p></body></html>'.encode('utf-8')
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, as real sites would, so connection reuse shows up in the numbers. Headers and body go
+    # out in separate writes, so Nagle's algorithm must be off or each reused connection stalls ~40ms on a delayed ACK
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        path = self.path.split('?')[0]
+
+        if path in stand_in.files:
+            content_type, body = stand_in.files[path]
+            self.send_body(200, content_type, body)
+            return
+
+        if path.startswith('/assets/'):
+            time.sleep(stand_in.subresource_latency)
+            stand_in.count('assets')
+            content_type = {
+                'css': 'text/css', 'js': 'application/javascript', 'png': 'image/png'
+            }.get(path.rsplit('.', 1)[-1], 'application/octet-stream')
+            if content_type == 'image/png':
+                body = b'\0' * stand_in.asset_bytes
+            else:
+                body = b'/*' + b'x' * max(stand_in.asset_bytes - 4, 0) + b'*/'
+            self.send_body(200, content_type, body)
+            return
+
+        time.sleep(stand_in.latency)
+        stand_in.count('pages')
+        if stand_in.should_fail():
+            stand_in.count('errors')
+            self.send_body(500, 'text/plain', b'Injected error')
+            return
+
+        self.send_body(200, 'text/html; charset=utf-8', stand_in.render_page(path.strip('/').replace('/', '-') or 'home'))
+
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,99 @@
+import socket
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+# Phase timings for the request currently running on this thread
+_phase_timings = threading.local()
+
+
+def current_timings():
+    if not hasattr(_phase_timings, 'value'):
+        _phase_timings.value = {'dns': 0.0, 'connect': 0.0, 'tls': 0.0}
+    return _phase_timings.value
+
+
+class TimedHTTPConnection(HTTPConnection):
+    # Resolve the host ourselves so DNS and TCP connect can be timed separately,
+    # then let urllib3 connect to each resolved address in turn
+    def _new_conn(self):
+        timings = current_timings()
+        start = time.perf_counter()
+
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror:
+            # Let urllib3 raise its usual resolution error
+            return super()._new_conn()
+
+        resolved = time.perf_counter()
+        timings['dns'] += resolved - start
+
+        dns_host = self._dns_host
+        sock = None
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address[4][0]
+                try:
+                    sock = super()._new_conn()
+                    break
+                except NewConnectionError as e:
+                    error = e
+        finally:
+            self._dns_host = dns_host
+
+        timings['connect'] += time.perf_counter() - resolved
+
+        if sock is None:
+            raise error
+        return sock
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    # Everything connect() spends beyond DNS and TCP connect is the TLS handshake
+    def connect(self):
+        timings = current_timings()
+        before = timings['dns'] + timings['connect']
+        start = time.perf_counter()
+
+        super().connect()
+
+        elapsed = time.perf_counter() - start
+        timings['tls'] += max(elapsed - (timings['dns'] + timings['connect'] - before), 0.0)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool
+        }
+
+
+    # Clear the phase timings for this thread before starting a request
+    @staticmethod
+    def reset_timings():
+        _phase_timings.value = {'dns': 0.0, 'connect': 0.0, 'tls': 0.0}
+        return _phase_timings.value
+
+
+    # DNS, TCP connect and TLS seconds spent by this thread since the last reset.
+    # All three are zero when the request reused a keep-alive connection.
+    @staticmethod
+    def get_timings():
+        return dict(current_timings())
@@ -1,15 +1,7 @@
 import json
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
 import os
 import sys
 import argparse
-from datetime import datetime
-from dotenv import load_dotenv
 
 # Check if the script is run as root (on Unix-based systems)
 if os.geteuid() == 0:
@@ -18,8 +10,12 @@ if os.geteuid() == 0:
 
 # Get the parent folder where the script is run
 script_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(script_root, 'classes'))
+
+from MeasurementBackends import MeasurementBackends
 
 # Load environment variables from .env file at the project root
+# from dotenv import load_dotenv
 # env_path = os.path.join(script_root, '.env')
 # load_dotenv(dotenv_path=env_path)
 
@@ -36,127 +32,44 @@ with open(config_path, 'r') as file:
 # config['sites']['production']['authentication']['password'] = production_password
 # config['sites']['staging']['authentication']['password'] = staging_password
 
-options = Options()
-options.add_argument('--headless')
-options.add_argument("--window-size=1920,1080")
-
-# Function to get performance metrics
-def get_performance_metrics(driver):
-    metrics_js = """
-        const timing = window.performance.timing;
-        const paint = window.performance.getEntriesByType('paint');
-        const resources = window.performance.getEntriesByType('resource');
-
-        let numberOfRequests = resources.length;
-        let totalSize = 0;
-        for (let resource of resources) {
-            totalSize += resource.transferSize;
-        }
-
-        return {
-            'loadTime': (timing.loadEventEnd - timing.navigationStart) / 1000,
-            'firstPaint': (paint.length > 0 ? paint[0].startTime : 0) / 1000,
-            'domContentLoaded': (timing.domContentLoadedEventEnd - timing.navigationStart) / 1000,
-            'numberRequests': numberOfRequests,
-            'pageWeightBytes': totalSize
-        };
-    """
-    return driver.execute_script(metrics_js)
-
 # Create argument parser
 parser = argparse.ArgumentParser()
 parser.add_argument('--note', help='Specify a note for the test')
+parser.add_argument('--daemon', action='store_true', help='Keep running and measure pages on their configured intervals')
+parser.add_argument('--scan', action='store_true', help='Run one speed check sweep of every site with the PerformanceScanner')
+parser.add_argument('--method', choices=MeasurementBackends.names(), help='Measurement method (defaults to speed_check_method)')
+parser.add_argument('--coordinator', action='store_true', help='Split the sweep into jobs and lease them to workers')
+parser.add_argument('--worker', metavar='URL', help='Measure jobs leased from the coordinator at URL')
+parser.add_argument('--calibrate', action='store_true', help='Measure the harness overhead for the measurement method against a blank local page')
+parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_ID', help='Carry on with an unfinished sweep (the latest by default), measuring only the pages it is missing')
+parser.add_argument('--import-profile', action='store_true', help='Report where start-up time goes for the measurement method')
 args = parser.parse_args()
 
-# Set the filename based on the note
-if args.note:
-    note = args.note
-    csv_file = f'{script_root}/data/selenium_automated_tests.csv'
-else:
-    # Prompt for a note if not passed as an argument
-    note = input("Enter a note: ") or "Manual Test"
-    csv_file = f'{script_root}/data/selenium_manual_tests.csv'
-
-# Iterate over each site in the config
-for site_key, site in config['sites'].items():
-    if not site['enabled']:
-        continue
-    
-    driver = webdriver.Chrome(options=options)
-    print(f"\nSpeed Checking Site: {site['url']}\n")
-
-    # Perform authentication if credentials are available
-    if 'authentication' in site:
-        print('Authenticating...')
-        driver.get(site['url'])
-        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, "email")))
-        username_field = driver.find_element(By.ID, "email")
-        password_field = driver.find_element(By.ID, "password")
-        username_field.send_keys(site['authentication']['username'])
-        password_field.send_keys(site['authentication']['password'])
-        login_button = driver.find_element(By.XPATH, "//button[@type='submit']")
-        login_button.click()
-        WebDriverWait(driver, 20).until(EC.url_changes(site['url']))
-
-    # Save the load time to a CSV file
-    write_header = not os.path.exists(csv_file)
-
-    with open(csv_file, 'a') as file:
-        if write_header:
-            headers = [
-                'Timestamp',
-                'Site URL',
-                'Page Name',
-                'Page URL',
-                'Load Time',
-                'First Paint',
-                'DOM Content Loaded',
-                'Number Requests',
-                'Page Weight Bytes',
-                'Measurement Method',
-                'Note'
-            ]
-            file.write(','.join(headers) + '\n')
-
-        # Iterate over each page in the config
-        for page in config['pages']:
-            site_url = site['url']
-            page_url = page['url']
-            full_url = site_url + page_url
-            page_name = page['name']
-            start_time = time.time()
-
-            driver.get(full_url)
-            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-
-            metrics = get_performance_metrics(driver)
-            metrics['loadTime'] = round(time.time() - start_time, 2)
-            metrics['firstPaint'] = round(metrics['firstPaint'], 2)
-            metrics['domContentLoaded'] = round(metrics['domContentLoaded'], 2)
-            metrics['pageWeightBytes'] = round(metrics['pageWeightBytes'] / 1000000, 2)
-
-            load_time = metrics['loadTime']
-            target_load_time = config['target_load_time']
-
-            if load_time > target_load_time:
-                print(f'\033[91m{page["name"]} Page - Load Time: {load_time:.2f} seconds (SLOW)\033[0m')
-            else:
-                print(f'\033[92m{page["name"]} Page - Load Time: {load_time:.2f} seconds (OK)\033[0m')
-
-            row = [
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                site_url,
-                page_name,
-                full_url,
-                metrics.get('loadTime', ''),
-                metrics.get('firstPaint', ''),
-                metrics.get('domContentLoaded', ''),
-                metrics.get('numberRequests', ''),
-                metrics.get('pageWeightBytes', ''),
-                "Selenium",
-                note
-            ]
-            file.write(','.join(map(str, row)) + '\n')
-            file.flush()
-
-    driver.quit()
+# Backends are only imported once one is chosen, so this is all a requests run pays for at start-up
+if args.import_profile:
+    from ImportProfile import ImportProfile
+    profile = ImportProfile(os.path.join(script_root, 'classes'), args.method or config.get('speed_check_method', 'selenium'))
+    profile.run()
+    profile.report()
+    sys.exit(0)
+
+# With no options, main.py runs a Selenium sweep that also writes its rows to data/selenium_*_tests.csv,
+# the layout it has always written; every other option picks what the PerformanceScanner does
+legacy_csv = None
+measurement_method = args.method
+if not (args.daemon or args.scan or args.method or args.coordinator or args.worker or args.calibrate or args.resume):
+    measurement_method = 'selenium'
+    if args.note:
+        legacy_csv = f'{script_root}/data/selenium_automated_tests.csv'
+    else:
+        # Prompt for a note if not passed as an argument
+        args.note = input("Enter a note: ") or "Manual Test"
+        legacy_csv = f'{script_root}/data/selenium_manual_tests.csv'
+
+# Daemon mode keeps sessions and browsers warm between cycles instead of restarting every run
+from PerformanceScanner import PerformanceScanner
+PerformanceScanner(
+    script_root, args.note or ('Daemon' if args.daemon else 'Manual Test'), daemon=args.daemon,
+    measurement_method=measurement_method, coordinator=args.coordinator, worker_url=args.worker, calibrate=args.calibrate,
+    resume=args.resume, legacy_csv=legacy_csv
+)
@@ -0,0 +1,55 @@
+'''
+Backfill Change Detection
+
+- This script replays the history in the results store through the change detector, so regressions and
+  variance increases that happened before detection was switched on are listed in the events file.
+- It leaves the detector state at the end of the history, so the next scan carries on from there.
+- It needs NumPy (installed with pandas). Use --reset to start the state and events files afresh.
+'''
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root / 'classes'))
+
+from ChangeDetector import ChangeDetector
+from ResultsStore import ResultsStore
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--site', help='Only backfill this site URL')
+parser.add_argument('--reset', action='store_true', help='Clear the saved detector state and events first')
+args = parser.parse_args()
+
+# Use the same store and detector settings as the scanner
+with open(project_root / 'config.json', 'r') as file:
+    config = json.load(file)
+store_path = project_root / config.get('results_store', {}).get('path', 'data/results.sqlite')
+detection_config = config.get('change_detection', {})
+state_path = project_root / detection_config.get('state_path', 'data/change_state.json')
+events_path = project_root / detection_config.get('events_path', 'data/change_events.jsonl')
+
+if args.reset:
+    for path in (state_path, events_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+store = ResultsStore(str(store_path))
+sql = 'SELECT * FROM results'
+params = []
+if args.site:
+    sql += ' WHERE site = ?'
+    params.append(args.site)
+rows = store.query(sql + ' ORDER BY site, page_name, timestamp', params)
+store.close()
+
+detector = ChangeDetector(detection_config, str(state_path), str(events_path))
+events = detector.backfill(rows)
+detector.save_state()
+
+for event in events:
+    print(f'{event["timestamp"]}  {ChangeDetector.describe(event)}')
+print(f'\n{len(events)} changes found in {len(rows)} rows; events appended to {os.path.relpath(events_path, project_root)}')
@@ -0,0 +1,116 @@
+'''
+Baselines
+
+- This script saves named baseline snapshots in the results store and compares later results against them.
+  A snapshot holds per-page summary statistics of a run or a time window, so "before deploy" and
+  "after deploy" can be compared on demand however many samples were taken.
+- create NAME snapshots the latest run (or --run RUN_ID, or --start/--end), optionally for one --site.
+- compare NAME compares the latest run (or --against another snapshot, --run or --start/--end) with it,
+  using Welch's t-test on each page's mean.
+- list and delete NAME manage the saved snapshots.
+- Usage: python3 scripts/python/baselines.py create before-deploy --site https://example.com
+         python3 scripts/python/baselines.py compare before-deploy --site https://example.com
+'''
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root / 'classes'))
+
+from BaselineStore import BaselineStore
+from ResultsStore import ResultsStore
+
+parser = argparse.ArgumentParser()
+parser.add_argument('action', choices=['create', 'compare', 'list', 'delete'])
+parser.add_argument('name', nargs='?', help='Name of the baseline')
+parser.add_argument('--site', help='Only this site URL')
+parser.add_argument('--run', help='A run ID (the Timestamp column of speed_check.csv); defaults to the latest run')
+parser.add_argument('--start', type=datetime.fromisoformat, help='Start of a time window, e.g. 2024-06-01 or 2024-06-01T09:00')
+parser.add_argument('--end', type=datetime.fromisoformat, help='End of a time window (exclusive); defaults to now')
+parser.add_argument('--against', help='compare: another baseline to compare with, instead of the latest run')
+parser.add_argument('--metric', default='loadTime', help='compare: metric key to show, or "all"')
+parser.add_argument('--description', default='', help='create: a note stored with the baseline')
+parser.add_argument('--replace', action='store_true', help='create: overwrite an existing baseline')
+args = parser.parse_args()
+
+if args.action != 'list' and not args.name:
+    parser.error(f'{args.action} needs a baseline name')
+
+# Use the same store path and baseline settings as the scanner
+with open(project_root / 'config.json', 'r') as file:
+    config = json.load(file)
+store_path = project_root / config.get('results_store', {}).get('path', 'data/results.sqlite')
+
+store = ResultsStore(str(store_path))
+baselines = BaselineStore(store, config.get('baselines', {}))
+
+# A time window if one was given, otherwise the run asked for (or the latest)
+window = args.start is not None or args.end is not None
+run_id = None if window else (args.run or 'latest')
+
+if args.action == 'list':
+    for baseline in baselines.list():
+        created = datetime.fromtimestamp(baseline['created_at']).strftime('%Y-%m-%d %H:%M')
+        print(f'{created}  {BaselineStore.describe(baseline)}')
+
+elif args.action == 'delete':
+    if not baselines.delete(args.name):
+        print(f'There is no baseline called {args.name}')
+        sys.exit(1)
+    print(f'Deleted baseline {args.name}')
+
+elif args.action == 'create':
+    try:
+        series = baselines.create(args.name, args.site, run_id, args.start, args.end, args.description, args.replace)
+    except ValueError as error:
+        print(error)
+        sys.exit(1)
+    print(f'Saved {BaselineStore.describe(baselines.get(args.name))} ({series} series)')
+
+else:
+    baseline = baselines.get(args.name)
+    if baseline is None:
+        print(f'There is no baseline called {args.name}')
+        sys.exit(1)
+
+    if args.against:
+        if baselines.get(args.against) is None:
+            print(f'There is no baseline called {args.against}')
+            sys.exit(1)
+        current = baselines.snapshot(args.against, args.site)
+        label = args.against
+    else:
+        if run_id == 'latest':
+            run_id = baselines.latest_run_id(args.site)
+        current, rows = baselines.summarise(args.site, run_id, args.start, args.end)
+        label = f'run {run_id}' if run_id else 'the window'
+
+    print(f'Baseline {BaselineStore.describe(baseline)}')
+    print(f'Compared with {label}\n')
+
+    column = {key: name for name, _, key, _ in ResultsStore.COLUMNS}.get(args.metric, args.metric)
+    comparisons = [
+        comparison for comparison in baselines.compare(baselines.snapshot(args.name, args.site), current)
+        if args.metric == 'all' or comparison['metric'] == column
+    ]
+    if not comparisons:
+        print('No pages in common with the baseline')
+        sys.exit(1)
+
+    print(f'{"Page":<30} {"Method":<15} {"Metric":<20} {"Before":>9} {"After":>9} {"Change":>8} {"p":>8}  Verdict')
+    for comparison in comparisons:
+        before, after = comparison['baseline'], comparison['current']
+        change = f'{comparison["change_percent"]:+.1f}%' if comparison['change_percent'] is not None else ''
+        p_value = f'{comparison["p_value"]:.3f}' if comparison['p_value'] is not None else 'n/a'
+        print(f'{comparison["page_name"][:30]:<30} {comparison["measurement_method"][:15]:<15} {comparison["metric"]:<20} '
+              f'{before["mean"]:>9.3f} {after["mean"]:>9.3f} {change:>8} {p_value:>8}  {comparison["verdict"]}')
+
+    slower = sum(1 for comparison in comparisons if comparison['verdict'] == 'slower')
+    faster = sum(1 for comparison in comparisons if comparison['verdict'] == 'faster')
+    print(f'\n{slower} slower and {faster} faster at p < {baselines.alpha}, out of {len(comparisons)} compared')
+
+store.close()
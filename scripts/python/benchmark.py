@@ -0,0 +1,213 @@
+'''
+Scanner Benchmark
+
+- This script starts a local stand-in web server with a known latency, page size, subresource count and error rate.
+- It runs a full scanner sweep against it for each backend (requests, async_requests, emulated and selenium),
+  each in its own process, using the backend settings from config.json.
+- It reports throughput (pages/sec), how far the measured load times sit above the injected latency
+  (the scanner's measurement overhead) and the peak RSS of each run.
+- Results are saved to data/benchmarks/benchmark-<date>.json and compared with the previous run using the same settings,
+  so a change that makes the scanner slower or heavier shows up straight away.
+'''
+
+import argparse
+import contextlib
+import glob
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root / 'classes'))
+
+# Browsers open at most six connections per host, so page loads fetch subresources in waves of six
+BROWSER_HOST_LIMIT = 6
+PAGE_LOAD_BACKENDS = ('emulated', 'selenium')
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--backends', default='requests,async_requests,emulated,selenium', help='Comma separated backends to run')
+parser.add_argument('--pages', type=int, default=50, help='Pages per sweep')
+parser.add_argument('--latency', type=float, default=0.1, help='Seconds each page waits before responding')
+parser.add_argument('--subresource-latency', type=float, default=0.02, help='Seconds each subresource waits')
+parser.add_argument('--body-kb', type=float, default=50, help='Page size in kilobytes')
+parser.add_argument('--subresources', type=int, default=10, help='Stylesheets, scripts and images per page')
+parser.add_argument('--error-rate', type=float, default=0.0, help='Share of page requests that fail with a 500')
+parser.add_argument('--output', default=str(project_root / 'data' / 'benchmarks'), help='Folder for the JSON results')
+parser.add_argument('--child', help=argparse.SUPPRESS)
+parser.add_argument('--root', help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+
+# Runs in a child process so every backend starts cold and its peak RSS is its own
+def run_child(backend, root):
+    from PerformanceScanner import PerformanceScanner
+    from ResultsStore import ResultsStore
+
+    os.chdir(root)
+    start_time = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        PerformanceScanner(root, 'Benchmark', measurement_method=backend)
+    elapsed = time.perf_counter() - start_time
+
+    store = ResultsStore(os.path.join(root, 'data', 'results.sqlite'))
+    rows = [dict(row) for row in store.query('SELECT load_time, status_code FROM results')]
+    store.close()
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if platform.system() == 'Darwin' else 1024
+    print(json.dumps({
+        'elapsed': elapsed,
+        'rows': rows,
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'peak_child_rss_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    }))
+
+
+# A throwaway project root whose config.json points every page at the stand-in server
+def create_root(backend, server_url):
+    with open(project_root / 'config.json', 'r') as file:
+        config = json.load(file)
+
+    config['sites'] = {'benchmark': {'enabled': True, 'url': server_url}}
+    config['pages'] = [{'name': f'Page {index}', 'url': f'/page/{index}/'} for index in range(args.pages)]
+    config['speed_check_method'] = backend
+    config['target_load_time'] = 60
+    config['results_store'] = {'enabled': True, 'path': 'data/results.sqlite'}
+    config['session_cache'] = {'enabled': False}
+    config['sampling'] = {'enabled': False}
+    config['selenium'] = dict(config.get('selenium', {}), headless=True, profile='desktop')
+
+    root = tempfile.mkdtemp(prefix=f'benchmark-{backend}-')
+    with open(os.path.join(root, 'config.json'), 'w') as file:
+        json.dump(config, file, indent=4)
+    return root
+
+
+# What a perfect measurement would report: the injected document latency, plus one wave of
+# subresource latency per six subresources for the backends that load the whole page
+def ground_truth(backend):
+    if backend in PAGE_LOAD_BACKENDS:
+        return args.latency + args.subresource_latency * math.ceil(args.subresources / BROWSER_HOST_LIMIT)
+    return args.latency
+
+
+def summarise(backend, child):
+    load_times = [row['load_time'] for row in child['rows'] if row['load_time'] is not None and row['status_code'] == 200]
+    overheads = sorted(load_time - ground_truth(backend) for load_time in load_times)
+    if not overheads:
+        # Usually a missing browser or driver; the scanner logs the reason in its own log file
+        return {'error': f'No successful measurements out of {len(child["rows"])} pages'}
+
+    return {
+        'pages': len(child['rows']),
+        'elapsed_seconds': round(child['elapsed'], 3),
+        'pages_per_second': round(len(child['rows']) / child['elapsed'], 3) if child['elapsed'] else None,
+        'ground_truth_seconds': round(ground_truth(backend), 4),
+        'median_overhead_ms': round(statistics.median(overheads) * 1000, 1),
+        'p95_overhead_ms': round(overheads[int(0.95 * (len(overheads) - 1))] * 1000, 1),
+        'errors': sum(1 for row in child['rows'] if row['status_code'] != 200),
+        'peak_rss_mb': round(child['peak_rss_bytes'] / 1048576, 1),
+        'peak_child_rss_mb': round(child['peak_child_rss_bytes'] / 1048576, 1)
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# The most recent earlier result with the same stand-in settings, to compare against
+def load_previous(output_folder, settings):
+    for path in sorted(glob.glob(os.path.join(output_folder, 'benchmark-*.json')), reverse=True):
+        with open(path, 'r') as file:
+            previous = json.load(file)
+        if previous.get('settings') == settings:
+            return previous
+    return None
+
+
+def print_results(results, previous):
+    print(f'\n{"Backend":<16}{"Pages/s":>10}{"Overhead (ms)":>15}{"p95 (ms)":>10}{"Errors":>8}{"Peak RSS (MB)":>15}')
+    for backend, result in results.items():
+        if 'error' in result:
+            print(f'{backend:<16}failed: {result["error"]}')
+            continue
+
+        line = (f'{backend:<16}{result["pages_per_second"]:>10}{result["median_overhead_ms"]:>15}'
+                f'{result["p95_overhead_ms"]:>10}{result["errors"]:>8}{result["peak_rss_mb"]:>15}')
+
+        before = (previous or {}).get('results', {}).get(backend, {})
+        if before.get('pages_per_second'):
+            change = (result['pages_per_second'] - before['pages_per_second']) / before['pages_per_second'] * 100
+            line += f'   throughput {change:+.1f}% vs {previous.get("commit") or previous["timestamp"]}'
+        print(line)
+
+
+if args.child:
+    run_child(args.child, args.root)
+    sys.exit(0)
+
+from StandInServer import StandInServer
+
+settings = {
+    'pages': args.pages,
+    'latency': args.latency,
+    'subresource_latency': args.subresource_latency,
+    'body_kb': args.body_kb,
+    'subresources': args.subresources,
+    'error_rate': args.error_rate
+}
+server = StandInServer(
+    latency=args.latency, body_bytes=int(args.body_kb * 1024), subresources=args.subresources,
+    error_rate=args.error_rate, subresource_latency=args.subresource_latency
+).start()
+print(f'Stand-in server at {server.url}: {settings}')
+
+results = {}
+try:
+    for backend in [name.strip() for name in args.backends.split(',') if name.strip()]:
+        print(f'Benchmarking {backend}...')
+        root = create_root(backend, server.url)
+        try:
+            child = subprocess.run(
+                [sys.executable, __file__, '--child', backend, '--root', root], capture_output=True, text=True
+            )
+            if child.returncode != 0:
+                results[backend] = {'error': (child.stderr.strip().splitlines() or ['unknown error'])[-1]}
+            else:
+                results[backend] = summarise(backend, json.loads(child.stdout.strip().splitlines()[-1]))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+finally:
+    server.stop()
+
+os.makedirs(args.output, exist_ok=True)
+previous = load_previous(args.output, settings)
+report = {
+    'timestamp': datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+    'commit': get_commit(),
+    'python': platform.python_version(),
+    'settings': settings,
+    'results': results
+}
+
+output_path = os.path.join(args.output, f'benchmark-{report["timestamp"]}.json')
+with open(output_path, 'w') as file:
+    json.dump(report, file, indent=4)
+
+print_results(results, previous)
+print(f'\nSaved {output_path}')
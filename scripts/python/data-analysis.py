@@ -5,20 +5,44 @@ Author: Ben Lacey
 Date: Jun 2024
 
 This script performs the following:
-- Loads and processes data from a CSV file.
-- Aggregates performance data daily for each site.
-- Compares the latest performance data with the baseline.
-- Visualizes the changes in load times and daily trends.
-- Saves the visualizations to the charts directory.
-- Saves aggregated changes to a CSV file.
-- Prints a preview of both comparison and daily aggregated dataframes.
+- Reads the rows added to the speed_check.csv and selenium_*_tests.csv files since the last run, and folds
+  them into the aggregates kept in data/analysis_checkpoint.json (see classes/AnalysisCheckpoint.py).
+- Aggregates performance data daily for each site and page.
+- Compares the latest day's load times with the baseline (the rows noted 'Baseline', or a snapshot saved
+  with baselines.py and named with --baseline), with Welch's t-test for each page.
+- Saves the aggregates to data/<site>/analysis and draws the charts in data/<site>/charts in a pool of
+  worker processes (see classes/ChartRenderer.py). Only sites that received new rows are looked at, and
+  only the charts whose data changed are redrawn.
+- It runs without prompting, so it can be scheduled. Use --file to analyse particular files and --full to
+  rebuild the checkpoint and every chart from scratch.
 """
 
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
+import glob
+import json
 import os
+import sqlite3
+import sys
+import time
 from pathlib import Path
-from datetime import datetime
+
+import pandas as pd
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root / 'classes'))
+
+from AnalysisCheckpoint import AnalysisCheckpoint
+from BaselineStore import BaselineStore
+from ChartRenderer import ChartRenderer
+from HistoryLoader import HistoryLoader
+from ResultsStore import ResultsStore
+
+data_directory_path = project_root / 'data'
+
+SITE_CHARTS = [
+    'daily_load/daily_load_time.jpg', 'boxplot_load_times.jpg', 'histogram_load_times.jpg',
+    'scatter_requests_vs_load_time.jpg', 'line_requests_over_time.jpg', 'heatmap_load_times.jpg',
+]
 
 # Function to create directory if it doesn't exist
 def create_directory(path):
@@ -26,273 +50,299 @@ def create_directory(path):
         os.makedirs(path)
         print(f"Created directory: {path}")
 
-# Get the project root directory
-project_root = Path(__file__).resolve().parents[2]  # Adjust as necessary
-data_directory_path = project_root / 'data'
 
-# Prompt the user for the CSV file to analyze
-csv_file_name = input("Enter the filename of the CSV file to analyze (within data/): ")
-csv_file_path = data_directory_path / csv_file_name
-
-# Check if the file exists
-if not csv_file_path.exists():
-    print(f"Error: The file {csv_file_path} does not exist.")
-    exit(1)
-
-# Load the CSV data
-df = pd.read_csv(csv_file_path)
-
-# Display target page load time config
-target_load_time = df['Target Load Time'].iloc[0] if 'Target Load Time' in df.columns else None
-if target_load_time:
-    print(f"Target Page Load Time: {target_load_time} seconds")
-
-# List the pages and show the page level config options
-print("\nPages and Config Options:\n")
-pages = df['Page Name'].unique()
-for page in pages:
-    page_config = df[df['Page Name'] == page].iloc[0]
-    print(f"Page: {page}")
-    print(f"  URL: {page_config['Page URL']}")
-    if 'Config Options' in page_config:
-        print(f"  Config Options: {page_config['Config Options']}")
-    print("")
-
-# Convert Timestamp to datetime and extract the date
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-df['Date'] = df['Timestamp'].dt.date
-
-# Create necessary directories based on the site URL
-site_keys = df['Site URL'].unique()
-for site in site_keys:
-    site_key = site.replace('https://', '').replace('/', '_')
-    site_analysis_directory_path = data_directory_path / site_key / 'analysis'
-    create_directory(site_analysis_directory_path)
-
-    charts_directory_path = data_directory_path / site_key / 'charts'
-    create_directory(charts_directory_path)
-    
-    load_time_change_directory_path = charts_directory_path / 'load_time_change'
-    create_directory(load_time_change_directory_path)
-    
-    daily_load_directory_path = charts_directory_path / 'daily_load'
-    create_directory(daily_load_directory_path)
-    
-    page_breakdown_directory_path = charts_directory_path / 'page_breakdown'
-    create_directory(page_breakdown_directory_path)
-
-# Aggregate data by Site URL and Date
-daily_aggregate = df.groupby(['Site URL', 'Date']).agg(
-    Min_Load_Time=pd.NamedAgg(column='Load Time', aggfunc='min'),
-    Max_Load_Time=pd.NamedAgg(column='Load Time', aggfunc='max'),
-    Avg_Load_Time=pd.NamedAgg(column='Load Time', aggfunc='mean'),
-    Std_Load_Time=pd.NamedAgg(column='Load Time', aggfunc='std')
-).reset_index()
-
-# Filter out the baseline and the latest data
-baseline_df = df[df['Note'] == 'Baseline']
-latest_df = df[df['Date'] == df['Date'].max()]
-
-# Merge the two datasets for comparison
-comparison_df = pd.merge(baseline_df, latest_df, on=['Site URL', 'Page Name'], suffixes=('_baseline', '_latest'))
-comparison_df['Load Time Change'] = comparison_df['Load Time_latest'] - comparison_df['Load Time_baseline']
-
-# Aggregate changes by Site URL
-aggregate_changes = comparison_df.groupby('Site URL')['Load Time Change'].agg(['mean', 'min', 'max', 'std']).reset_index()
-
-# Visualize Load Time Changes For All Sites
-for site in aggregate_changes['Site URL'].unique():
-    site_data = comparison_df[comparison_df['Site URL'] == site]
-    plt.figure(figsize=(10, 6))
-    plt.bar(site_data['Page Name'], site_data['Load Time Change'], color='skyblue')
-    plt.xlabel('Page Name')
-    plt.ylabel('Load Time Change (seconds)')
-    plt.title(f'Load Time Change for {site}')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    
-    site_key = site.replace('https://', '').replace('/', '_')
-    chart_name = "load_time_change.jpg"
-    plt.savefig(load_time_change_directory_path / chart_name)
-    plt.close()
-    print(f"Saved load time change chart for {site}.")
-
-# Visualize Daily Aggregates For All Sites
-for site in daily_aggregate['Site URL'].unique():
-    site_data = daily_aggregate[daily_aggregate['Site URL'] == site]
-    
-    plt.figure(figsize=(12, 6))
-    plt.plot(site_data['Date'], site_data['Avg_Load_Time'], marker='o', label='Average Load Time')
-    plt.fill_between(site_data['Date'], site_data['Min_Load_Time'], site_data['Max_Load_Time'], alpha=0.1)
-    plt.xlabel('Date')
-    plt.ylabel('Load Time (seconds)')
-    plt.title(f'Daily Load Time for {site}')
-    plt.xticks(rotation=45)
-    plt.legend()
-    plt.tight_layout()
-    
-    site_key = site.replace('https://', '').replace('/', '_')
-    chart_name = "daily_load_time.jpg"
-    plt.savefig(daily_load_directory_path / chart_name)
-    plt.close()
-    print(f"Saved daily load time chart for {site}.")
-
-# Create a page breakdown over time
-for site in df['Site URL'].unique():
-    site_data = df[df['Site URL'] == site]
-    
-    for page in site_data['Page Name'].unique():
-        page_data = site_data[site_data['Page Name'] == page]
-        
-        plt.figure(figsize=(12, 6))
-        plt.plot(page_data['Date'], page_data['Load Time'], marker='o', label='Load Time')
-        plt.xlabel('Date')
-        plt.ylabel('Load Time (seconds)')
-        plt.title(f'Load Time Over Time for {site} - {page}')
-        plt.xticks(rotation=45)
-        plt.legend()
-        plt.tight_layout()
-        
-        site_key = site.replace('https://', '').replace('/', '_')
-        chart_name = f"{page.replace('/', '_')}_page_breakdown.jpg"
-        plt.savefig(page_breakdown_directory_path / chart_name)
-        plt.close()
-        print(f"Saved page breakdown chart for {site} - {page}.")
-
-# Additional analysis and charts
-# 1. Boxplot of Load Times
-for site in df['Site URL'].unique():
-    site_data = df[df['Site URL'] == site]
-    plt.figure(figsize=(10, 6))
-    site_data.boxplot(column='Load Time', by='Page Name')
-    plt.title(f'Boxplot of Load Times for {site}')
-    plt.suptitle('')
-    plt.xlabel('Page Name')
-    plt.ylabel('Load Time (seconds)')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    
-    site_key = site.replace('https://', '').replace('/', '_')
-    chart_name = "boxplot_load_times.jpg"
-    plt.savefig(charts_directory_path / chart_name)
-    plt.close()
-    print(f"Saved boxplot of load times for {site}.")
-
-# 2. Histogram of Load Times
-for site in df['Site URL'].unique():
-    site_data = df[df['Site URL'] == site]
-    plt.figure(figsize=(10, 6))
-    site_data['Load Time'].hist(bins=20)
-    plt.title(f'Histogram of Load Times for {site}')
-    plt.xlabel('Load Time (seconds)')
-    plt.ylabel('Frequency')
-    plt.tight_layout()
-    
-    site_key = site.replace('https://', '').replace('/', '_')
-    chart_name = "histogram_load_times.jpg"
-    plt.savefig(charts_directory_path / chart_name)
-    plt.close()
-    print(f"Saved histogram of load times for {site}.")
-
-# 3. Scatter Plot of Load Time vs Number of Requests
-for site in df['Site URL'].unique():
-    site_data = df[df['Site URL'] == site]
-    plt.figure(figsize=(10, 6))
-    plt.scatter(site_data['Number Requests'], site_data['Load Time'])
-    plt.title(f'Scatter Plot of Load Time vs Number of Requests for {site}')
-    plt.xlabel('Number of Requests')
-    plt.ylabel('Load Time (seconds)')
-    plt.tight_layout()
-    
-    site_key = site.replace('https://', '').replace('/', '_')
-    chart_name = "scatter_requests_vs_load_time.jpg"
-    plt.savefig(charts_directory_path / chart_name)
-    plt.close()
-    print(f"Saved scatter plot of load time vs number of requests for {site}.")
-
-# 4. Line Plot of Number of Requests Over Time
-for site in df['Site URL'].unique():
-    site_data = df[df['Site URL'] == site]
-    plt.figure(figsize=(12, 6))
-    plt.plot(site_data['Date'], site_data['Number Requests'], marker='o')
-    plt.title(f'Number of Requests Over Time for {site}')
-    plt.xlabel('Date')
-    plt.ylabel('Number of Requests')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    
-    site_key = site.replace('https://', '').replace('/', '_')
-    chart_name = "line_requests_over_time.jpg"
-    plt.savefig(charts_directory_path / chart_name)
-    plt.close()
-    print(f"Saved line plot of number of requests over time for {site}.")
-
-# 5. Heatmap of Load Times by Page and Date
-for site in df['Site URL'].unique():
-    site_data = df[df['Site URL'] == site]
-    pivot_table = site_data.pivot("Date", "Page Name", "Load Time")
-    plt.figure(figsize=(12, 6))
-    sns.heatmap(pivot_table, annot=True, fmt=".1f", cmap="YlGnBu")
-    plt.title(f'Heatmap of Load Times for {site}')
-    plt.xlabel('Page Name')
-    plt.ylabel('Date')
-    plt.tight_layout()
-    
-    site_key = site.replace('https://', '').replace('/', '_')
-    chart_name = "heatmap_load_times.jpg"
-    plt.savefig(charts_directory_path / chart_name)
-    plt.close()
-    print(f"Saved heatmap of load times for {site}.")
-
-# Save aggregated changes to a CSV file
-for site in aggregate_changes['Site URL'].unique():
-    site_key = site.replace('https://', '').replace('/', '_')
-    aggregate_changes_path = data_directory_path / site_key / 'analysis' / 'aggregate_changes.csv'
-    site_aggregate_changes = aggregate_changes[aggregate_changes['Site URL'] == site]
-    site_aggregate_changes.to_csv(aggregate_changes_path, index=False)
-    print(f"Saved aggregate changes to {aggregate_changes_path}.")
-
-# Save comparison dataframe to CSV
-for site in comparison_df['Site URL'].unique():
-    site_key = site.replace('https://', '').replace('/', '_')
-    comparison_path = data_directory_path / site_key / 'analysis' / 'comparison.csv'
-    site_comparison_df = comparison_df[comparison_df['Site URL'] == site]
-    site_comparison_df.to_csv(comparison_path, index=False)
-    print(f"Saved comparison dataframe to {comparison_path}.")
-
-# Save daily aggregate dataframe to CSV
-for site in daily_aggregate['Site URL'].unique():
-    site_key = site.replace('https://', '').replace('/', '_')
-    daily_aggregate_path = data_directory_path / site_key / 'analysis' / 'daily_aggregate.csv'
-    site_daily_aggregate = daily_aggregate[daily_aggregate['Site URL'] == site]
-    site_daily_aggregate.to_csv(daily_aggregate_path, index=False)
-    print(f"Saved daily aggregate dataframe to {daily_aggregate_path}.")
-
-# Aggregate load time stats by site
-load_time_stats = df.groupby('Site URL').agg(
-    Min_Load_Time=pd.NamedAgg(column='Load Time', aggfunc='min'),
-    Max_Load_Time=pd.NamedAgg(column='Load Time', aggfunc='max'),
-    Avg_Load_Time=pd.NamedAgg(column='Load Time', aggfunc='mean'),
-    Std_Load_Time=pd.NamedAgg(column='Load Time', aggfunc='std')
-).reset_index()
-
-# Save load time stats to a CSV file
-for site in load_time_stats['Site URL'].unique():
-    site_key = site.replace('https://', '').replace('/', '_')
-    load_time_stats_path = data_directory_path / site_key / 'analysis' / 'load_time_stats.csv'
-    site_load_time_stats = load_time_stats[load_time_stats['Site URL'] == site]
-    site_load_time_stats.to_csv(load_time_stats_path, index=False)
-    print(f"Saved load time stats to {load_time_stats_path}.")
-
-# Display the first few rows of the comparison dataframe
-print("\n\nComparison DataFrame:\n")
-print(comparison_df.head())
-
-# Display the daily aggregate data
-print("\n\nDaily Aggregate DataFrame:\n")
-print(daily_aggregate.head())
-
-# Display the load time stats
-print("\n\nLoad Time Stats DataFrame:\n")
-print(load_time_stats.head())
-print("\n\nData Analysis Complete!\n\n")
+def site_directory(site):
+    return data_directory_path / site.replace('https://', '').replace('/', '_')
+
+
+def page_chart_path(site, page):
+    return site_directory(site) / 'charts' / 'page_breakdown' / f"{page.replace('/', '_')}_page_breakdown.jpg"
+
+
+# Per page and day rows built from the checkpoint's [count, min, max, sum, sum of squares, request count, request sum]
+def page_daily_frame(site, summary):
+    records = []
+    for page, days in summary['days'].items():
+        for date, day in days.items():
+            mean, std = AnalysisCheckpoint.mean_std(day[0], day[3], day[4])
+            records.append({
+                'Site URL': site, 'Page Name': page, 'Date': date, 'Samples': day[0], 'Min_Load_Time': day[1],
+                'Max_Load_Time': day[2], 'Avg_Load_Time': mean, 'Std_Load_Time': std,
+                'Avg_Requests': day[6] / day[5] if day[5] else None,
+            })
+    return pd.DataFrame(records).sort_values(['Page Name', 'Date']).reset_index(drop=True)
+
+
+# Merge day aggregates under the given keys into the same min, max, mean and std columns
+def merge_days(summary, key):
+    merged = {}
+    for page, days in summary['days'].items():
+        for date, day in days.items():
+            merged[key(page, date)] = AnalysisCheckpoint.merge_day(merged.get(key(page, date)), day)
+    return merged
+
+
+def stats_record(values):
+    mean, std = AnalysisCheckpoint.mean_std(values[0], values[3], values[4])
+    return {'Samples': values[0], 'Min_Load_Time': values[1], 'Max_Load_Time': values[2], 'Avg_Load_Time': mean,
+            'Std_Load_Time': std}
+
+
+# Count, mean and variance in the form BaselineStore compares
+def summary_stats(count, total, total_squares):
+    mean, std = AnalysisCheckpoint.mean_std(count, total, total_squares)
+    return {'count': count, 'mean': mean, 'variance': std * std if std is not None else None}
+
+
+# Load time statistics per site and page from a stored baseline, merged across methods, profiles and cache modes.
+# Sites are keyed as the checkpoint keys them (scheme and host), and the store is only read, never created.
+def snapshot_pages(baseline_name):
+    with open(project_root / 'config.json', 'r') as file:
+        config = json.load(file)
+    try:
+        store = ResultsStore(str(project_root / config.get('results_store', {}).get('path', 'data/results.sqlite')), read_only=True)
+        baselines = BaselineStore(store, config.get('baselines', {}))
+        baseline = baselines.get(baseline_name)
+    except sqlite3.OperationalError:
+        baseline = None
+    if baseline is None:
+        print(f"Error: There is no baseline called {baseline_name}.")
+        sys.exit(1)
+
+    pages = {}
+    for (site, page, _, _, _, metric), stats in baselines.snapshot(baseline_name).items():
+        if metric == 'load_time':
+            site_pages = pages.setdefault(HistoryLoader.site_key(site), {})
+            site_pages[page] = BaselineStore.merge(site_pages.get(page), stats)
+    store.close()
+    return pages, baselines.alpha
+
+
+# Write the site's analysis CSV files and return its dataframes with the specs of its charts.
+# baseline_pages maps page names to baseline statistics; None uses the rows noted 'Baseline'.
+def analyse_site(site, summary, baseline_pages=None, significance_level=0.05):
+    analysis_directory_path = site_directory(site) / 'analysis'
+    charts_directory_path = site_directory(site) / 'charts'
+    create_directory(analysis_directory_path)
+
+    page_daily = page_daily_frame(site, summary)
+    if baseline_pages is None:
+        baseline_pages = {page: summary_stats(*sums) for page, sums in summary['baselines'].items()}
+    daily_totals = merge_days(summary, lambda page, date: date)
+    daily_aggregate = pd.DataFrame([
+        {'Site URL': site, 'Date': date, **stats_record(values)} for date, values in sorted(daily_totals.items())
+    ])
+    load_time_stats = pd.DataFrame([{'Site URL': site, **stats_record(merge_days(summary, lambda page, date: site)[site])}])
+
+    # The baseline of each page against the site's latest day: a keyed lookup, with Welch's t-test
+    latest_date = daily_aggregate['Date'].max()
+    comparison_records = []
+    for page, before in sorted(baseline_pages.items()):
+        day = summary['days'].get(page, {}).get(latest_date)
+        if day is None:
+            continue
+        after = summary_stats(day[0], day[3], day[4])
+        _, _, p_value = BaselineStore.welch(before, after)
+        comparison_records.append({
+            'Site URL': site, 'Page Name': page, 'Baseline Samples': before['count'], 'Load Time_baseline': before['mean'],
+            'Latest Date': latest_date, 'Latest Samples': after['count'], 'Load Time_latest': after['mean'],
+            'Load Time Change': after['mean'] - before['mean'], 'P Value': p_value,
+            'Significant': p_value is not None and p_value < significance_level,
+        })
+    comparison_df = pd.DataFrame(comparison_records, columns=[
+        'Site URL', 'Page Name', 'Baseline Samples', 'Load Time_baseline', 'Latest Date', 'Latest Samples',
+        'Load Time_latest', 'Load Time Change', 'P Value', 'Significant',
+    ])
+    aggregate_changes = comparison_df.groupby('Site URL')['Load Time Change'].agg(['mean', 'min', 'max', 'std']).reset_index()
+
+    # Save the aggregates to CSV files
+    for name, frame in (('aggregate_changes', aggregate_changes), ('comparison', comparison_df),
+                        ('daily_aggregate', daily_aggregate), ('load_time_stats', load_time_stats)):
+        frame.to_csv(analysis_directory_path / f'{name}.csv', index=False)
+    print(f"Saved aggregate changes, comparison, daily aggregate and load time stats to {analysis_directory_path}.")
+
+    specs = []
+
+    # Load time changes against the baseline
+    if not comparison_df.empty:
+        specs.append({
+            'kind': 'bar', 'path': str(charts_directory_path / 'load_time_change' / 'load_time_change.jpg'),
+            'title': f'Load Time Change for {site}', 'xlabel': 'Page Name', 'ylabel': 'Load Time Change (seconds)',
+            'labels': comparison_df['Page Name'].tolist(), 'values': comparison_df['Load Time Change'].tolist(),
+            'message': f"Saved load time change chart for {site}.",
+        })
+
+    # Daily aggregates
+    specs.append({
+        'kind': 'band', 'path': str(charts_directory_path / 'daily_load' / 'daily_load_time.jpg'), 'size': (12, 6),
+        'title': f'Daily Load Time for {site}', 'xlabel': 'Date', 'ylabel': 'Load Time (seconds)',
+        'label': 'Average Load Time', 'dates': daily_aggregate['Date'].tolist(),
+        'means': daily_aggregate['Avg_Load_Time'].tolist(), 'lows': daily_aggregate['Min_Load_Time'].tolist(),
+        'highs': daily_aggregate['Max_Load_Time'].tolist(), 'message': f"Saved daily load time chart for {site}.",
+    })
+
+    # Page breakdown over time
+    for page, page_data in page_daily.groupby('Page Name', sort=True):
+        specs.append({
+            'kind': 'band', 'path': str(page_chart_path(site, page)), 'size': (12, 6),
+            'title': f'Load Time Over Time for {site} - {page}', 'xlabel': 'Date', 'ylabel': 'Load Time (seconds)',
+            'label': 'Average Load Time', 'dates': page_data['Date'].tolist(),
+            'means': page_data['Avg_Load_Time'].tolist(), 'lows': page_data['Min_Load_Time'].tolist(),
+            'highs': page_data['Max_Load_Time'].tolist(), 'message': f"Saved page breakdown chart for {site} - {page}.",
+        })
+
+    # 1. Boxplot of load times, with the quartiles read from each page's quantile sketch
+    boxes = []
+    for page in sorted(summary['sketches']):
+        sketch = summary['sketches'][page]
+        low = min(day[1] for day in summary['days'][page].values())
+        high = max(day[2] for day in summary['days'][page].values())
+        q1, median, q3 = sketch.quantile(0.25), sketch.quantile(0.5), sketch.quantile(0.75)
+        boxes.append({
+            'label': page, 'q1': q1, 'med': median, 'q3': q3,
+            'whislo': max(low, q1 - 1.5 * (q3 - q1)), 'whishi': min(high, q3 + 1.5 * (q3 - q1)), 'fliers': [],
+        })
+    specs.append({
+        'kind': 'box', 'path': str(charts_directory_path / 'boxplot_load_times.jpg'),
+        'title': f'Boxplot of Load Times for {site}', 'xlabel': 'Page Name', 'ylabel': 'Load Time (seconds)',
+        'boxes': boxes, 'message': f"Saved boxplot of load times for {site}.",
+    })
+
+    # 2. Histogram of load times, from the sketch buckets of every page
+    bucket_values, bucket_counts = [], []
+    for sketch in summary['sketches'].values():
+        if sketch.zero_count:
+            bucket_values.append(0.0)
+            bucket_counts.append(sketch.zero_count)
+        for key, count in sorted(sketch.bins.items()):
+            bucket_values.append(2 * sketch.gamma ** key / (sketch.gamma + 1))
+            bucket_counts.append(count)
+    specs.append({
+        'kind': 'histogram', 'path': str(charts_directory_path / 'histogram_load_times.jpg'),
+        'title': f'Histogram of Load Times for {site}', 'xlabel': 'Load Time (seconds)', 'ylabel': 'Frequency',
+        'values': bucket_values, 'weights': bucket_counts, 'message': f"Saved histogram of load times for {site}.",
+    })
+
+    # 3. Scatter plot of load time against number of requests, from the sampled rows
+    samples = sorted(summary['samples'])
+    specs.append({
+        'kind': 'scatter', 'path': str(charts_directory_path / 'scatter_requests_vs_load_time.jpg'),
+        'title': f'Scatter Plot of Load Time vs Number of Requests for {site}', 'xlabel': 'Number of Requests',
+        'ylabel': 'Load Time (seconds)', 'x': [point[0] for point in samples], 'y': [point[1] for point in samples],
+        'message': f"Saved scatter plot of load time vs number of requests for {site}.",
+    })
+
+    # 4. Line plot of the daily mean number of requests
+    request_dates = [date for date in sorted(daily_totals) if daily_totals[date][5]]
+    specs.append({
+        'kind': 'line', 'path': str(charts_directory_path / 'line_requests_over_time.jpg'), 'size': (12, 6),
+        'title': f'Number of Requests Over Time for {site}', 'xlabel': 'Date', 'ylabel': 'Number of Requests',
+        'dates': request_dates, 'values': [daily_totals[date][6] / daily_totals[date][5] for date in request_dates],
+        'message': f"Saved line plot of number of requests over time for {site}.",
+    })
+
+    # 5. Heatmap of the daily mean load time by page for the last 30 days
+    pivot_table = page_daily.pivot(index='Date', columns='Page Name', values='Avg_Load_Time').tail(30)
+    specs.append({
+        'kind': 'heatmap', 'path': str(charts_directory_path / 'heatmap_load_times.jpg'), 'size': (12, 6),
+        'title': f'Heatmap of Load Times for {site}', 'xlabel': 'Page Name', 'ylabel': 'Date',
+        'rows': pivot_table.index.tolist(), 'columns': pivot_table.columns.tolist(),
+        'values': pivot_table.to_numpy(dtype=float).tolist(), 'colorbar': 'Load Time (seconds)',
+        'message': f"Saved heatmap of load times for {site}.",
+    })
+
+    return comparison_df, daily_aggregate, load_time_stats, specs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file', action='append', help='CSV file within data/ to analyse (repeatable); defaults to all result files')
+    parser.add_argument('--checkpoint', default=str(data_directory_path / 'analysis_checkpoint.json'), help='Where to keep the running aggregates')
+    parser.add_argument('--full', action='store_true', help='Discard the checkpoint, re-read every row and redraw every chart')
+    parser.add_argument('--baseline', help='Compare with this saved baseline (see baselines.py) instead of the rows noted Baseline')
+    parser.add_argument('--workers', type=int, default=None, help='Processes drawing charts (default: one per CPU)')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+
+    if args.file:
+        csv_files = [str(data_directory_path / name) for name in args.file]
+    else:
+        csv_files = sorted(glob.glob(str(data_directory_path / '*' / 'speed_check*.csv')))
+        csv_files += sorted(glob.glob(str(data_directory_path / 'selenium_*_tests.csv')))
+
+    for csv_file in csv_files:
+        if not os.path.exists(csv_file):
+            print(f"Error: The file {csv_file} does not exist.")
+            sys.exit(1)
+
+    if args.full and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = AnalysisCheckpoint(args.checkpoint)
+
+    # Read only the rows added since the last run
+    total_rows = 0
+    for csv_file in csv_files:
+        rows = checkpoint.update_file(csv_file)
+        total_rows += rows
+        if rows:
+            print(f"Read {rows} new rows from {os.path.relpath(csv_file, project_root)}")
+
+    # Saved before drawing, so charts left undrawn by an interrupted run are redrawn next time
+    checkpoint.save()
+
+    baseline_pages, significance_level = snapshot_pages(args.baseline) if args.baseline else (None, 0.05)
+
+    # Look again at the sites with new rows, and any site whose charts are missing. Comparing with a
+    # saved baseline looks at every site, since the comparison changes with the baseline.
+    dirty_sites = set(checkpoint.sites() if args.baseline else checkpoint.dirty_sites())
+    comparisons, daily_aggregates, load_time_stats, specs, analysed = [], [], [], [], []
+    for site in checkpoint.sites():
+        summary = checkpoint.site_summary(site)
+        charts_missing = (any(not (site_directory(site) / 'charts' / chart).exists() for chart in SITE_CHARTS)
+                          or any(not page_chart_path(site, page).exists() for page in summary['days']))
+        if site not in dirty_sites and not charts_missing:
+            continue
+
+        print(f"\nSite: {site}")
+        for page, url in sorted(summary['pages'].items()):
+            print(f"  Page: {page} ({url})")
+        site_baseline = baseline_pages.get(site, {}) if baseline_pages is not None else None
+        comparison_df, daily_aggregate, stats, site_specs = analyse_site(site, summary, site_baseline, significance_level)
+        comparisons.append(comparison_df)
+        daily_aggregates.append(daily_aggregate)
+        load_time_stats.append(stats)
+        specs += site_specs
+        analysed.append(site)
+
+    # Draw every changed chart of every site in one pool
+    renderer = ChartRenderer(args.workers)
+    fingerprints, drawn = renderer.render(specs, checkpoint.charts)
+    checkpoint.charts.update(fingerprints)
+    for site in analysed:
+        checkpoint.mark_drawn(site)
+
+    # Pages whose only file was dropped have nothing left to draw
+    checkpoint.dirty = {(site, page) for site, page in checkpoint.dirty if site in checkpoint.sites()}
+    checkpoint.save()
+
+    if comparisons:
+        # Display the first few rows of the comparison dataframe
+        print("\n\nComparison DataFrame:\n")
+        print(pd.concat(comparisons).head())
+
+        # Display the daily aggregate data
+        print("\n\nDaily Aggregate DataFrame:\n")
+        print(pd.concat(daily_aggregates).tail())
+
+        # Display the load time stats
+        print("\n\nLoad Time Stats DataFrame:\n")
+        print(pd.concat(load_time_stats))
+
+    print(f"\n\nData Analysis Complete! {total_rows} new rows, {len(analysed)} sites updated, "
+          f"{drawn} of {len(specs)} charts redrawn in {time.perf_counter() - start_time:.1f} seconds\n\n")
+
+
+# Chart workers import this file, so the analysis only runs when it is started as a script
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+'''
+Import Speed Check History
+
+- This script loads the existing CSV results into the indexed results store (data/results.sqlite by default).
+- It imports every data/<domain>/speed_check.csv file, any speed_check.<date>.csv files set aside after a
+  column change, and the data/selenium_*_tests.csv files written by main.py.
+- Files that have already been imported are skipped, so it is safe to run more than once (use --force to re-import).
+'''
+
+import argparse
+import glob
+import json
+import os
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root / 'classes'))
+
+from ResultsStore import ResultsStore
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--force', action='store_true', help='Re-import files that were imported before')
+args = parser.parse_args()
+
+# Use the same store path as the scanner
+with open(project_root / 'config.json', 'r') as file:
+    config = json.load(file)
+store_path = project_root / config.get('results_store', {}).get('path', 'data/results.sqlite')
+
+csv_files = sorted(glob.glob(str(project_root / 'data' / '*' / 'speed_check*.csv')))
+csv_files += sorted(glob.glob(str(project_root / 'data' / 'selenium_*_tests.csv')))
+
+store = ResultsStore(str(store_path))
+total_rows = 0
+
+for csv_file in csv_files:
+    rows = store.import_csv(csv_file, force=args.force)
+    total_rows += rows
+
+    if rows:
+        print(f'Imported {rows} rows from {os.path.relpath(csv_file, project_root)}')
+    else:
+        print(f'Skipped {os.path.relpath(csv_file, project_root)} (already imported or empty)')
+
+store.close()
+print(f'\nImported {total_rows} rows into {store_path}')
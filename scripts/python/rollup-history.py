@@ -0,0 +1,61 @@
+'''
+Rollup History
+
+- This script brings the hourly and daily rollup tiers up to date and applies the retention policy from the
+  rollups block in config.json. The scanner rolls up its rows after every sweep but never deletes any, so
+  schedule this (e.g. nightly) to compact the raw history. Re-imported rows are never rolled up twice.
+- With --site and --page it prints a trend for that page, read from the coarsest tier that covers the range.
+- Usage: python3 scripts/python/rollup-history.py --site https://example.com --page Home --days 365 --points 24
+'''
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root / 'classes'))
+
+from ResultsStore import ResultsStore
+from RollupStore import RollupStore
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--site', help='Site URL as it appears in config.json')
+parser.add_argument('--page', help='Page name as it appears in config.json')
+parser.add_argument('--metric', default='loadTime', help='Metric key, e.g. loadTime or ttfb')
+parser.add_argument('--days', type=float, default=365, help='How many days of history to show')
+parser.add_argument('--points', type=int, default=30, help='Number of points to show')
+parser.add_argument('--vacuum', action='store_true', help='Reclaim the space freed by compaction')
+args = parser.parse_args()
+
+# Use the same store path and rollup settings as the scanner
+with open(project_root / 'config.json', 'r') as file:
+    config = json.load(file)
+store_path = project_root / config.get('results_store', {}).get('path', 'data/results.sqlite')
+
+store = ResultsStore(str(store_path))
+rollups = RollupStore(store, config.get('rollups', {}))
+
+start_time = time.perf_counter()
+added = rollups.update()
+deleted = rollups.compact()
+print(f'Rolled up {added} new rows and compacted {deleted} raw rows in {time.perf_counter() - start_time:.1f} seconds')
+print('Rows per tier: ' + ', '.join(f'{tier} {count}' for tier, count in rollups.counts().items()))
+
+if args.vacuum:
+    with store.lock:
+        store.connection.execute('VACUUM')
+
+if args.site and args.page:
+    now = time.time()
+    start = now - args.days * 86400
+    resolution = args.days * 86400 / args.points
+    print(f'\n{args.site} {args.page} {args.metric} ({rollups.choose_tier(start, resolution, now)} tier)\n')
+    print(f'{"From":<17} {"Count":>7} {"Mean":>8} {"P50":>8} {"P95":>8} {"Max":>8}')
+    for point in rollups.series(args.site, args.page, args.metric, start=start, end=now, resolution=resolution, now=now):
+        print(f'{datetime.fromtimestamp(point["time"]).strftime("%Y-%m-%d %H:%M"):<17} {point["count"]:>7} '
+              f'{point["mean"]:>8.3f} {point["p50"]:>8.3f} {point["p95"]:>8.3f} {point["max"]:>8.3f}')
+
+store.close()
@@ -0,0 +1,47 @@
+'''
+Top Resources
+
+- This script lists the resources that contributed the most load time to one page over a time range.
+- It reads the per-resource waterfall captured by Selenium runs (selenium.capture_resources) from the results store.
+- Usage: python3 scripts/python/top-resources.py https://example.com Home --days 7 --limit 10
+'''
+
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(project_root / 'classes'))
+
+from ResourceTimingStore import ResourceTimingStore
+from ResultsStore import ResultsStore
+
+parser = argparse.ArgumentParser()
+parser.add_argument('site', help='Site URL as it appears in config.json')
+parser.add_argument('page', help='Page name as it appears in config.json')
+parser.add_argument('--days', type=float, default=7, help='How many days of history to include')
+parser.add_argument('--limit', type=int, default=10, help='Number of resources to list')
+args = parser.parse_args()
+
+# Use the same store path as the scanner
+with open(project_root / 'config.json', 'r') as file:
+    config = json.load(file)
+store_path = project_root / config.get('results_store', {}).get('path', 'data/results.sqlite')
+
+store = ResultsStore(str(store_path))
+resource_store = ResourceTimingStore(store)
+start = datetime.now() - timedelta(days=args.days)
+resources = resource_store.top_resources(args.site, args.page, start=start, limit=args.limit)
+store.close()
+
+if not resources:
+    print(f'No resource timings recorded for {args.site} {args.page} in the last {args.days:g} days')
+    sys.exit(0)
+
+print(f'Top {len(resources)} resources for {args.site} {args.page} over {resources[0]["pageLoads"]} page loads\n')
+print(f'{"Total (s)":>10} {"Mean (s)":>9} {"Requests":>9} {"Bytes":>12}  URL')
+for resource in resources:
+    print(f'{resource["totalTime"]:>10} {resource["meanTime"]:>9} {resource["requests"]:>9} '
+          f'{resource["transferBytes"]:>12}  {resource["url"]}')
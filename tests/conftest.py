@@ -0,0 +1,38 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The classes are imported flat, as main.py and the scripts do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'classes'))
+
+from StandInServer import StandInServer
+
+
+@pytest.fixture
+def stand_in():
+    server = StandInServer(latency=0, body_bytes=2000, subresources=0).start()
+    yield server
+    server.stop()
+
+
+# A project folder with a config.json for one site; the scanner writes data/ and logs/ relative to it
+@pytest.fixture
+def project(tmp_path, monkeypatch, stand_in):
+    config = {
+        'sites': {'stand-in': {'enabled': True, 'url': stand_in.url}},
+        'speed_check_method': 'requests',
+        'results_store': {'enabled': True, 'path': 'data/results.sqlite'},
+        'rollups': {'enabled': False},
+        'change_detection': {'enabled': False},
+        'session_cache': {'enabled': False},
+        'journal': {'enabled': True, 'path': 'data/journal', 'fsync': False},
+        'pages': [{'url': f'/page-{index}/', 'name': f'Page {index}'} for index in range(3)],
+        'target_load_time': 3
+    }
+    with open(tmp_path / 'config.json', 'w') as file:
+        json.dump(config, file)
+
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,27 @@
+import pytest
+
+from AnalysisCheckpoint import AnalysisCheckpoint
+from HistoryLoader import HistoryLoader
+
+HEADER = 'Timestamp,Measured At,Page URL,Page Name,Load Time,Measurement Method,Note\n'
+
+
+def test_load_times_keep_every_digit(tmp_path):
+    load_times = [1.234567891, 2.000000001, 12.3456789012]
+    path = tmp_path / 'speed_check.csv'
+    path.write_text(HEADER + ''.join(
+        f'2024-06-01_09-30-00,2024-06-01 09:30:0{index}.000000,https://example.com/,Home,{load_time},requests,\n'
+        for index, load_time in enumerate(load_times)
+    ))
+
+    frame = HistoryLoader.concat([frame for frame, _ in HistoryLoader.read_rows(str(path))])
+    assert frame['load_time'].tolist() == load_times
+
+    checkpoint = AnalysisCheckpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.update_file(str(path))
+    day = checkpoint.files[str(path)]['days']['https://example.com']['Home']['2024-06-01']
+
+    assert day[:3] == [3, min(load_times), max(load_times)]
+    # float32 would be out by about one part in ten million
+    assert day[3] == pytest.approx(sum(load_times), rel=1e-12)
+    assert day[4] == pytest.approx(sum(load_time ** 2 for load_time in load_times), rel=1e-12)
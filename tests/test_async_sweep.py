@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from AsyncSweep import AsyncSweep
+
+
+# Fails in a way aiohttp never would for one URL, and measures every other URL instantly
+class FlakyMeasurement:
+    def __init__(self, url, session):
+        self.url = url
+
+    async def measure_performance(self):
+        if self.url.endswith('/bad'):
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+        return {'loadTime': 0.1, 'statusCode': 200}
+
+    def get_performance_metrics(self):
+        return {'loadTime': 0, 'statusCode': 0}
+
+
+def test_an_unexpected_error_fails_only_its_own_page():
+    urls = ['http://example.test/bad'] + [f'http://example.test/{index}' for index in range(10)]
+    results = {}
+
+    AsyncSweep({'concurrency': 1}, FlakyMeasurement).run(
+        ({'url': url} for url in urls), lambda job, metrics: results.setdefault(job['url'], metrics)
+    )
+
+    assert sorted(results) == sorted(urls)
+    assert results['http://example.test/bad']['loadTime'] is None
+    assert 'invalid start byte' in results['http://example.test/bad']['error']
+
+
+# Takes as long as the number at the end of its URL and reports how long that really took
+class SleepingMeasurement:
+    def __init__(self, url, session):
+        self.url = url
+
+    async def measure_performance(self):
+        start = time.perf_counter()
+        await asyncio.sleep(float(self.url.rsplit('/', 1)[-1]))
+        return {'loadTime': time.perf_counter() - start, 'statusCode': 200}
+
+
+def test_writing_a_result_does_not_stall_pages_in_flight():
+    results = {}
+    writing = []
+
+    def on_result(job, metrics):
+        writing.append(job['url'])
+        assert len(writing) == 1, 'results were written concurrently'
+        time.sleep(0.3)
+        results[job['url']] = metrics
+        writing.remove(job['url'])
+
+    urls = ['http://example.test/0.05'] + ['http://example.test/0.2'] * 3
+    AsyncSweep({'concurrency': 4}, SleepingMeasurement).run(({'url': url} for url in urls), on_result)
+
+    assert results['http://example.test/0.2']['loadTime'] < 0.28
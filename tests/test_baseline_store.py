@@ -0,0 +1,83 @@
+import math
+import random
+import statistics
+
+import pytest
+
+from BaselineStore import BaselineStore
+
+
+def stats(values):
+    return {
+        'count': len(values), 'mean': statistics.fmean(values),
+        'variance': statistics.variance(values) if len(values) > 1 else None,
+        'min': min(values), 'max': max(values), 'p50': None, 'p95': None,
+    }
+
+
+# Two-sided p-values of Student's t from published tables
+@pytest.mark.parametrize('t, degrees, expected', [
+    (2.0, 10, 0.0734),
+    (2.228, 10, 0.0500),
+    (1.0, 1, 0.5),
+    (3.0, 5, 0.0301),
+    (1.96, 1e6, 0.0500),
+    (0.0, 10, 1.0),
+])
+def test_incomplete_beta_gives_student_t_p_values(t, degrees, expected):
+    assert BaselineStore.incomplete_beta(degrees / (degrees + t * t), degrees / 2, 0.5) == pytest.approx(expected, abs=5e-4)
+
+
+@pytest.mark.parametrize('x, a, b, expected', [
+    (0.3, 1, 1, 0.3),
+    (0.4, 3, 1, 0.4 ** 3),
+    (0.5, 4.5, 4.5, 0.5),
+    (0.0, 2, 3, 0.0),
+    (1.0, 2, 3, 1.0),
+])
+def test_incomplete_beta_known_values(x, a, b, expected):
+    assert BaselineStore.incomplete_beta(x, a, b) == pytest.approx(expected, abs=1e-10)
+
+
+def test_welch_matches_the_textbook_formula():
+    first = stats([1.10, 1.25, 0.98, 1.31, 1.05, 1.18, 1.22, 1.01])
+    second = stats([1.32, 1.41, 1.28, 1.55, 1.37, 1.29, 1.46, 1.39, 1.50, 1.33, 1.44])
+
+    t, degrees, p_value = BaselineStore.welch(first, second)
+
+    first_error = first['variance'] / first['count']
+    second_error = second['variance'] / second['count']
+    assert t == pytest.approx((second['mean'] - first['mean']) / math.sqrt(first_error + second_error))
+    assert degrees == pytest.approx((first_error + second_error) ** 2 / (
+        first_error ** 2 / (first['count'] - 1) + second_error ** 2 / (second['count'] - 1)
+    ))
+    assert 0 < p_value < 0.001
+
+
+def test_welch_needs_two_samples_a_side():
+    assert BaselineStore.welch(stats([1.0]), stats([1.0, 2.0])) == (None, None, None)
+    assert BaselineStore.welch(stats([1.0, 1.0]), stats([1.0, 1.0])) == (None, None, 1.0)
+    assert BaselineStore.welch(stats([1.0, 1.0]), stats([2.0, 2.0])) == (None, None, 0.0)
+
+
+@pytest.mark.parametrize('sizes', [(1, 1), (1, 7), (5, 1), (30, 200)])
+def test_merge_equals_the_stats_of_the_concatenated_samples(sizes):
+    generator = random.Random(sum(sizes))
+    first = [generator.uniform(0.5, 3) for _ in range(sizes[0])]
+    second = [generator.uniform(1, 6) for _ in range(sizes[1])]
+
+    merged = BaselineStore.merge(stats(first), stats(second))
+    expected = stats(first + second)
+
+    assert merged['count'] == expected['count']
+    assert merged['mean'] == pytest.approx(expected['mean'], rel=1e-12)
+    assert merged['variance'] == pytest.approx(expected['variance'], rel=1e-9)
+    assert (merged['min'], merged['max']) == (expected['min'], expected['max'])
+
+
+def test_merge_into_nothing_copies_the_summary():
+    summary = stats([1.0, 2.0, 4.0])
+    merged = BaselineStore.merge(None, summary)
+
+    assert merged == summary
+    assert merged is not summary
@@ -0,0 +1,88 @@
+import json
+import random
+
+import pytest
+
+from ChangeDetector import ChangeDetector
+
+SITE = 'https://example.com'
+
+
+@pytest.fixture
+def detector(tmp_path):
+    def create(name):
+        return ChangeDetector({'metrics': ['loadTime', 'ttfb']}, str(tmp_path / f'{name}.json'), str(tmp_path / f'{name}.jsonl'))
+    return create
+
+
+# Steady history with a step up at 60, a step back down at 130 and a noisier stretch from 200
+def history(seed=7):
+    generator = random.Random(seed)
+    rows = []
+    for index in range(300):
+        level = 1.0 + (0.6 if 60 <= index < 130 else 0.0)
+        spread = 0.25 if index >= 200 else 0.04
+        rows.append({
+            'site': SITE, 'page_name': 'Home', 'measurement_method': 'requests', 'run_id': f'run-{index}',
+            'timestamp': 1700000000 + index * 3600, 'status_code': 200,
+            'load_time': level + generator.gauss(0, spread), 'ttfb': 0.2 + generator.gauss(0, 0.01)
+        })
+    return rows
+
+
+def replay(detector, rows):
+    events = []
+    for row in rows:
+        metrics = {'loadTime': row['load_time'], 'ttfb': row['ttfb'], 'statusCode': row['status_code']}
+        events += detector.update(row['site'], row['page_name'], metrics, row['measurement_method'], row['timestamp'], row['run_id'])
+    return events
+
+
+def without_source(events):
+    return [{key: value for key, value in event.items() if key != 'source'} for event in events]
+
+
+def test_backfill_raises_the_same_events_as_update(detector):
+    rows = history()
+    online = detector('online')
+    offline = detector('offline')
+
+    online_events = replay(online, rows)
+    offline_events = offline.backfill(rows)
+
+    assert len(online_events) >= 3
+    assert sorted(without_source(offline_events), key=json.dumps) == sorted(without_source(online_events), key=json.dumps)
+    for metric in ('loadTime', 'ttfb'):
+        online_state = online.state[SITE]['Home | requests'][metric]
+        offline_state = offline.state[SITE]['Home | requests'][metric]
+        assert offline_state.keys() == online_state.keys()
+        for key, value in online_state.items():
+            assert offline_state[key] == pytest.approx(value, abs=1e-9)
+
+
+def test_a_step_change_is_detected(detector):
+    events = replay(detector('step'), history()[:130])
+    shifts = [event for event in events if event['metric'] == 'loadTime']
+
+    assert [(event['kind'], event['direction']) for event in shifts] == [('level_shift', 'up')]
+    assert shifts[0]['runId'] in {f'run-{index}' for index in range(60, 70)}
+    assert shifts[0]['level'] > shifts[0]['baseline'] + 0.3
+
+
+# Swinging either side of the same level widens the spread without moving the level
+def test_a_variance_increase_is_detected(detector):
+    rows = history()[:80]
+    for index, row in enumerate(rows[40:]):
+        row['load_time'] = 1.0 + (0.15 if index % 2 else -0.15)
+    events = [event for event in replay(detector('variance'), rows) if event['metric'] == 'loadTime']
+
+    assert [(event['kind'], event['direction']) for event in events] == [('variance_increase', 'up')]
+    assert events[0]['varianceRatio'] > 4
+
+
+def test_error_pages_are_skipped(detector):
+    rows = history()[:130]
+    for row in rows[60:]:
+        row['status_code'] = 503
+
+    assert replay(detector('errors'), rows) == []
@@ -0,0 +1,62 @@
+import glob
+import importlib.util
+import json
+import os
+
+import pytest
+
+from AnalysisCheckpoint import AnalysisCheckpoint
+from BaselineStore import BaselineStore
+from PerformanceScanner import PerformanceScanner
+from ResultsStore import ResultsStore
+
+
+@pytest.fixture
+def analysis(project, monkeypatch):
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'python', 'data-analysis.py')
+    spec = importlib.util.spec_from_file_location('data_analysis', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, 'project_root', project)
+    return module
+
+
+def test_a_baseline_for_a_site_with_a_path_matches_the_checkpoint(project, stand_in, analysis):
+    with open(project / 'config.json') as file:
+        config = json.load(file)
+    config['sites'] = {'blog': {'enabled': True, 'url': f'{stand_in.url}/blog'}}
+    with open(project / 'config.json', 'w') as file:
+        json.dump(config, file)
+
+    PerformanceScanner(str(project), 'Before')
+    store = ResultsStore(str(project / 'data' / 'results.sqlite'))
+    BaselineStore(store).create('before-deploy')
+    store.close()
+
+    checkpoint = AnalysisCheckpoint(str(project / 'data' / 'analysis_checkpoint.json'))
+    checkpoint.update_file(glob.glob(str(project / 'data' / '*' / 'speed_check.csv'))[0])
+    pages, _ = analysis.snapshot_pages('before-deploy')
+
+    assert checkpoint.sites() == [stand_in.url]
+    assert sorted(pages) == checkpoint.sites()
+    assert sorted(pages[stand_in.url]) == ['Page 0', 'Page 1', 'Page 2']
+
+
+def test_a_missing_store_is_not_created(project, analysis):
+    with pytest.raises(SystemExit):
+        analysis.snapshot_pages('before-deploy')
+
+    assert not (project / 'data' / 'results.sqlite').exists()
+
+
+def test_the_store_is_opened_read_only(project, analysis):
+    ResultsStore(str(project / 'data' / 'results.sqlite')).close()
+    modified = os.path.getmtime(project / 'data' / 'results.sqlite')
+
+    with pytest.raises(SystemExit):
+        analysis.snapshot_pages('before-deploy')
+
+    store = ResultsStore(str(project / 'data' / 'results.sqlite'), read_only=True)
+    assert store.query_one("SELECT name FROM sqlite_master WHERE name = 'baselines'") is None
+    store.close()
+    assert os.path.getmtime(project / 'data' / 'results.sqlite') == modified
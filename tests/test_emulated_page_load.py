@@ -0,0 +1,72 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+import EmulatedPageLoadMeasurement as measurement_module
+from EmulatedPageLoadMeasurement import EmulatedPageLoadMeasurement
+from StandInServer import StandInServer
+
+
+# A page and stylesheet in a charset Python doesn't know, the stylesheet pointing at a font, and an image
+# whose URL can't be fetched, alongside images that take a second to load
+@pytest.fixture
+def broken_page_server():
+    images = ''.join(f'<img src="/assets/image-{index}.png">' for index in range(4))
+    page = (f'<html><head><link rel="stylesheet" href="/broken.css"></head>'
+            f'<body><img src="http://127.0.0.1:99999/missing.png">{images}</body></html>').encode()
+    server = StandInServer(latency=0, subresource_latency=1, files={
+        '/page/': ('text/html; charset=no-such-charset', page),
+        '/broken.css': ('text/css; charset=no-such-charset', b'@font-face { src: url(/fonts/body.woff2) }'),
+        '/fonts/body.woff2': ('font/woff2', b'\0' * 100),
+    })
+    server.start()
+    yield server
+    server.stop()
+
+
+def measure(url, timeout=None):
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            measurement = EmulatedPageLoadMeasurement(url, session)
+            return measurement, await asyncio.wait_for(measurement.measure_performance(), timeout)
+
+    return asyncio.run(run())
+
+
+def test_unknown_charsets_and_failed_resources_do_not_fail_the_page(broken_page_server):
+    measurement, metrics = measure(f'{broken_page_server.url}/page/')
+
+    assert metrics['loadTime'] > 1
+    assert metrics['failedRequests'] == 1
+    assert '/fonts/body.woff2' in {url.split(broken_page_server.url)[-1] for url in measurement.seen}
+    assert metrics['numberRequests'] == 8
+
+
+def test_any_error_from_a_resource_counts_as_a_failed_request(broken_page_server, monkeypatch):
+    def unreadable(self, css, base_url):
+        raise ValueError('Unreadable stylesheet')
+
+    monkeypatch.setattr(measurement_module.ResourceParser, 'add_css_urls', unreadable)
+    measurement, metrics = measure(f'{broken_page_server.url}/page/')
+
+    assert metrics['failedRequests'] == 2
+    assert '/fonts/body.woff2' not in {url.split(broken_page_server.url)[-1] for url in measurement.seen}
+
+
+def test_a_failed_page_leaves_no_fetches_running(broken_page_server):
+    unretrieved = []
+    measurements = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        async with aiohttp.ClientSession() as session:
+            measurements.append(EmulatedPageLoadMeasurement(f'{broken_page_server.url}/page/', session))
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(measurements[0].measure_performance(), 0.3)
+
+    asyncio.run(run())
+
+    assert len(measurements[0].started_tasks) == 7
+    assert all(task.done() for task in measurements[0].started_tasks)
+    assert unretrieved == []
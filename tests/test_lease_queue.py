@@ -0,0 +1,74 @@
+import pytest
+
+import LeaseQueue as lease_module
+from LeaseQueue import LeaseQueue
+
+
+# Stands in for the time module so leases can run out without waiting
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(lease_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = LeaseQueue(str(tmp_path / 'queue.sqlite'), lease_seconds=60, max_attempts=2)
+    queue.add('run', [{'url': f'/page-{index}/'} for index in range(3)])
+    yield queue
+    queue.close()
+
+
+def test_leased_jobs_are_not_handed_out_twice(queue):
+    first, _ = queue.claim('run', 'worker-a', 2)
+    second, _ = queue.claim('run', 'worker-b', 2)
+
+    assert [job['url'] for job in first] == ['/page-0/', '/page-1/']
+    assert [job['url'] for job in second] == ['/page-2/']
+    assert queue.claim('run', 'worker-c', 2) == ([], [])
+
+
+def test_an_expired_lease_is_reassigned_and_the_old_result_ignored(queue, clock):
+    job = queue.claim('run', 'worker-a', 1)[0][0]
+    clock.now += 61
+
+    reassigned, expired = queue.claim('run', 'worker-b', 1)
+
+    assert [(job['id'], job['previous_worker']) for job in reassigned] == [(job['id'], 'worker-a')]
+    assert expired == []
+    assert queue.heartbeat('worker-a', [job['id']]) == []
+    assert not queue.complete('worker-a', job['id'])
+    assert queue.complete('worker-b', job['id'])
+    assert queue.counts('run')['done'] == 1
+
+
+def test_a_heartbeat_keeps_the_lease(queue, clock):
+    job = queue.claim('run', 'worker-a', 1)[0][0]
+    clock.now += 50
+    assert queue.heartbeat('worker-a', [job['id']]) == [job['id']]
+    clock.now += 50
+
+    assert [job['url'] for job in queue.claim('run', 'worker-b', 3)[0]] == ['/page-1/', '/page-2/']
+
+
+def test_a_job_fails_after_max_attempts(queue, clock):
+    for worker in ('worker-a', 'worker-b'):
+        queue.claim('run', worker, 1)
+        clock.now += 61
+
+    claimed, expired = queue.claim('run', 'worker-c', 1)
+
+    assert [job['url'] for job in expired] == ['/page-0/']
+    assert expired[0]['previous_worker'] == 'worker-b'
+    assert [job['url'] for job in claimed] == []
+    assert queue.counts('run') == {'pending': 2, 'leased': 0, 'done': 0, 'failed': 1}
+    assert not queue.is_finished('run')
@@ -0,0 +1,27 @@
+import csv
+
+import requests
+
+from PerformanceScanner import PerformanceScanner
+from RequestsPerformanceMeasurement import RequestsPerformanceMeasurement
+
+
+def test_every_row_goes_to_the_legacy_csv_as_well(project, stand_in, monkeypatch):
+    original = RequestsPerformanceMeasurement.measure_performance
+
+    def measure_performance(self):
+        if self.url.endswith('/page-1/'):
+            raise requests.ConnectionError('Connection refused')
+        return original(self)
+
+    monkeypatch.setattr(RequestsPerformanceMeasurement, 'measure_performance', measure_performance)
+    PerformanceScanner(str(project), 'Legacy', legacy_csv=str(project / 'data' / 'selenium_manual_tests.csv'))
+
+    with open(project / 'data' / 'selenium_manual_tests.csv', newline='') as file:
+        rows = list(csv.DictReader(file))
+
+    assert [row['Page Name'] for row in rows] == ['Page 0', 'Page 1', 'Page 2']
+    assert [row['Load Time'] == '' for row in rows] == [False, True, False]
+    assert [row['Page URL'] for row in rows] == [f'{stand_in.url}/page-{index}/' for index in range(3)]
+    assert {row['Site URL'] for row in rows} == {stand_in.url}
+    assert {row['Note'] for row in rows} == {'Legacy'}
@@ -0,0 +1,77 @@
+import csv
+import json
+
+import pytest
+import requests
+
+from PerformanceScanner import PerformanceScanner
+from RequestsPerformanceMeasurement import RequestsPerformanceMeasurement
+
+
+def test_a_stalled_server_times_out(stand_in):
+    stand_in.latency = 2
+    session = RequestsPerformanceMeasurement.create_session()
+
+    with pytest.raises(requests.Timeout):
+        RequestsPerformanceMeasurement(f'{stand_in.url}/slow/', session, timeout=0.2).measure_performance()
+
+
+def test_timed_out_pages_are_recorded_as_failed(project, stand_in):
+    with open(project / 'config.json') as file:
+        config = json.load(file)
+    config['requests'] = {'timeout': 0.2}
+    with open(project / 'config.json', 'w') as file:
+        json.dump(config, file)
+
+    stand_in.latency = 1
+    PerformanceScanner(str(project), 'Stalled')
+
+    domain_folder = stand_in.url.split('://', 1)[1]
+    with open(project / 'data' / domain_folder / 'speed_check.csv', newline='') as file:
+        rows = list(csv.DictReader(file))
+
+    assert len(rows) == 3
+    assert all(row['Load Time'] == '' for row in rows)
+
+
+# A page that throws something other than a requests error, e.g. a header that won't decode
+@pytest.fixture
+def undecodable_page(monkeypatch):
+    original = RequestsPerformanceMeasurement.measure_performance
+
+    def measure_performance(self):
+        if self.url.endswith('/page-1/'):
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+        return original(self)
+
+    monkeypatch.setattr(RequestsPerformanceMeasurement, 'measure_performance', measure_performance)
+
+
+def test_the_daemon_and_worker_runner_records_any_error_as_a_failed_page(stand_in, undecodable_page):
+    scanner = PerformanceScanner.__new__(PerformanceScanner)
+    scanner.config = {'requests': {'timeout': 5}}
+    scanner.requests_session = None
+    scanner.session_cache = None
+    site = {'url': stand_in.url}
+    jobs = [{'site': site, 'page': {'name': str(index)}, 'url': f'{stand_in.url}/page-{index}/'} for index in range(3)]
+
+    results = []
+    run_batch, close = scanner.open_runner([site], 'requests')
+    try:
+        run_batch(iter(jobs), lambda job, metrics: results.append(metrics))
+    finally:
+        close()
+
+    assert [metrics['loadTime'] is None for metrics in results] == [False, True, False]
+    assert set(results[1]) >= {'statusCode', 'measuredAt', 'error'}
+    assert 'invalid start byte' in results[1]['error']
+
+
+def test_a_sweep_records_any_error_as_a_failed_page(project, stand_in, undecodable_page):
+    PerformanceScanner(str(project), 'Undecodable')
+
+    domain_folder = stand_in.url.split('://', 1)[1]
+    with open(project / 'data' / domain_folder / 'speed_check.csv', newline='') as file:
+        rows = list(csv.DictReader(file))
+
+    assert [row['Load Time'] == '' for row in rows] == [False, True, False]
@@ -0,0 +1,48 @@
+import pytest
+
+from ResourceTimingStore import ResourceTimingStore
+from ResultsStore import ResultsStore
+
+
+@pytest.fixture
+def resources(tmp_path):
+    store = ResultsStore(str(tmp_path / 'results.sqlite'))
+    yield ResourceTimingStore(store)
+    store.close()
+
+
+def resource(url, start=12.5):
+    return [url, 'script', start, 40.0, 1500, 'h2']
+
+
+def test_a_rolled_back_add_leaves_no_interned_ids_behind(resources):
+    with pytest.raises(ValueError):
+        resources.add(1, [resource('https://example.com/app.js', start='not a number')])
+
+    assert 'https://example.com/app.js' not in resources.string_ids
+    assert resources.connection.execute('SELECT COUNT(*) FROM resource_strings').fetchone()[0] == 0
+
+    # The ids the rolled back strings were given now belong to other strings
+    resources.add(2, [resource('https://example.com/other.js')])
+    resources.add(3, [resource('https://example.com/app.js')])
+
+    assert [entry['url'] for entry in resources.get_resources(2)] == ['https://example.com/other.js']
+    assert [entry['url'] for entry in resources.get_resources(3)] == ['https://example.com/app.js']
+
+
+def test_repeated_strings_are_interned_once(resources):
+    resources.add(1, [resource('https://example.com/app.js'), resource('https://example.com/app.js', 80.0)])
+    resources.add(2, [resource('https://example.com/app.js')])
+
+    assert resources.connection.execute('SELECT COUNT(*) FROM resource_strings').fetchone()[0] == 3
+    assert [entry['startTime'] for entry in resources.get_resources(1)] == [12.5, 80.0]
+    assert ResourceTimingStore(resources.results_store).get_resources(2)[0]['protocol'] == 'h2'
+
+
+def test_an_unknown_id_is_not_cached(resources):
+    reader = ResourceTimingStore(resources.results_store)
+    assert reader.lookup(1) == ''
+
+    resources.add(1, [resource('https://example.com/app.js')])
+
+    assert reader.lookup(1) == 'https://example.com/app.js'
@@ -0,0 +1,74 @@
+import glob
+import json
+import time
+
+import pytest
+
+from PerformanceScanner import PerformanceScanner
+from ResultsStore import ResultsStore
+from RollupStore import RollupStore
+
+
+# One sweep of three pages with rollups on; raw_days of 0 would delete every raw row if a sweep compacted
+@pytest.fixture
+def swept(project):
+    with open(project / 'config.json') as file:
+        config = json.load(file)
+    config['rollups'] = {'enabled': True, 'raw_days': 0, 'hourly_days': 730, 'daily_days': None}
+    with open(project / 'config.json', 'w') as file:
+        json.dump(config, file)
+
+    PerformanceScanner(str(project), 'Rolled up')
+    store = ResultsStore(str(project / 'data' / 'results.sqlite'))
+    yield store, RollupStore(store, config['rollups']), glob.glob(str(project / 'data' / '*' / 'speed_check.csv'))[0]
+    store.close()
+
+
+def rolled_up(rollups, tier):
+    with rollups.lock:
+        return rollups.connection.execute(
+            "SELECT SUM(count) FROM rollups WHERE tier = ? AND metric = 'load_time'", (tier,)
+        ).fetchone()[0]
+
+
+def test_a_sweep_rolls_up_without_compacting(swept):
+    store, rollups, csv_file = swept
+
+    assert rolled_up(rollups, 'hourly') == 3
+    assert rollups.counts()['raw'] == 3
+
+
+def test_a_forced_re_import_is_not_rolled_up_again(swept):
+    store, rollups, csv_file = swept
+
+    for _ in range(2):
+        assert store.import_csv(csv_file, force=True) == 3
+        assert rollups.update() == 0
+
+    assert rolled_up(rollups, 'hourly') == 3
+    assert rolled_up(rollups, 'daily') == 3
+
+
+def test_re_importing_compacted_rows(swept):
+    store, rollups, csv_file = swept
+    rollups.raw_days = 1
+    rollups.compact(now=time.time() + 2 * 86400)
+    assert rollups.counts()['raw'] == 1
+
+    store.import_csv(csv_file, force=True)
+    rollups.update()
+
+    assert rollups.counts()['raw'] == 4
+    assert rolled_up(rollups, 'hourly') == 3
+
+
+def test_databases_rolled_up_before_rows_were_tracked(swept):
+    store, rollups, csv_file = swept
+    with store.lock, store.connection:
+        store.connection.execute('DROP TABLE rollup_results')
+
+    rollups = RollupStore(store, {'raw_days': None})
+    store.import_csv(csv_file, force=True)
+
+    assert rollups.update() == 0
+    assert rolled_up(rollups, 'hourly') == 3
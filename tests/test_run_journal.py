@@ -0,0 +1,125 @@
+import csv
+import glob
+import os
+import sys
+import threading
+
+import pytest
+
+from PerformanceScanner import PerformanceScanner
+from RunJournal import RunJournal
+
+
+def read_rows(project, stand_in):
+    domain_folder = stand_in.url.split('://', 1)[1]
+    with open(project / 'data' / domain_folder / 'speed_check.csv', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def test_back_to_back_runs_get_their_own_journals(project, stand_in, monkeypatch):
+    # The second sweep starts with the ID the first one took, as two sweeps in the same instant would
+    run_ids = iter(['2024-06-01_09-30-00-000001', '2024-06-01_09-30-00-000001', '2024-06-01_09-30-00-000002'])
+    monkeypatch.setattr(PerformanceScanner, 'new_run_id', staticmethod(lambda: next(run_ids)))
+
+    PerformanceScanner(str(project), 'First')
+    PerformanceScanner(str(project), 'Second')
+
+    rows = read_rows(project, stand_in)
+    assert [row['Timestamp'] for row in rows] == ['2024-06-01_09-30-00-000001'] * 3 + ['2024-06-01_09-30-00-000002'] * 3
+    assert [row['Note'] for row in rows] == ['First'] * 3 + ['Second'] * 3
+
+    journals = sorted(os.path.basename(path) for path in glob.glob(str(project / 'data' / 'journal' / '*')))
+    assert journals == ['2024-06-01_09-30-00-000001.finished.jsonl', '2024-06-01_09-30-00-000002.finished.jsonl']
+    for path in glob.glob(str(project / 'data' / 'journal' / '*')):
+        assert [record['type'] for record in RunJournal.read(path)].count('resume') == 0
+
+
+def test_new_run_ids_are_unique():
+    assert len({PerformanceScanner.new_run_id() for _ in range(100)}) > 1
+
+
+def test_create_refuses_an_existing_journal(tmp_path):
+    RunJournal(str(tmp_path), 'run').create('requests', 'note', [])
+    with pytest.raises(FileExistsError):
+        RunJournal(str(tmp_path), 'run').create('requests', 'note', [])
+
+
+def test_resume_measures_only_what_is_missing(project, stand_in, monkeypatch):
+    original = PerformanceScanner.report_load_time
+    calls = []
+
+    def crash_on_second_page(self, page, metrics, site=None):
+        calls.append(page['name'])
+        if len(calls) == 2:
+            raise RuntimeError('Browser died')
+        return original(self, page, metrics, site)
+
+    monkeypatch.setattr(PerformanceScanner, 'report_load_time', crash_on_second_page)
+    with pytest.raises(RuntimeError):
+        PerformanceScanner(str(project), 'Crashed')
+    monkeypatch.setattr(PerformanceScanner, 'report_load_time', original)
+
+    run_id = RunJournal.unfinished_run_ids(str(project / 'data' / 'journal'))[0]
+    PerformanceScanner(str(project), 'Ignored', resume='latest')
+
+    rows = read_rows(project, stand_in)
+    assert [row['Page Name'] for row in rows] == ['Page 0', 'Page 1', 'Page 2']
+    assert {row['Timestamp'] for row in rows} == {run_id}
+    assert {row['Note'] for row in rows} == {'Crashed'}
+    assert RunJournal.unfinished_run_ids(str(project / 'data' / 'journal')) == []
+
+
+def test_prune_removes_old_journals_whether_finished_or_not(tmp_path):
+    finished = RunJournal(str(tmp_path), 'finished').create()
+    finished.close()
+    RunJournal(str(tmp_path), 'crashed').create().close(finish=False)
+
+    for path in glob.glob(str(tmp_path / '*.jsonl')):
+        os.utime(path, (0, 0))
+    RunJournal(str(tmp_path), 'recent').create().close(finish=False)
+
+    assert RunJournal.prune(str(tmp_path), 30) == 2
+    assert RunJournal.unfinished_run_ids(str(tmp_path)) == ['recent']
+
+
+# Switch threads as often as possible, so unguarded reads of the journal's records catch them changing
+@pytest.fixture
+def frequent_thread_switches():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_planning_and_completing_on_different_threads(tmp_path, frequent_thread_switches):
+    journal = RunJournal(str(tmp_path), 'run', fsync=False).create()
+    jobs = [{'site': {}, 'url': f'/page-{index}/'} for index in range(5000)]
+    errors = []
+
+    def run(action):
+        try:
+            for job in jobs:
+                action(job)
+                journal.missing()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(journal.plan,)),
+               threading.Thread(target=run, args=(lambda job: journal.complete(job, {'loadTime': 0.1}),))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert journal.close()
+    records = RunJournal.read(str(tmp_path / f'run{RunJournal.FINISHED_SUFFIX}'))
+    assert [record['type'] for record in records].count('planned') == 5000
+    assert [record['type'] for record in records].count('completed') == 5000
+
+
+def test_an_async_sweep_finishes_its_journal(project, stand_in):
+    PerformanceScanner(str(project), 'Async', measurement_method='async_requests')
+
+    assert len(read_rows(project, stand_in)) == 3
+    assert RunJournal.unfinished_run_ids(str(project / 'data' / 'journal')) == []
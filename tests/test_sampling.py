@@ -0,0 +1,38 @@
+import json
+
+from PerformanceScanner import PerformanceScanner
+
+
+def enable_sampling(project, **settings):
+    with open(project / 'config.json') as file:
+        config = json.load(file)
+    config['sampling'] = dict({'enabled': True, 'min_samples': 2, 'max_samples': 3}, **settings)
+    config['journal'] = {'enabled': False}
+    with open(project / 'config.json', 'w') as file:
+        json.dump(config, file)
+
+
+def test_last_run_keeps_each_cache_mode(project, stand_in):
+    enable_sampling(project, cache_modes=['cold', 'warm'])
+    PerformanceScanner(str(project), 'Sampled')
+
+    domain_folder = stand_in.url.split('://', 1)[1]
+    with open(project / 'data' / domain_folder / 'last_run.json') as file:
+        last_run = json.load(file)
+
+    assert sorted(last_run) == sorted(f'Page {index} ({mode} cache)' for index in range(3) for mode in ('cold', 'warm'))
+    assert {entry['cacheMode'] for entry in last_run.values()} == {'cold', 'warm'}
+
+
+def test_sampling_warns_where_it_is_ignored(project, capsys):
+    enable_sampling(project)
+    PerformanceScanner(str(project), 'Async', measurement_method='async_requests')
+
+    assert 'the async_requests method measures each page once' in capsys.readouterr().out
+
+
+def test_sampling_does_not_warn_where_it_applies(project, capsys):
+    enable_sampling(project)
+    PerformanceScanner(str(project), 'Serial')
+
+    assert 'measures each page once' not in capsys.readouterr().out
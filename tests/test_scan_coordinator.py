@@ -0,0 +1,106 @@
+import json
+import logging
+from types import SimpleNamespace
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from ScanCoordinator import ScanCoordinator
+from ScanWorker import ScanWorker
+
+LOGIN = {'username': 'editor', 'password': 'hunter2'}
+
+
+# Just enough of a PerformanceScanner for the coordinator's API and the worker's requests
+def scanner(tmp_path, sites):
+    config = {
+        'sites': sites,
+        'speed_check_method': 'requests',
+        'coordinator': {'port': 0, 'token': 'shared-secret', 'queue_path': 'queue.sqlite'}
+    }
+
+    def build_jobs(sites):
+        for site in sites:
+            yield {'site': site, 'page': {'name': 'Home', 'url': '/'}, 'url': site['url'] + '/'}
+
+    return SimpleNamespace(
+        config=config, logger=logging.getLogger('test'), script_root=str(tmp_path), report_timestamp='run', note='Test',
+        build_jobs=build_jobs
+    )
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    coordinator = ScanCoordinator(scanner(tmp_path, {'private': {'url': 'https://private.example', 'authentication': LOGIN}}))
+    coordinator.sites = list(coordinator.config['sites'].values())
+    coordinator.queue.add(coordinator.run_id, coordinator.build_payloads(coordinator.sites))
+    server = coordinator.start_server()
+    coordinator.url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield coordinator
+    server.shutdown()
+    server.server_close()
+    coordinator.queue.close()
+
+
+def request(url, path, body=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token is not None:
+        headers['X-Coordinator-Token'] = token
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    with urlopen(Request(f'{url}{path}', data=data, method='POST' if data else 'GET', headers=headers), timeout=5) as response:
+        return json.loads(response.read())
+
+
+def test_binds_to_localhost_by_default(coordinator):
+    assert coordinator.host == '127.0.0.1'
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/config', None),
+    ('/status', None),
+    ('/claim', {'worker': 'intruder', 'count': 5}),
+    ('/heartbeat', {'worker': 'intruder', 'job_ids': [1]}),
+    ('/result', {'worker': 'intruder', 'job_id': 1, 'metrics': {'loadTime': 0.1}}),
+])
+@pytest.mark.parametrize('token', [None, 'wrong'])
+def test_requests_without_the_token_are_refused(coordinator, path, body, token):
+    with pytest.raises(HTTPError) as error:
+        request(coordinator.url, path, body, token)
+
+    assert error.value.code == 401
+    assert coordinator.queue.counts('run') == {'pending': 1, 'leased': 0, 'done': 0, 'failed': 0}
+
+
+def test_credentials_never_leave_the_coordinator(coordinator):
+    run_config = request(coordinator.url, '/config', token='shared-secret')
+    claimed = request(coordinator.url, '/claim', {'worker': 'worker-a', 'count': 1}, token='shared-secret')
+
+    assert run_config['sites'] == [{'url': 'https://private.example'}]
+    assert [job['site'] for job in claimed['jobs']] == [{'url': 'https://private.example'}]
+    assert 'hunter2' not in json.dumps(coordinator.queue.get_payload(claimed['jobs'][0]['id']))
+
+
+def test_workers_send_the_token_and_log_in_with_their_own_config(coordinator, tmp_path):
+    worker_scanner = scanner(tmp_path, {
+        'private': {'url': 'https://private.example', 'authentication': LOGIN},
+        'other': {'url': 'https://other.example', 'authentication': {'username': 'x', 'password': 'y'}}
+    })
+    worker = ScanWorker(worker_scanner, coordinator.url)
+
+    run_config = worker.request('GET', '/config')
+
+    assert [worker.with_local_credentials(site) for site in run_config['sites']] == [
+        {'url': 'https://private.example', 'authentication': LOGIN}
+    ]
+
+
+def test_a_coordinator_without_a_token_does_not_start(tmp_path, capsys):
+    no_token = scanner(tmp_path, {})
+    no_token.config['coordinator']['token'] = ''
+    coordinator = ScanCoordinator(no_token)
+
+    coordinator.run()
+    coordinator.queue.close()
+
+    assert 'Set coordinator.token' in capsys.readouterr().out
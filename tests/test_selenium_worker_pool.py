@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+import SeleniumWorkerPool as pool_module
+from SeleniumWorkerPool import SeleniumWorkerPool
+
+
+# Stands in for a browser so the pool's queueing can be tested without Chrome
+class FakeMeasurement:
+    def __init__(self, url, driver, settle_ms, capture_resources, profile):
+        self.url = url
+
+    def measure_performance(self):
+        return {'loadTime': 0.1, 'statusCode': 200}
+
+    @staticmethod
+    def create_driver(config, profile_dir=None, profile=None):
+        return object()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pool_module, 'SeleniumPerformanceMeasurement', FakeMeasurement)
+    monkeypatch.setattr(SeleniumWorkerPool, 'quit_driver', staticmethod(lambda driver, profile_dir: None))
+    return SeleniumWorkerPool({'workers': 2})
+
+
+def jobs(count):
+    return [{'site': {'url': 'http://example.test'}, 'page': {'name': str(index)}, 'url': f'http://example.test/{index}'}
+            for index in range(count)]
+
+
+def test_a_failing_on_result_raises_instead_of_hanging(pool):
+    def on_result(job, metrics):
+        raise OSError('No space left on device')
+
+    errors = []
+    thread = threading.Thread(target=lambda: errors.append(pytest.raises(OSError, pool.run, jobs(20), on_result)), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert 'No space left on device' in str(errors[0].value)
+
+
+def test_every_job_is_measured_once(pool):
+    results = []
+    pool.run(jobs(20), lambda job, metrics: results.append(job['url']))
+
+    assert sorted(results) == sorted(job['url'] for job in jobs(20))
@@ -0,0 +1,61 @@
+import gzip
+
+import pytest
+
+from SitemapSource import SitemapSource
+from StandInServer import StandInServer
+
+
+def urlset(*locations):
+    entries = ''.join(f'<url><loc>{location}</loc></url>' for location in locations)
+    return f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'.encode()
+
+
+def sitemap_index(*locations):
+    entries = ''.join(f'<sitemap><loc>{location}</loc></sitemap>' for location in locations)
+    return f'<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>'.encode()
+
+
+# A sitemap index pointing at a plain sitemap, a gzipped one and a nested index, with duplicate,
+# off-host and out-of-site entries along the way
+@pytest.fixture
+def sitemap_server():
+    server = StandInServer(latency=0, subresources=0)
+    base = server.url
+    server.files.update({
+        '/sitemap.xml': ('application/xml', sitemap_index('/sitemaps/pages.xml', f'{base}/sitemaps/posts.xml.gz', '/sitemaps/nested.xml')),
+        '/sitemaps/pages.xml': ('application/xml', urlset(
+            f'{base}/', f'{base}/about/', f'{base}/about/#team', 'https://elsewhere.example/about/', f'{base}/blog/'
+        )),
+        '/sitemaps/posts.xml.gz': ('application/octet-stream', gzip.compress(urlset(
+            f'{base}/blog/first/', f'{base}/blog/second/?page=2', f'{base}/about/'
+        ))),
+        '/sitemaps/nested.xml': ('application/xml', sitemap_index('/sitemaps/deep.xml', '/sitemaps/pages.xml')),
+        '/sitemaps/deep.xml': ('application/xml', urlset(f'{base}/blog/third/', f'{base}/blog/first/')),
+    })
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_reads_index_nested_and_gzipped_sitemaps_once_each(sitemap_server):
+    pages = list(SitemapSource({'url': sitemap_server.url, 'sitemap': {}}))
+
+    assert [page['url'] for page in pages] == [
+        '/', '/about/', '/blog/', '/blog/first/', '/blog/second/?page=2', '/blog/third/'
+    ]
+    assert all(page['name'] == page['url'] for page in pages)
+
+
+def test_pages_are_relative_to_a_site_with_a_path(sitemap_server):
+    site = {'url': f'{sitemap_server.url}/blog', 'sitemap': {'url': '/sitemap.xml'}}
+    pages = [page['url'] for page in SitemapSource(site)]
+
+    assert pages == ['/', '/first/', '/second/?page=2', '/third/']
+    assert [f'{site["url"]}{page}' for page in pages][1] == f'{sitemap_server.url}/blog/first/'
+
+
+def test_include_exclude_and_limit(sitemap_server):
+    site = {'url': sitemap_server.url, 'sitemap': {'include': ['^/blog/'], 'exclude': ['second'], 'limit': 2}}
+
+    assert [page['url'] for page in SitemapSource(site)] == ['/blog/', '/blog/first/']